@@ -0,0 +1,195 @@
+import os
+import json
+import struct
+import threading
+import time
+
+import numpy as np
+
+# Фоновое сохранение проекта редактора. Правки только ставят сохранение в очередь;
+# поток записи ждёт паузу SAVE_DELAY и пишет последнее состояние: project.json -
+# компактно и атомарно (tmp + replace), в result.wav (float32) - только изменённые
+# диапазоны, на месте через memmap. Целиком файл пишется, если его ещё нет,
+# поменялась длина или формат, или результат был создан заново.
+
+SAVE_DELAY = 0.5
+WAVE_FORMAT_IEEE_FLOAT = 3
+
+
+def wav_header(frames, sr):
+    """Заголовок моно float32 WAV: fmt (18 байт), fact, data"""
+    data_bytes = frames * 4
+    fmt = struct.pack('<HHIIHHH', WAVE_FORMAT_IEEE_FLOAT, 1, sr, sr * 4, 4, 32, 0)
+    return (b'RIFF' + struct.pack('<I', 4 + (8 + len(fmt)) + 12 + (8 + data_bytes)) + b'WAVE'
+            + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+            + b'fact' + struct.pack('<II', 4, frames)
+            + b'data' + struct.pack('<I', data_bytes))
+
+
+def float_data_offset(path, frames, sr):
+    """Смещение сэмплов, если path - моно float32 WAV на frames сэмплов с частотой sr, иначе None"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(12)
+            if len(head) < 12 or head[:4] != b'RIFF' or head[8:12] != b'WAVE':
+                return None
+            fmt_ok = False
+            while True:
+                chunk = f.read(8)
+                if len(chunk) < 8:
+                    return None
+                cid, size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+                if cid == b'fmt ':
+                    fmt = f.read(size)
+                    tag, channels, rate, _, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+                    fmt_ok = tag == WAVE_FORMAT_IEEE_FLOAT and channels == 1 and rate == sr and bits == 32
+                elif cid == b'data':
+                    if not fmt_ok or size != frames * 4:
+                        return None
+                    offset = f.tell()
+                    return offset if os.path.getsize(path) >= offset + size else None
+                else:
+                    f.seek(size + (size & 1), 1)
+    except (OSError, struct.error):
+        return None
+
+
+def write_json_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def write_result(path, audio, sr, ranges=None):
+    """Пишет audio в path; ranges - [(start, end)] изменённых сэмплов или None (весь файл)"""
+    frames = len(audio)
+    offset = float_data_offset(path, frames, sr) if ranges is not None else None
+    if offset is None:
+        tmp = path + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(wav_header(frames, sr))
+            f.write(np.ascontiguousarray(audio, dtype='<f4').tobytes())
+        os.replace(tmp, path)
+        return
+    if not ranges or frames == 0:
+        return
+    mm = np.memmap(path, dtype='<f4', mode='r+', offset=offset, shape=(frames,))
+    try:
+        for start, end in ranges:
+            mm[start:end] = audio[start:end]
+        mm.flush()
+    finally:
+        del mm
+
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class _Job:
+
+    def __init__(self, project_dir):
+        self.project_dir = project_dir
+        self.state = None
+        self.audio = None
+        self.sr = None
+        self.ranges = []  # None - результат целиком
+        self.due = 0.0
+
+
+class ProjectSaver:
+    """Отложенная запись проектов в фоновом потоке; вызовы schedule не ждут диск"""
+
+    def __init__(self, delay=SAVE_DELAY, log=None):
+        self.delay = delay
+        self.log = log or (lambda m: None)
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._busy = False
+        self._thread = None
+        self._saved = {}  # папка проекта -> массив, с которым совпадает result.wav (с учётом очереди)
+        self.saves = 0
+
+    def schedule(self, project_dir, state, audio, sr, ranges=None):
+        """state - содержимое project.json; audio пишется по ссылке, ranges None - целиком.
+
+        Массив не копируется: если его успеют изменить до записи, изменённый
+        диапазон всё равно придёт следующим вызовом и будет записан ещё раз.
+        """
+        with self._cond:
+            job = self._jobs.get(project_dir)
+            if job is None:
+                job = self._jobs[project_dir] = _Job(project_dir)
+            job.state = state
+            if audio is not None:
+                # новый массив результата (загрузка, смена длины) - файл переписывается целиком
+                if ranges is None or job.ranges is None or self._saved.get(project_dir) is not audio:
+                    job.ranges = None
+                else:
+                    job.ranges = merge_ranges(job.ranges + list(ranges))
+                self._saved[project_dir] = audio
+                job.audio = audio
+                job.sr = sr
+            job.due = time.monotonic() + self.delay
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Записывает всё отложенное сейчас и ждёт окончания (закрытие вкладки/программы)"""
+        with self._cond:
+            for job in self._jobs.values():
+                job.due = 0.0
+            self._cond.notify_all()
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._jobs or self._busy:
+                if self._thread is None or not self._thread.is_alive():
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 0.1)
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._jobs:
+                        self._thread = None
+                        self._cond.notify_all()
+                        return
+                    now = time.monotonic()
+                    job = min(self._jobs.values(), key=lambda j: j.due)
+                    if job.due <= now:
+                        del self._jobs[job.project_dir]
+                        self._busy = True
+                        break
+                    self._cond.wait(job.due - now)
+            try:
+                self._write(job)
+                self.saves += 1
+            except Exception as e:
+                with self._cond:
+                    # файл мог остаться недописанным - в следующий раз целиком
+                    self._saved.pop(job.project_dir, None)
+                self.log(f"Autosave error: {e}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write(self, job):
+        os.makedirs(job.project_dir, exist_ok=True)
+        if job.audio is not None:
+            write_result(os.path.join(job.project_dir, "result.wav"), job.audio, job.sr, job.ranges)
+        if job.state is not None:
+            write_json_atomic(os.path.join(job.project_dir, "project.json"), job.state)
@@ -0,0 +1,556 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import numpy as np
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return float("nan")
+
+
+def synth_voice(seconds, sr=44100, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    f0 = 180 + 40 * np.sin(2 * np.pi * 0.3 * t) + 6 * np.sin(2 * np.pi * 5.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    audio = np.zeros(n, dtype=np.float64)
+    for k in range(1, 12):
+        audio += np.sin(k * phase) / k
+    gate = (np.sin(2 * np.pi * 0.45 * t) > -0.3).astype(np.float64)
+    audio = audio * gate + 0.01 * rng.standard_normal(n)
+    return (0.3 * audio / np.abs(audio).max()).astype(np.float32), sr
+
+
+def write_synth(path, seconds, sr=44100):
+    import soundfile as sf
+    audio, sr = synth_voice(seconds, sr)
+    sf.write(path, audio, sr)
+    return path
+
+
+def load_converter(args):
+    from converter import VoiceConverter
+    conv = VoiceConverter(log_callback=lambda m: None)
+    if not conv.initialize():
+        raise SystemExit("RVC initialization failed")
+    if not conv.load_model(args.model, args.index or ""):
+        raise SystemExit(f"model load failed: {args.model}")
+    return conv
+
+
+def convert_params(args):
+    return {
+        "pitch": 0,
+        "f0_method": args.f0_method,
+        "index_path": args.index or "",
+        "index_rate": 0.75 if args.index else 0,
+        "protect": 0.33,
+    }
+
+
+def bench_pipeline(args):
+    """Пиковый RSS, трассируемый пик и блоки аллокаций полного прогона.
+
+    Сквозных цифр до/после переделки буферов Pipeline нет: прогон требует
+    установленного RVC и модели. Отдельно замерены части без torch (tracemalloc):
+    kNN-смешивание на кусок ~39 с (1950 кадров, индекс 20000 x 768) - 96 -> 6 МБ,
+    сборка выхода 10 мин при 40 кГц - 192 -> 108 МБ.
+    """
+    conv = load_converter(args)
+    tmp_dir = tempfile.mkdtemp(prefix="rvc_bench_")
+    src = write_synth(os.path.join(tmp_dir, "in.wav"), args.seconds)
+    dst = os.path.join(tmp_dir, "out.wav")
+
+    rss_before = peak_rss_mb()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    ok = conv.convert(src, dst, **convert_params(args))
+    elapsed = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    stats = tracemalloc.take_snapshot().statistics("filename")
+    tracemalloc.stop()
+
+    print(f"input: {args.seconds:.0f}s synthetic, ok={ok}")
+    print(f"time: {elapsed:.2f}s (x{args.seconds / max(elapsed, 1e-9):.1f} realtime)")
+    print(f"peak RSS: {peak_rss_mb():.0f} MB (before: {rss_before:.0f} MB)")
+    print(f"traced python/numpy peak: {peak / 1e6:.1f} MB, live after: {current / 1e6:.1f} MB")
+    print(f"live allocation blocks: {sum(s.count for s in stats)}, "
+          f"interpreter blocks delta: {sys.getallocatedblocks() - blocks_before}")
+
+
+def _snr_db(ref, out):
+    n = min(len(ref), len(out))
+    noise = np.sum((ref[:n] - out[:n]) ** 2)
+    return 10 * np.log10(np.sum(ref[:n] ** 2) / noise) if noise > 0 else float("inf")
+
+
+def bench_short_clips(args):
+    """Короткие клипы по одному и пакетами: скорость и расхождение выходов.
+
+    net_g добавляет шум при каждом прогоне, поэтому выходы сравниваются не
+    на точное совпадение, а по SNR относительно поштучного прогона; повторный
+    поштучный прогон тех же клипов даёт уровень, ниже которого разница - шум.
+    """
+    import soundfile as sf
+    conv = load_converter(args)
+    tmp_dir = tempfile.mkdtemp(prefix="rvc_bench_")
+    rng = np.random.default_rng(1)
+    jobs = []
+    for i in range(args.clips):
+        audio, sr = synth_voice(rng.uniform(1, 4), seed=i)
+        path = os.path.join(tmp_dir, f"clip{i:04d}.wav")
+        sf.write(path, audio, sr)
+        jobs.append(path)
+
+    out_dirs = {}
+    for mode, short_clips in (("per-file", False), ("batched", True), ("per-file again", False)):
+        out_dir = out_dirs[mode] = os.path.join(tmp_dir, mode.replace(" ", "_"))
+        pairs = [(p, os.path.join(out_dir, os.path.basename(p))) for p in jobs]
+        t0 = time.perf_counter()
+        results = conv.convert_jobs(pairs, out_dir, use_manifest=False,
+                                    short_clips=short_clips, **convert_params(args))
+        elapsed = time.perf_counter() - t0
+        ok = sum(1 for _, _, s in results if s)
+        if mode != "per-file again":
+            print(f"{mode}: {ok}/{len(jobs)} clips in {elapsed:.2f}s, {len(jobs) / elapsed:.2f} clips/s")
+
+    def snrs(mode):
+        values = []
+        for p in jobs:
+            name = os.path.basename(p)
+            try:
+                ref = sf.read(os.path.join(out_dirs["per-file"], name), dtype="float32")[0]
+                out = sf.read(os.path.join(out_dirs[mode], name), dtype="float32")[0]
+            except Exception:
+                continue
+            values.append(_snr_db(ref, out))
+        return np.array(values)
+
+    batched, again = snrs("batched"), snrs("per-file again")
+    if len(batched) and len(again):
+        print(f"batched vs per-file SNR: median {np.median(batched):.1f} dB, worst {batched.min():.1f} dB")
+        print(f"per-file vs per-file (run-to-run noise): median {np.median(again):.1f} dB, "
+              f"worst {again.min():.1f} dB")
+
+
+def bench_parallel_long(args):
+    conv = load_converter(args)
+    tmp_dir = tempfile.mkdtemp(prefix="rvc_bench_")
+    src = write_synth(os.path.join(tmp_dir, "in.wav"), args.seconds)
+
+    outputs = {}
+    for workers in (0, args.workers):
+        t0 = time.perf_counter()
+        # первый вызов поднимает пул, в замер идёт второй
+        if workers:
+            conv._get_chunk_pool(workers)
+            t0 = time.perf_counter()
+        result = conv.convert_audio(src, chunk_workers=workers, **convert_params(args))
+        elapsed = time.perf_counter() - t0
+        outputs[workers] = result[1]
+        mode = f"{workers} workers" if workers else "sequential"
+        print(f"{mode}: {elapsed:.2f}s (x{args.seconds / max(elapsed, 1e-9):.1f} realtime)")
+    a, b = outputs[0], outputs[args.workers]
+    diff = np.abs(a - b).max() if len(a) == len(b) else float("nan")
+    print(f"length: {len(a)} vs {len(b)}, max abs diff: {diff:.2e}")
+    conv.cleanup()
+
+
+def bench_shared_weights(args):
+    from workers import make_pool, memory_info, convert_one
+    conv = load_converter(args)
+    tmp_dir = tempfile.mkdtemp(prefix="rvc_bench_")
+    src = write_synth(os.path.join(tmp_dir, "in.wav"), 10)
+    params = convert_params(args)
+
+    for source in (None, conv):
+        mode = "shared" if source is not None else "per-worker copy"
+        t0 = time.perf_counter()
+        pool = make_pool(args.model, args.index or "", args.workers, source=source,
+                         with_rmvpe=args.f0_method == "rmvpe")
+        startup = time.perf_counter() - t0
+        # по конвертации на воркер, чтобы в память попали и активации
+        jobs = [pool.submit(convert_one, src, os.path.join(tmp_dir, f"out{i}.wav"), params)
+                for i in range(args.workers * 2)]
+        ok = sum(1 for f in jobs if f.result()["ok"])
+        infos = dict(f.result() for f in [pool.submit(memory_info) for _ in range(args.workers)])
+        pool.shutdown()
+        n = max(len(infos), 1)
+        avg = {k: sum(i[k] for i in infos.values()) / n for k in ("rss", "pss", "private", "shared")}
+        print(f"{mode}: {len(infos)} workers, startup {startup:.1f}s, ok={ok}/{len(jobs)}")
+        print(f"  per worker: RSS {avg['rss']:.0f} MB, PSS {avg['pss']:.0f} MB, "
+              f"private {avg['private']:.0f} MB, shared {avg['shared']:.0f} MB")
+        print(f"  all workers (PSS sum): {avg['pss'] * n:.0f} MB")
+
+
+def bench_threads(args):
+    """Все ядра в каждом воркере против бюджета thread_budget"""
+    import thread_budget
+    from workers import run_parallel
+    conv = load_converter(args)
+    tmp_dir = tempfile.mkdtemp(prefix="rvc_bench_")
+    sources = [write_synth(os.path.join(tmp_dir, f"in{i}.wav"), 30) for i in range(args.workers * 2)]
+    cores = thread_budget.cpu_count()
+    print(f"cores: {cores}, workers: {args.workers}")
+
+    for label, threads in (("oversubscribed", cores), ("auto", "auto")):
+        budget = thread_budget.plan(threads, args.workers)
+        out_dir = os.path.join(tmp_dir, label)
+        jobs = [(p, os.path.join(out_dir, os.path.basename(p))) for p in sources]
+        os.makedirs(out_dir, exist_ok=True)
+        t0 = time.perf_counter()
+        results = run_parallel(jobs, args.model, args.index or "", args.workers,
+                               source=conv, threads=threads, **convert_params(args))
+        elapsed = time.perf_counter() - t0
+        ok = sum(1 for _, _, s in results if s)
+        print(f"{label} ({thread_budget.describe(budget)} per worker): "
+              f"{ok}/{len(jobs)} files in {elapsed:.2f}s, x{30 * len(jobs) / elapsed:.1f} realtime")
+
+
+def _legacy_crepe(pipeline, x, method, hop_length):
+    """F0 crepe как до адаптивных батчей: весь сигнал одним predict"""
+    import torch
+    import torchcrepe
+    model = "tiny" if method.endswith("tiny") else "full"
+    if method.startswith("mangio"):
+        x = x / np.quantile(np.abs(x), 0.999)
+        return torchcrepe.predict(torch.from_numpy(x)[None], 16000, hop_length, 50, 1100, model,
+                                  batch_size=hop_length * 2, device=pipeline.device, pad=True)
+    return torchcrepe.predict(torch.from_numpy(x)[None], 16000, 160, 50, 1100, model,
+                              batch_size=512, device=pipeline.device, return_periodicity=True)
+
+
+def bench_crepe(args):
+    """crepe / mangio-crepe: один predict на весь сигнал против батчей по бюджету и гейта"""
+    from converter import VoiceConverter
+    conv = VoiceConverter(log_callback=lambda m: None)
+    if not conv.initialize():
+        raise SystemExit("RVC initialization failed")
+    from infer.modules.vc.pipeline import Pipeline
+    pipeline = Pipeline(40000, conv.config)
+
+    audio, sr = synth_voice(args.seconds, sr=16000)
+    # паузы с тишиной, как между фразами в реальной записи
+    t = np.arange(len(audio)) / sr
+    audio = np.where((t % 6) > 4.5, audio * 1e-4, audio).astype(np.float32)
+    p_len = len(audio) // 160
+
+    for method in ("crepe", "crepe-tiny", "mangio-crepe", "mangio-crepe-tiny"):
+        hops = args.hops if method.startswith("mangio") else [160]
+        for hop in hops:
+            t0 = time.perf_counter()
+            _legacy_crepe(pipeline, audio, method, hop)
+            legacy = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            pipeline.get_f0("bench", audio, p_len, 0, method, 3, hop)
+            adaptive = time.perf_counter() - t0
+            print(f"{method:18s} hop {hop:4d}: legacy {legacy:6.2f}s, adaptive {adaptive:6.2f}s, "
+                  f"x{legacy / max(adaptive, 1e-9):.2f}")
+
+
+def _random_parts(count, total, sr=44100, seed=0):
+    from parts import PartGroup
+    rng = np.random.default_rng(seed)
+    parts = []
+    for i in range(count):
+        start = int(rng.integers(0, total - sr))
+        g = PartGroup(start, min(total, start + int(rng.integers(sr // 10, sr * 4))), "", sr)
+        g.add_silent_version()
+        g.apply_order = i + 1
+        parts.append(g)
+    return parts
+
+
+def bench_parts(args):
+    """Запросы редактора к частям: перебор списка против PartIndex.
+
+    Каждый запрос идёт через sync, как EditorTab._parts_index(), так что в замер
+    входит проверка актуальности индекса; "after edit" - первый запрос после
+    сдвига границы части, с перестройкой индекса.
+    """
+    from intervals import PartIndex, PartList
+    sr = 44100
+    total = int(max(args.seconds, args.parts / 4) * sr)
+    parts = PartList(_random_parts(args.parts, total, sr))
+    rng = np.random.default_rng(1)
+    samples = [int(s) for s in rng.integers(0, total, 2000)]
+    probes = [parts[int(i)] for i in rng.integers(0, len(parts), 200)]
+    index = PartIndex()
+
+    t0 = time.perf_counter()
+    index.sync(parts)
+    print(f"{len(parts)} parts over {total / sr:.0f}s, index build {1000 * (time.perf_counter() - t0):.1f} ms")
+
+    def parts_index():
+        return index.sync(parts)
+
+    def scan_levels():
+        # прежний EditorTab._assign_levels
+        level_ends = []
+        for g in sorted(parts, key=lambda g: (g.start, -(g.end - g.start))):
+            for level, end in enumerate(level_ends):
+                if g.start >= end:
+                    g.level = level
+                    level_ends[level] = g.end
+                    break
+            else:
+                g.level = len(level_ends)
+                level_ends.append(g.end)
+
+    def edit():
+        # сдвиг границы туда и обратно: bounds_revision растёт, состав прежний
+        g = parts[0]
+        g.end += 1
+        g.end -= 1
+
+    def edited(fn):
+        def run(value):
+            edit()
+            return fn(value)
+        return run
+
+    cases = [
+        ("part at sample", samples,
+         lambda s: [g for g in parts if g.start <= s < g.end], lambda s: parts_index().at(s)),
+        ("overlapping", probes,
+         lambda p: [g for g in parts if g.id != p.id and g.start < p.end and g.end > p.start],
+         lambda p: parts_index().overlapping(p.start, p.end)),
+        ("nested", probes,
+         lambda p: [g for g in parts if g.id != p.id and g.start >= p.start and g.end <= p.end],
+         lambda p: parts_index().nested(p)),
+        ("snap point", samples,
+         lambda s: min((abs(s - b), b) for g in parts for b in (g.start, g.end)),
+         lambda s: parts_index().nearest_point(s)),
+        ("levels per redraw", [None] * 100, lambda _: scan_levels(), lambda _: parts_index().assign_levels()),
+        ("part at sample after edit", samples[:50],
+         edited(lambda s: [g for g in parts if g.start <= s < g.end]), edited(lambda s: parts_index().at(s))),
+        ("levels after edit", [None] * 20, edited(lambda _: scan_levels()),
+         edited(lambda _: parts_index().assign_levels())),
+    ]
+    for name, inputs, scan, indexed in cases:
+        timings = []
+        for fn in (scan, indexed):
+            fn(inputs[0])
+            t0 = time.perf_counter()
+            for value in inputs:
+                fn(value)
+            timings.append(1e6 * (time.perf_counter() - t0) / len(inputs))
+        print(f"{name}: scan {timings[0]:.1f} us, index {timings[1]:.1f} us, x{timings[0] / max(timings[1], 1e-9):.1f}")
+
+
+def bench_version_cache(args):
+    """Переключение версий части: чтение файла каждый раз против кэша версий"""
+    from parts import PartGroup
+    from version_cache import VERSION_CACHE
+    sr = 44100
+    tmp_dir = tempfile.mkdtemp(prefix="rvc_bench_")
+    seconds = min(args.seconds, 30)
+    part = PartGroup(0, int(seconds * sr), tmp_dir, sr)
+    for i in range(4):
+        part.add_version(synth_voice(seconds, sr, seed=i)[0])
+    print(f"part: {seconds:.0f}s, {len(part.versions)} versions")
+
+    for label, budget in (("no cache", 0), ("cache", args.cache_mb)):
+        VERSION_CACHE.clear()
+        VERSION_CACHE.set_budget(budget)
+        hits0, misses0 = VERSION_CACHE.hits, VERSION_CACHE.misses
+        t0 = time.perf_counter()
+        for step in range(40):
+            part.active_idx = step % len(part.versions)
+            part.get_data()
+            part.prefetch_neighbours()
+        elapsed = time.perf_counter() - t0
+        hits, misses = VERSION_CACHE.hits - hits0, VERSION_CACHE.misses - misses0
+        print(f"{label}: {1000 * elapsed / 40:.1f} ms per switch, "
+              f"hits {hits}/{hits + misses}; {VERSION_CACHE.describe()}")
+
+
+def bench_history(args):
+    """История правок: history.json целиком против журнала HistoryManager"""
+    import json
+    from history import HistoryManager
+    sr = 44100
+    parts = _random_parts(args.history_parts, int(max(args.seconds, 60) * sr), sr)
+    for g in parts:
+        g.version_params = [{"model": "voice.pth", "pitch": 0, "f0_method": "rmvpe", "index_rate": 0.9,
+                             "protect": 0.33, "source_mode": "F"}]
+    rng = np.random.default_rng(2)
+    tmp_dir = tempfile.mkdtemp(prefix="rvc_bench_")
+    manager = HistoryManager(tmp_dir, sr)
+    snapshots = []
+    t0 = time.perf_counter()
+    for step in range(args.entries):
+        g = parts[int(rng.integers(len(parts)))]
+        g.volume_db = int(rng.integers(-6, 7))
+        snapshot = {"parts": [p.record() for p in parts], "markers": []}
+        snapshots.append(snapshot)
+        manager.push(snapshot)
+    push = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(100):
+        manager.undo()
+    undo = (time.perf_counter() - t0) / 100
+
+    legacy_file = os.path.join(tmp_dir, "history.json")
+    t0 = time.perf_counter()
+    with open(legacy_file, 'w', encoding='utf-8') as f:
+        json.dump({"snapshots": snapshots, "position": len(snapshots) - 1}, f)
+    legacy_save = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    with open(legacy_file, 'r', encoding='utf-8') as f:
+        json.load(f)
+    legacy_load = time.perf_counter() - t0
+    legacy_size = os.path.getsize(legacy_file)
+    os.remove(legacy_file)
+
+    t0 = time.perf_counter()
+    loaded = HistoryManager(tmp_dir, sr)
+    load = time.perf_counter() - t0
+    assert list(loaded.snapshots) == list(manager.snapshots) and loaded.position == manager.position
+    print(f"{args.entries} entries, {len(parts)} parts")
+    print(f"history.json: {legacy_size / 2 ** 20:.1f} MB, {1000 * legacy_save:.0f} ms per push/undo save, "
+          f"load {1000 * legacy_load:.0f} ms")
+    print(f"history.jsonl: {os.path.getsize(manager.history_file) / 2 ** 20:.1f} MB, "
+          f"{1000 * push / args.entries:.2f} ms per push, {1000 * undo:.3f} ms per undo, load {1000 * load:.0f} ms")
+
+
+def bench_snapshots(args):
+    """Снимки для undo: to_dict всех частей против общих записей частей"""
+    sr = 44100
+    parts = _random_parts(args.parts, int(max(args.seconds, args.parts / 4) * sr), sr)
+    rng = np.random.default_rng(3)
+    edits = [int(i) for i in rng.integers(0, len(parts), args.snapshots)]
+    for label, make in (("to_dict", lambda g: g.to_dict()), ("shared records", lambda g: g.record())):
+        snapshots = []
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        for i in edits:
+            parts[i].volume_db = (parts[i].volume_db + 1) % 6
+            snapshots.append({"parts": [make(g) for g in parts], "markers": []})
+        elapsed = time.perf_counter() - t0
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"{label}: {1000 * elapsed / len(edits):.2f} ms per edit, "
+              f"{memory / 2 ** 20:.1f} MB for {len(edits)} snapshots of {len(parts)} parts")
+        del snapshots
+
+
+def _legacy_envelope(mipmap, audio, offset, visible, width):
+    # прежний вариант: np.min/np.max на срезе для каждого столбца
+    spp = visible / width
+    if spp < mipmap.block_size:
+        values_min = values_max = audio
+        bs = 1
+    else:
+        lvl_idx, bs = 0, mipmap.block_size
+        while lvl_idx < len(mipmap.levels) - 1 and bs * 2 <= spp:
+            lvl_idx += 1
+            bs *= 2
+        values_min, values_max = mipmap.levels[lvl_idx]
+    res_min = np.zeros(width, dtype=np.float32)
+    res_max = np.zeros(width, dtype=np.float32)
+    for x in range(width):
+        ps = offset + x * visible // width
+        pe = offset + (x + 1) * visible // width
+        bi = max(0, min(ps // bs, len(values_min)))
+        bj = max(bi, min((pe + bs - 1) // bs, len(values_min)))
+        if bj > bi:
+            res_min[x] = np.min(values_min[bi:bj])
+            res_max[x] = np.max(values_max[bi:bj])
+    return res_min, res_max
+
+
+def bench_envelope(args):
+    """Огибающая для отрисовки волны: цикл по столбцам против reduceat"""
+    from mipmap import AudioMipmap
+    sr = 44100
+    audio = synth_voice(args.seconds, sr)[0].astype(np.float32)
+    mipmap = AudioMipmap()
+    mipmap.build(audio)
+    print(f"{args.seconds:.0f}s of audio")
+    for width in (800, 1920, 3840):
+        # от крупного плана (прямой расчёт по сэмплам) до всего файла (уровни mipmap)
+        for label, visible in (("direct", width * 64), ("zoomed", width * 2048), ("whole file", len(audio))):
+            offset = max(0, (len(audio) - visible) // 2)
+            timings = []
+            for fn in (lambda: _legacy_envelope(mipmap, audio, offset, visible, width),
+                       lambda: mipmap.get_envelope(audio, offset, visible, width)):
+                t0 = time.perf_counter()
+                for _ in range(10):
+                    fn()
+                timings.append(1000 * (time.perf_counter() - t0) / 10)
+            print(f"width {width}, {label}: loop {timings[0]:.2f} ms, reduceat {timings[1]:.2f} ms, "
+                  f"x{timings[0] / max(timings[1], 1e-9):.0f}")
+
+    # правка 2 с в середине: полная перестройка пирамиды против пересчёта участка
+    start = len(audio) // 2
+    audio[start:start + 2 * sr] *= 0.5
+    t0 = time.perf_counter()
+    AudioMipmap().build(audio)
+    full = time.perf_counter() - t0
+    mipmap.invalidate_range(start, start + 2 * sr)
+    t0 = time.perf_counter()
+    mipmap.update(audio)
+    partial = time.perf_counter() - t0
+    print(f"2s edit: full rebuild {1000 * full:.1f} ms, range update {1000 * partial:.2f} ms, "
+          f"x{full / max(partial, 1e-9):.0f}")
+
+
+BENCHMARKS = {
+    "pipeline": bench_pipeline,
+    "short-clips": bench_short_clips,
+    "parallel-long": bench_parallel_long,
+    "shared-weights": bench_shared_weights,
+    "threads": bench_threads,
+    "crepe": bench_crepe,
+    "parts": bench_parts,
+    "version-cache": bench_version_cache,
+    "history": bench_history,
+    "snapshots": bench_snapshots,
+    "envelope": bench_envelope,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RVC Editor benchmarks")
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    parser.add_argument("--model", default="", help=".pth file in assets/weights")
+    parser.add_argument("--index", default="", help=".index file")
+    parser.add_argument("--f0-method", default="rmvpe")
+    parser.add_argument("--seconds", type=float, default=600)
+    parser.add_argument("--clips", type=int, default=200, help="clip count for short-clips")
+    parser.add_argument("--parts", type=int, default=5000, help="part count for parts")
+    parser.add_argument("--entries", type=int, default=5000, help="history entries for history")
+    parser.add_argument("--snapshots", type=int, default=500, help="undo snapshots for snapshots")
+    parser.add_argument("--history-parts", type=int, default=200, help="part count for history")
+    parser.add_argument("--cache-mb", type=float, default=512, help="version cache budget for version-cache")
+    parser.add_argument("--hops", type=int, nargs="+", default=[32, 64, 128, 160, 256],
+                        help="mangio-crepe hop lengths for crepe")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes for parallel-long, shared-weights and threads")
+    args = parser.parse_args(argv)
+    BENCHMARKS[args.name](args)
+
+
+if __name__ == "__main__":
+    main()
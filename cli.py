@@ -0,0 +1,224 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+# Консольная пакетная конвертация без GUI: tkinter, PIL и sounddevice здесь не импортируются.
+# Прогресс и итоговый отчёт - JSON, по одному объекту на строку в stdout; лог - в stderr.
+
+PARAM_KEYS = [
+    "pitch", "f0_method", "index_rate", "filter_radius", "resample_sr",
+    "rms_mix_rate", "protect", "crepe_hop_length", "output_format",
+]
+
+
+def emit(event, **data):
+    sys.stdout.write(json.dumps(dict(event=event, **data), ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def build_parser():
+    from config_app import F0_METHODS, OUTPUT_FORMATS
+    parser = argparse.ArgumentParser(prog="rvc-editor", description="RVC Editor headless batch conversion")
+    parser.add_argument("inputs", nargs="+", help="audio files, folders or glob patterns")
+    parser.add_argument("-o", "--output", default=None, help="output folder (default: app/output)")
+    parser.add_argument("--model", default=None, help=".pth name in assets/weights")
+    parser.add_argument("--index", default=None, help=".index path (relative to RVC root or absolute)")
+    parser.add_argument("--preset", default=None, help="preset from presets.json, e.g. F1")
+    parser.add_argument("--pitch", type=int, default=None)
+    parser.add_argument("--f0-method", choices=F0_METHODS, default=None)
+    parser.add_argument("--index-rate", type=float, default=None)
+    parser.add_argument("--filter-radius", type=int, default=None)
+    parser.add_argument("--resample-sr", type=int, default=None)
+    parser.add_argument("--rms-mix-rate", type=float, default=None)
+    parser.add_argument("--protect", type=float, default=None)
+    parser.add_argument("--crepe-hop-length", type=int, default=None)
+    parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, default=None)
+    parser.add_argument("--suffix", default="_converted", help="output file name suffix")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes (1 = in-process)")
+    parser.add_argument("--f0-budget", type=float, default=None,
+                        help="seconds of F0 time per file allowed for --f0-method auto")
+    parser.add_argument("--threads", default="auto",
+                        help='threads per process for torch, FAISS and BLAS ("auto" splits the cores between workers)')
+    parser.add_argument("--chunk-workers", type=int, default=0,
+                        help="split each long file across N warm worker processes")
+    parser.add_argument("--no-share-weights", action="store_true",
+                        help="every worker loads its own copy of the model instead of shared memory")
+    parser.add_argument("--short-clips", action="store_true",
+                        help="pack short clips into batches (dataset throughput mode, in-process only)")
+    parser.add_argument("--no-manifest", action="store_true", help="convert everything, ignore .rvc_manifest.json")
+    parser.add_argument("--report", default=None, help="also write the final JSON report to this file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="converter log to stderr")
+    return parser
+
+
+def resolve_params(args):
+    """DEFAULT_SETTINGS <- пресет <- явные аргументы"""
+    from config_app import DEFAULT_SETTINGS, RVC_ROOT
+    from presets import load_presets
+
+    params = {k: DEFAULT_SETTINGS[k] for k in PARAM_KEYS}
+    model = DEFAULT_SETTINGS["model"]
+    index = DEFAULT_SETTINGS["index"]
+
+    if args.preset:
+        presets = load_presets()
+        if args.preset not in presets:
+            raise SystemExit(f"Unknown preset: {args.preset} (available: {', '.join(sorted(presets))})")
+        preset = presets[args.preset]
+        params.update({k: preset[k] for k in PARAM_KEYS if k in preset})
+        model = preset.get("model") or model
+        index = preset.get("index") or index
+
+    for key in PARAM_KEYS:
+        value = getattr(args, key)
+        if value is not None:
+            params[key] = value
+    model = args.model if args.model is not None else model
+    index = args.index if args.index is not None else index
+
+    if not model:
+        raise SystemExit("No model: use --model or a preset with a model")
+    if index and index != "(no index)":
+        params["index_path"] = index if os.path.isabs(index) else os.path.join(RVC_ROOT, index)
+    else:
+        params["index_path"] = ""
+    return model, params
+
+
+def collect_inputs(patterns):
+    from config_app import AUDIO_EXTENSIONS
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            names = sorted(os.listdir(pattern))
+            files.extend(os.path.join(pattern, n) for n in names if n.lower().endswith(AUDIO_EXTENSIONS))
+        elif os.path.isfile(pattern):
+            files.append(pattern)
+        else:
+            files.extend(sorted(p for p in glob.glob(pattern, recursive=True)
+                                if os.path.isfile(p) and p.lower().endswith(AUDIO_EXTENSIONS)))
+    seen = set()
+    unique = []
+    for f in files:
+        key = os.path.abspath(f)
+        if key not in seen:
+            seen.add(key)
+            unique.append(key)
+    return unique
+
+
+def plan_outputs(files, output_dir, suffix, output_format):
+    jobs = []
+    used = set()
+    for path in files:
+        name = os.path.splitext(os.path.basename(path))[0] + suffix
+        out_name = f"{name}.{output_format}"
+        n = 2
+        # одинаковые имена из разных папок не должны перезаписывать друг друга
+        while out_name in used:
+            out_name = f"{name}_{n}.{output_format}"
+            n += 1
+        used.add(out_name)
+        jobs.append((path, os.path.join(output_dir, out_name)))
+    return jobs
+
+
+def main(argv=None, cwd=None):
+    """cwd - папка, из которой запущена команда: относительные пути считаются от неё"""
+    args = build_parser().parse_args(argv)
+    from config_app import OUTPUT_DIR, RVC_ROOT
+
+    os.chdir(cwd or os.getcwd())
+    model, params = resolve_params(args)
+    if args.chunk_workers > 1:
+        params["chunk_workers"] = args.chunk_workers
+    if args.f0_budget is not None:
+        params["f0_budget"] = args.f0_budget
+    output_dir = os.path.abspath(args.output or OUTPUT_DIR)
+    report_path = os.path.abspath(args.report) if args.report else None
+    files = collect_inputs(args.inputs)
+    # RVC ищет конфиги и веса относительно своего корня
+    os.chdir(RVC_ROOT)
+    jobs = plan_outputs(files, output_dir, args.suffix, params["output_format"])
+    workers = max(1, args.jobs)
+
+    emit("start", total=len(jobs), workers=workers, model=model, output_dir=output_dir, params=params)
+    if not jobs:
+        emit("report", total=0, ok=0, failed=0, seconds=0.0, files=[])
+        return 1
+
+    log = (lambda m: print(m, file=sys.stderr, flush=True)) if args.verbose else (lambda m: None)
+    from converter import VoiceConverter
+    conv = VoiceConverter(log_callback=log, threads=args.threads)
+
+    if args.no_share_weights:
+        os.environ["rvc_share_weights"] = "0"
+    t0 = time.perf_counter()
+    source = None
+    if workers == 1 or not args.no_share_weights:
+        # при -j N модель в родителе одна на всех: воркеры получают её веса через общую память
+        if not conv.load_model(model, params["index_path"]):
+            emit("error", message=f"Model load failed: {model}")
+            return 2
+        source = conv
+    else:
+        # модель грузят воркеры; здесь она нужна только для хэша в манифесте
+        conv.current_model = model
+        conv.current_index = params["index_path"]
+    if workers > 1:
+        from workers import run_parallel
+
+        def runner(batch, on_result=None, **kwargs):
+            return run_parallel(batch, model, params["index_path"], workers, on_result=on_result,
+                                verbose=args.verbose, source=source, threads=args.threads, **kwargs)
+    else:
+        runner = None
+
+    done = []
+
+    def on_result(result):
+        done.append(result)
+        emit("file", done=len(done), total=len(jobs), **result)
+
+    try:
+        conv.convert_jobs(jobs, output_dir, on_result=on_result, runner=runner,
+                          use_manifest=not args.no_manifest,
+                          short_clips=args.short_clips and workers == 1, **params)
+    finally:
+        conv.cleanup()
+
+    elapsed = time.perf_counter() - t0
+    counts = {}
+    for r in done:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    ok = sum(1 for r in done if r["ok"])
+    report = {
+        "total": len(jobs),
+        "ok": ok,
+        "failed": len(jobs) - ok,
+        "by_status": counts,
+        "seconds": round(elapsed, 3),
+        "files_per_second": round(len(jobs) / max(elapsed, 1e-9), 3),
+        "clips_per_second": round(counts.get("converted", 0) / max(elapsed, 1e-9), 3),
+        "model": model,
+        "params": params,
+        "files": sorted(done, key=lambda r: r["output"]),
+    }
+    emit("report", **report)
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0 if ok == len(jobs) else 1
+
+
+if __name__ == "__main__":
+    launch_dir = os.getcwd()
+    import main as _bootstrap  # окружение RVC и патч mangio-crepe
+    sys.exit(main(cwd=launch_dir))
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import socket
+import struct
+
+import numpy as np
+
+# Протокол службы конвертации: кадр = 4 байта длины (big-endian) + JSON-заголовок,
+# за ним header["payload"] байт данных (float32 little-endian, моно) или ничего.
+# Клиент не импортирует ни torch, ни RVC - только сокеты и numpy.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 47391
+DEFAULT_ADDRESS = f"{DEFAULT_HOST}:{DEFAULT_PORT}"
+
+FINISHED = ("done", "failed", "cancelled")
+
+_DEFAULT_TIMEOUT = object()
+
+
+class ServiceError(Exception):
+    pass
+
+
+def parse_address(address):
+    """'host:port', 'port' или 'unix:/path/to.sock'"""
+    address = (address or DEFAULT_ADDRESS).strip()
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[5:]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or DEFAULT_HOST, int(port))
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if not k:
+            return None
+        got += k
+    return bytes(buf)
+
+
+def send_frame(sock, header, payload=b""):
+    data = json.dumps(dict(header, payload=len(payload)), ensure_ascii=False).encode('utf-8')
+    sock.sendall(struct.pack(">I", len(data)) + data)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_frame(sock):
+    raw = _recv_exact(sock, 4)
+    if raw is None:
+        return None, b""
+    header = json.loads(_recv_exact(sock, struct.unpack(">I", raw)[0]).decode('utf-8'))
+    size = header.get("payload", 0)
+    payload = _recv_exact(sock, size) if size else b""
+    return header, payload
+
+
+def audio_to_bytes(audio):
+    return np.ascontiguousarray(audio, dtype='<f4').tobytes()
+
+
+def bytes_to_audio(payload):
+    return np.frombuffer(payload, dtype='<f4').copy()
+
+
+class ServiceClient:
+    """Клиент службы: каждый вызов - отдельное короткое соединение"""
+
+    def __init__(self, address=None, timeout=10.0):
+        self.family, self.address = parse_address(address)
+        self.timeout = timeout
+
+    def call(self, op, payload=b"", timeout=_DEFAULT_TIMEOUT, **fields):
+        """timeout=None - ждать ответа без ограничения (result без wait)"""
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout if timeout is _DEFAULT_TIMEOUT else timeout)
+            sock.connect(self.address)
+            send_frame(sock, dict(fields, op=op), payload)
+            header, data = recv_frame(sock)
+        finally:
+            sock.close()
+        if header is None:
+            raise ServiceError("Connection closed by service")
+        if not header.get("ok"):
+            raise ServiceError(header.get("error", "Unknown service error"))
+        return header, data
+
+    def ping(self):
+        return self.call("ping")[0]
+
+    def submit_file(self, input_path, output_path=None, model="", index="", priority=0, **params):
+        """output_path=None - результат вернётся в result() как float32"""
+        header, _ = self.call("submit", kind="file", input=os.path.abspath(input_path),
+                              output=os.path.abspath(output_path) if output_path else None,
+                              model=model, index=index, priority=priority, params=params)
+        return header["id"]
+
+    def submit_buffer(self, audio, sample_rate, model="", index="", priority=0, **params):
+        header, _ = self.call("submit", audio_to_bytes(audio), kind="buffer", sr=int(sample_rate),
+                              model=model, index=index, priority=priority, params=params)
+        return header["id"]
+
+    def submit_folder(self, input_dir, output_dir, model="", index="", priority=0, **params):
+        header, _ = self.call("submit", kind="folder", input=os.path.abspath(input_dir),
+                              output=os.path.abspath(output_dir),
+                              model=model, index=index, priority=priority, params=params)
+        return header["id"]
+
+    def load(self, model, index="", priority=10):
+        header, _ = self.call("submit", kind="load", model=model, index=index, priority=priority, params={})
+        return header["id"]
+
+    def status(self, job_id):
+        return self.call("status", id=job_id)[0]["job"]
+
+    def cancel(self, job_id):
+        return self.call("cancel", id=job_id)[0]["job"]
+
+    def jobs(self):
+        return self.call("list")[0]["jobs"]
+
+    def result(self, job_id, timeout=None):
+        """Ждёт завершения задания: (info, (sr, float32) или None)"""
+        header, data = self.call("result", id=job_id, wait=timeout,
+                                 timeout=None if timeout is None else timeout + self.timeout)
+        info = header["job"]
+        audio = (info["sr"], bytes_to_audio(data)) if header.get("payload") else None
+        return info, audio
+
+    def shutdown(self):
+        return self.call("shutdown")[0]
+
+
+def is_available(address=None, timeout=0.5):
+    try:
+        ServiceClient(address, timeout=timeout).ping()
+        return True
+    except (OSError, ServiceError, ValueError):
+        return False
+
+
+class RemoteConverter:
+    """Замена VoiceConverter для GUI: работа уходит в службу, модели держит она"""
+
+    def __init__(self, address=None, progress_callback=None, log_callback=None):
+        self.client = ServiceClient(address)
+        self.progress_callback = progress_callback or (lambda x, y: None)
+        self.log_callback = log_callback or print
+        self.current_model = None
+        self.current_model_name = None
+        self.current_index = None
+        self.is_initialized = False
+
+    def log(self, message):
+        self.log_callback(str(message))
+
+    def set_progress(self, value, text=""):
+        self.progress_callback(value, text)
+
+    def initialize(self):
+        try:
+            info = self.client.ping()
+            self.is_initialized = True
+            self.log(f"Service: {info.get('address')} (pid {info.get('pid')})")
+            return True
+        except (OSError, ServiceError) as e:
+            self.log(f"Service error: {e}")
+            return False
+
+    def is_model_loaded(self, model_name, index_path):
+        return (self.is_initialized and self.current_model_name == model_name
+                and self.current_index == index_path)
+
+    def load_model(self, model_path, index_path=""):
+        model_name = os.path.basename(model_path)
+        try:
+            info, _ = self.client.result(self.client.load(model_name, index_path))
+        except (OSError, ServiceError) as e:
+            self.log(f"Service error: {e}")
+            return False
+        if info["status"] != "done":
+            self.log(info.get("error") or info["status"])
+            return False
+        self.current_model = model_path
+        self.current_model_name = model_name
+        self.current_index = index_path
+        return True
+
+    def ensure_model(self, model_name, index_path):
+        return self.is_model_loaded(model_name, index_path) or self.load_model(model_name, index_path)
+
+    def _job_params(self, kwargs):
+        params = dict(kwargs)
+        params.pop("model", None)
+        index = params.pop("index_path", self.current_index or "")
+        return index, params
+
+    def convert_audio(self, input_path, **kwargs):
+        index, params = self._job_params(kwargs)
+        try:
+            job_id = self.client.submit_file(input_path, None, model=self.current_model_name,
+                                             index=index, priority=5, **params)
+            info, audio = self.client.result(job_id)
+        except (OSError, ServiceError) as e:
+            self.log(f"Service error: {e}")
+            return None
+        if info["status"] != "done":
+            self.log(info.get("error") or info["status"])
+            return None
+        return audio
+
+    def convert(self, input_path, output_path, **kwargs):
+        index, params = self._job_params(kwargs)
+        try:
+            job_id = self.client.submit_file(input_path, output_path, model=self.current_model_name,
+                                             index=index, **params)
+            info, _ = self.client.result(job_id)
+        except (OSError, ServiceError) as e:
+            self.log(f"Service error: {e}")
+            return False
+        return info["status"] == "done"
+
+    def convert_folder(self, input_dir, output_dir, **kwargs):
+        index, params = self._job_params(kwargs)
+        try:
+            job_id = self.client.submit_folder(input_dir, output_dir, model=self.current_model_name,
+                                               index=index, **params)
+            while True:
+                info = self.client.status(job_id)
+                progress = info.get("progress") or {}
+                total = progress.get("total") or 0
+                if total:
+                    done = progress.get("done", 0)
+                    self.set_progress(int(done / total * 100), f"{done}/{total}")
+                if info["status"] in FINISHED:
+                    break
+                time.sleep(0.5)
+        except (OSError, ServiceError) as e:
+            self.log(f"Service error: {e}")
+            return []
+        if info["status"] != "done":
+            self.log(info.get("error") or info["status"])
+        return [tuple(r) for r in (info.get("result") or [])]
+
+    def cleanup(self):
+        pass
@@ -0,0 +1,296 @@
+import heapq
+import bisect
+import numpy as np
+
+from intervals import PartIndex
+from store import version_exists
+
+# Сборка результата редактора из частей.
+# Вклад части зависит только от её данных и базы (того, что под ней по apply_order),
+# но не от уже собранного результата: базу под кроссфейд часть пишет сама. Поэтому
+# итог в каждом сэмпле - вклад последней применённой части, которая им владеет.
+# План - плоский список сегментов (начало, конец, часть); он зависит только от
+# границ, порядка и режима вложенных частей и кэшируется, пока они не изменятся.
+
+SILENCE = 0.0001
+
+
+def fade_curves(length, crossfade_type=0):
+    t = np.linspace(0, 1, length, dtype=np.float32)
+    if crossfade_type == 0:
+        return t, 1 - t
+    return np.sin(t * np.pi / 2), np.cos(t * np.pi / 2)
+
+
+def crossfade(old, data, sr, fade_ms, cf_left=0, cf_right=None, crossfade_type=0,
+              fade_left=True, fade_right=True):
+    """data поверх old (той же длины) с переходами у cf_left и cf_right"""
+    write_len = len(data)
+    fade_samples = min(int(sr * fade_ms / 1000), write_len // 4)
+    fade_samples = max(20, fade_samples)
+
+    result = data.copy()
+    fade_in, fade_out = fade_curves(fade_samples, crossfade_type)
+
+    if fade_left and cf_left + fade_samples <= write_len:
+        old_left = old[cf_left:cf_left + fade_samples]
+        if np.any(np.abs(old_left) > SILENCE):
+            result[cf_left:cf_left + fade_samples] = old_left * fade_out + result[cf_left:cf_left + fade_samples] * fade_in
+
+    if fade_right:
+        if cf_right is None:
+            cf_right = write_len
+        cf_right = min(cf_right, write_len)
+
+        if cf_right > fade_samples and cf_right > cf_left + fade_samples:
+            old_right = old[cf_right - fade_samples:cf_right]
+            if np.any(np.abs(old_right) > SILENCE):
+                fade_start = cf_right - fade_samples
+                result[fade_start:cf_right] = result[fade_start:cf_right] * fade_out + old_right * fade_in
+
+    return result
+
+
+def part_gain(part):
+    """Множитель громкости части или None; у оригинала с версиями громкость не применяется"""
+    skip_vol = part.has_base and part.active_idx == 0 and len(part.versions) > 1
+    if part.volume_db != 0 and not skip_vol:
+        return 10 ** (part.volume_db / 20)
+    return None
+
+
+def has_data(part):
+    """Есть ли у активной версии данные (без чтения файла)"""
+    idx = part.active_idx
+    if part.has_base and idx == 0:
+        return True
+    if not part.versions or idx >= len(part.versions):
+        return False
+    path = part.versions[idx]
+    if path == "__SILENT__":
+        return True
+    if path == "__COMPUTED_BASE__":
+        return False
+    return bool(path) and version_exists(path)
+
+
+def owned_runs(part, index, preserve_nested):
+    """Куски части [(s, e)] от её начала, которые она пишет: вся длина без вложенных частей"""
+    length = part.end - part.start
+    if length <= 0:
+        return []
+    nested = index.nested(part) if preserve_nested else []
+    if not nested:
+        return [(0, length)]
+    runs = []
+    current = 0
+    for occ_start, occ_end in sorted((n.start - part.start, n.end - part.start) for n in nested):
+        seg_end = min(occ_start, length)
+        if current < seg_end:
+            runs.append((current, seg_end))
+        current = max(current, occ_end)
+    if current < length:
+        runs.append((current, length))
+    return runs
+
+
+class _Pass:
+    """Один проход сборки: данные и базы частей читаются и считаются по разу"""
+
+    def __init__(self, index, sr):
+        self.index = index
+        self.sr = sr
+        self._data = {}
+        self._bases = {}
+        self._renders = {}
+
+    def base(self, part):
+        if part.id in self._bases:
+            return self._bases[part.id]
+        start, end = part.start, part.end
+        length = end - start
+        base = np.zeros(length, dtype=np.float32)
+
+        underlying = [g for g in self.index.overlapping(start, end)
+                      if g.id != part.id and g.apply_order < part.apply_order]
+        underlying.sort(key=lambda g: g.apply_order)
+
+        for g in underlying:
+            data = self.data(g)
+            if data is None:
+                continue
+            gain = part_gain(g)
+            if gain is not None:
+                data = data * gain
+
+            overlap_start = max(g.start, start)
+            overlap_end = min(g.end, end)
+            if overlap_start >= overlap_end:
+                continue
+
+            base_pos = overlap_start - start
+            data_pos = overlap_start - g.start
+            copy_len = min(overlap_end - overlap_start, len(data) - data_pos, length - base_pos)
+            if copy_len > 0:
+                base[base_pos:base_pos + copy_len] = data[data_pos:data_pos + copy_len]
+
+        self._bases[part.id] = base
+        return base
+
+    def data(self, part, idx=None):
+        if idx is None:
+            idx = part.active_idx
+        key = (part.id, idx)
+        if key in self._data:
+            return self._data[key]
+
+        if part.has_base and idx == 0:
+            data = self.base(part)
+        else:
+            data = part.get_data(idx)
+            if data is not None:
+                nan_mask = np.isnan(data)
+                if np.any(nan_mask):
+                    base = self.base(part)
+                    if len(base) == len(data):
+                        data = data.copy()
+                        data[nan_mask] = base[nan_mask]
+                    else:
+                        data = np.nan_to_num(data, nan=0.0)
+        self._data[key] = data
+        return data
+
+    def render(self, part, preserve_nested, blend, crossfade_type):
+        """(вклад части длиной в часть, её куски) или None, если писать нечего.
+
+        Вне кусков вклад не определён. Данные части всегда длиной в часть
+        (get_data дополняет их базой), так что хвоста за данными нет.
+        """
+        data = self.data(part)
+        if data is None or part.end <= part.start:
+            return None
+
+        gain = part_gain(part)
+        if gain is not None:
+            data = data * gain
+        write_data = data[:part.end - part.start]
+        write_len = len(write_data)
+        runs = owned_runs(part, self.index, preserve_nested)
+
+        is_base = part.has_base and part.active_idx == 0
+        if not (blend > 0 and (not is_base or gain is not None)):
+            return write_data, runs
+        base = self.base(part)
+        if not np.any(np.abs(base) > SILENCE):
+            return write_data, runs
+
+        params = part.get_params()
+        wav_start = params.get("wav_start", part.start) if params else part.start
+        wav_end = params.get("wav_end", part.end) if params else part.end
+        cf_left = max(0, wav_start - part.start)
+        cf_right = min(wav_end - part.start, write_len)
+
+        if not (preserve_nested and self.index.nested(part)):
+            if write_len < 200:
+                return write_data, runs
+            return crossfade(base[:write_len], write_data, self.sr, blend, cf_left, cf_right, crossfade_type), runs
+
+        out = write_data.copy()
+        for i, (d_s, d_e) in enumerate(runs):
+            is_first = i == 0
+            is_last = i == len(runs) - 1
+            if not (is_first or is_last) or d_e - d_s < 100:
+                continue
+            seg_cf_right = cf_right - d_s if is_last and d_s < cf_right <= d_e else None
+            seg_cf_left = cf_left - d_s if is_first and d_s < cf_left else 0
+            out[d_s:d_e] = crossfade(base[d_s:d_e], write_data[d_s:d_e], self.sr, blend,
+                                     seg_cf_left, seg_cf_right, crossfade_type,
+                                     fade_left=is_first, fade_right=is_last)
+        return out, runs
+
+    def applied(self, part, blend, crossfade_type):
+        """render с сохранёнными у части параметрами применения"""
+        if part.id not in self._renders:
+            self._renders[part.id] = self.render(
+                part, part.last_preserve,
+                part.last_blend if part.last_blend is not None else blend,
+                part.last_crossfade_type if part.last_crossfade_type is not None else crossfade_type)
+        return self._renders[part.id]
+
+
+class Compositor:
+
+    def __init__(self, index=None):
+        self.index = index or PartIndex()
+        self._plan_key = None
+        self._plan = None
+
+    def new_pass(self, parts, sr):
+        return _Pass(self.index.sync(parts), sr)
+
+    def reset(self):
+        self._plan_key = None
+        self._plan = None
+
+    def plan(self, parts):
+        """[(start, end, part)] по возрастанию: кто владеет каждым участком результата"""
+        key = tuple((p.id, p.start, p.end, p.apply_order, bool(p.last_preserve), has_data(p))
+                    for p in parts)
+        if key == self._plan_key:
+            return self._plan
+
+        index = self.index.sync(parts)
+        claims = []
+        ordered = sorted(parts, key=lambda p: p.apply_order)
+        for rank, part in enumerate(ordered):
+            if not has_data(part):
+                continue
+            for s, e in owned_runs(part, index, part.last_preserve):
+                claims.append((part.start + s, part.start + e, rank, part))
+
+        points = sorted({c[0] for c in claims} | {c[1] for c in claims})
+        claims.sort(key=lambda c: c[0])
+        segments = []
+        active = []
+        ci = 0
+        for i, pos in enumerate(points[:-1]):
+            while ci < len(claims) and claims[ci][0] == pos:
+                s, e, rank, part = claims[ci]
+                heapq.heappush(active, (-rank, e, part))
+                ci += 1
+            while active and active[0][1] <= pos:
+                heapq.heappop(active)
+            if not active:
+                continue
+            owner = active[0][2]
+            nxt = points[i + 1]
+            if segments and segments[-1][2] is owner and segments[-1][1] == pos:
+                segments[-1] = (segments[-1][0], nxt, owner)
+            else:
+                segments.append((pos, nxt, owner))
+
+        self._plan_key = key
+        self._plan = segments
+        return segments
+
+    def compose(self, parts, sr, audio, display, spans, blend=0, crossfade_type=0):
+        """Рисует участки spans в audio и display по плану; участки без владельца - тишина"""
+        segments = self.plan(parts)
+        starts = [s for s, _, _ in segments]
+        job = self.new_pass(parts, sr)
+        for span_s, span_e in spans:
+            audio[span_s:span_e] = 0
+            display[span_s:span_e] = 0
+            i = max(0, bisect.bisect_right(starts, span_s) - 1)
+            while i < len(segments) and segments[i][0] < span_e:
+                s, e, part = segments[i]
+                i += 1
+                s, e = max(s, span_s), min(e, span_e)
+                if s >= e:
+                    continue
+                rendered = job.applied(part, blend, crossfade_type)
+                if rendered is None:
+                    continue
+                out = rendered[0]
+                audio[s:e] = out[s - part.start:e - part.start]
+                display[s:e] = out[s - part.start:e - part.start]
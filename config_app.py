@@ -18,6 +18,7 @@ INPUT_DIR = os.path.join(APP_DIR, "input")
 OUTPUT_DIR = os.path.join(APP_DIR, "output")
 TEMP_DIR = os.path.join(APP_DIR, "temp")
 SETTINGS_FILE = os.path.join(APP_DIR, "settings.json")
+TUNING_FILE = os.path.join(APP_DIR, "tuning.json")
 
 os.makedirs(INPUT_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -46,6 +47,10 @@ DEFAULT_SETTINGS = {
     "preset_load_f0": False,
     "blend_mode": 0,
     "crossfade_type": 0,
+    "service_address": "",
+    "threads": "auto",
+    "f0_budget": 10.0,
+    "version_cache_mb": 512,
 }
 
 AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg', '.m4a', '.wma', '.aac')
@@ -60,7 +65,7 @@ AUDIO_FORMATS = [
 
 OUTPUT_FORMATS = ["wav", "flac", "mp3", "m4a"]
 
-F0_METHODS = ["pm", "harvest", "crepe", "crepe-tiny", "mangio-crepe", "mangio-crepe-tiny", "rmvpe"]
+F0_METHODS = ["pm", "harvest", "crepe", "crepe-tiny", "mangio-crepe", "mangio-crepe-tiny", "rmvpe", "auto"]
 
 CREPE_METHODS_WITH_HOP = ["mangio-crepe", "mangio-crepe-tiny"]
 
@@ -1,5 +1,6 @@
 import os
 import sys
+import itertools
 import traceback
 
 from lang import tr
@@ -34,14 +35,19 @@ import torch
 import numpy as np
 import soundfile as sf
 
-from config_app import AUDIO_EXTENSIONS
+from config_app import AUDIO_EXTENSIONS, DEFAULT_SETTINGS
+
+_buffer_ids = itertools.count(1)
 
 
 class VoiceConverter:
     
-    def __init__(self, progress_callback=None, log_callback=None):
+    def __init__(self, progress_callback=None, log_callback=None, threads="auto", f0_budget=None):
         self.progress_callback = progress_callback or (lambda x, y: None)
         self.log_callback = log_callback or print
+        self.threads = threads
+        self.f0_budget = f0_budget if f0_budget is not None else DEFAULT_SETTINGS["f0_budget"]
+        self.thread_budget = None
         
         self.config = None
         self.vc = None
@@ -66,6 +72,9 @@ class VoiceConverter:
             
             from configs.config import Config
             self.config = Config()
+            # нарезка Pipeline, подобранная tuning.py на этой машине
+            from tuning import apply_chunking
+            apply_chunking(self.config, self.log)
             
             self.set_progress(20, tr("Loading VC module..."))
             
@@ -75,6 +84,7 @@ class VoiceConverter:
             self.set_progress(30, tr("RVC initialized"))
             self.log(f"{tr('Device:')} {self.config.device}")
             self.log(f"{tr('Half precision:')} {self.config.is_half}")
+            self.set_threads(self.threads)
             
             self.is_initialized = True
             return True
@@ -84,6 +94,14 @@ class VoiceConverter:
             self.log(traceback.format_exc())
             return False
     
+    def set_threads(self, threads="auto", workers=1):
+        """Потоки torch, FAISS и BLAS этого процесса: "auto" или число (thread_budget)"""
+        import thread_budget
+        self.threads = threads
+        self.thread_budget = thread_budget.apply(thread_budget.plan(threads, workers), self.log)
+        self.log(f"{tr('Threads:')} {thread_budget.describe(self.thread_budget)}")
+        return self.thread_budget
+    
     def is_model_loaded(self, model_name, index_path):
         if not self.is_initialized or self.vc is None:
             return False
@@ -128,65 +146,152 @@ class VoiceConverter:
             self.log(traceback.format_exc())
             return False
     
+    def shared_weights(self, with_rmvpe=False):
+        """Веса текущей модели в общей памяти для пулов воркеров; None - каждый грузит сам"""
+        if not self.is_initialized or self.vc is None or os.getenv("rvc_share_weights", "1") == "0":
+            return None
+        try:
+            return self.vc.export_shared(self.current_model_name, with_rmvpe=with_rmvpe)
+        except Exception as e:
+            self.log(f"{tr('Shared weights unavailable:')} {e}")
+            return None
+
+    def attach_shared(self, model_path, index_path, shared):
+        """Модель из shared_weights() родительского процесса, без чтения с диска"""
+        if not self.initialize():
+            return False
+        try:
+            self.vc.attach_shared(shared)
+        except Exception as e:
+            self.log(f"{tr('Shared weights unavailable:')} {e}")
+            return False
+        self.current_model = model_path
+        self.current_model_name = shared["sid"]
+        self.current_index = index_path
+        return True
+
     def ensure_model(self, model_name, index_path):
         if self.is_model_loaded(model_name, index_path):
             return True
         return self.load_model(model_name, index_path)
             
-    def convert(self, input_path, output_path, **kwargs):
+    def resolve_f0_method(self, f0_method, duration, budget=None):
+        """"auto" -> самый точный метод, чей F0 для duration секунд укладывается в бюджет"""
+        if f0_method != "auto":
+            return f0_method
+        from tuning import choose_f0_method
+        budget = float(budget if budget is not None else self.f0_budget)
+        method = choose_f0_method(duration, budget, self.config)
+        if method is None:
+            # без калибровки (python app/tuning.py f0) - метод по умолчанию
+            method = DEFAULT_SETTINGS["f0_method"]
+        self.log(f"  f0=auto -> {method} ({duration:.1f}s, {tr('budget')} {budget:g}s)")
+        return method
+    
+    def _infer(self, input_path, **kwargs):
+        pitch = kwargs.get("pitch", 0)
+        f0_method = kwargs.get("f0_method", "rmvpe")
+        index_path = kwargs.get("index_path", self.current_index or "")
+        index_rate = kwargs.get("index_rate", 0.75)
+        filter_radius = kwargs.get("filter_radius", 3)
+        resample_sr = kwargs.get("resample_sr", 0)
+        rms_mix_rate = kwargs.get("rms_mix_rate", 0.25)
+        protect = kwargs.get("protect", 0.33)
+        crepe_hop_length = kwargs.get("crepe_hop_length", 120)
+        output_dtype = kwargs.get("output_dtype", "int16")
+        audio = kwargs.get("audio")
+        chunk_map = kwargs.get("chunk_map")
+        chunk_workers = int(kwargs.get("chunk_workers", 0) or 0)
+        if chunk_map is None and chunk_workers > 1:
+            chunk_map = self._get_chunk_pool(chunk_workers).map_chunks
+        if f0_method == "auto":
+            # выбор зависит от длины - декодируем заранее, vc_single второй раз не читает
+            if audio is None:
+                from infer.modules.vc.modules import decode_audio
+                audio = decode_audio(input_path, 16000)
+            f0_method = self.resolve_f0_method(f0_method, len(audio) / 16000, kwargs.get("f0_budget"))
+        
+        self.log(f"{tr('Converting:')} {os.path.basename(input_path)}")
+        self.log(f"  pitch={pitch}, f0={f0_method}, index_rate={index_rate:.2f}, protect={protect:.2f}")
+        
+        result = self.vc.vc_single(
+            0, input_path, pitch, None, f0_method, index_path, "",
+            index_rate, filter_radius, resample_sr, rms_mix_rate, protect, crepe_hop_length,
+            output_dtype=output_dtype, audio=audio, chunk_map=chunk_map
+        )
+        
+        if result is None:
+            self.log(tr("Error: conversion result is empty"))
+            return None
+            
+        info, audio_tuple = result
+        
+        if audio_tuple is None or audio_tuple[0] is None:
+            self.log(f"{tr('Conversion error:')} {info}")
+            return None
+        
+        # decode / npy / f0 / infer
+        self.log(f"  {info.strip().splitlines()[-1]}")
+        return audio_tuple
+    
+    def _get_chunk_pool(self, workers):
+        """Тёплые процессы для кусков длинного файла, пересоздаются при смене модели"""
+        from workers import ChunkPool
+        key = (self.current_model_name, self.current_index, workers)
+        pool = getattr(self, "_chunk_pool", None)
+        if pool is None or pool.key != key:
+            if pool is not None:
+                pool.close()
+            self.log(f"{tr('Starting chunk workers:')} {workers}")
+            self._chunk_pool = ChunkPool(self.current_model, self.current_index, workers,
+                                         source=self, threads=self.threads)
+        return self._chunk_pool
+    
+    def convert_audio(self, input_path, **kwargs):
+        """Конвертация в память: (sample_rate, float32) без записи на диск"""
         if not self.is_initialized or self.vc is None:
             self.log(tr("Converter not initialized!"))
-            return False
+            return None
             
         try:
-            pitch = kwargs.get("pitch", 0)
-            f0_method = kwargs.get("f0_method", "rmvpe")
-            index_path = kwargs.get("index_path", self.current_index or "")
-            index_rate = kwargs.get("index_rate", 0.75)
-            filter_radius = kwargs.get("filter_radius", 3)
-            resample_sr = kwargs.get("resample_sr", 0)
-            rms_mix_rate = kwargs.get("rms_mix_rate", 0.25)
-            protect = kwargs.get("protect", 0.33)
-            crepe_hop_length = kwargs.get("crepe_hop_length", 120)
+            return self._infer(input_path, **dict(kwargs, output_dtype="float32"))
+        except Exception as e:
+            self.log(f"{tr('Conversion error:')} {str(e)}")
+            self.log(traceback.format_exc())
+            return None
             
-            self.log(f"{tr('Converting:')} {os.path.basename(input_path)}")
-            self.log(f"  pitch={pitch}, f0={f0_method}, index_rate={index_rate:.2f}, protect={protect:.2f}")
+    def convert_array(self, audio, sample_rate, name=None, **kwargs):
+        """Конвертация float32-буфера: (sample_rate, float32) без файлов"""
+        if not self.is_initialized or self.vc is None:
+            self.log(tr("Converter not initialized!"))
+            return None
             
-            result = self.vc.vc_single(
-                0, input_path, pitch, None, f0_method, index_path, "",
-                index_rate, filter_radius, resample_sr, rms_mix_rate, protect, crepe_hop_length
-            )
+        try:
+            from infer.modules.vc.pipeline import resample
+            audio = np.asarray(audio, dtype=np.float32)
+            if audio.ndim > 1:
+                audio = audio.mean(axis=1)
+            audio = resample(audio, int(sample_rate), 16000).astype(np.float32, copy=False)
+            # имя - ключ кэша harvest в пайплайне, у разных буферов оно должно различаться
+            name = name or f"<buffer {next(_buffer_ids)}>"
+            return self._infer(name, **dict(kwargs, audio=audio, output_dtype="float32"))
+        except Exception as e:
+            self.log(f"{tr('Conversion error:')} {str(e)}")
+            self.log(traceback.format_exc())
+            return None
             
-            if result is None:
-                self.log(tr("Error: conversion result is empty"))
-                return False
-                
-            info, audio_tuple = result
+    def convert(self, input_path, output_path, **kwargs):
+        if not self.is_initialized or self.vc is None:
+            self.log(tr("Converter not initialized!"))
+            return False
             
-            if audio_tuple is None or audio_tuple[0] is None:
-                self.log(f"{tr('Conversion error:')} {info}")
+        try:
+            audio_tuple = self._infer(input_path, **kwargs)
+            if audio_tuple is None:
                 return False
                 
             sample_rate, audio_data = audio_tuple
-            
-            output_ext = os.path.splitext(output_path)[1].lower()
-            
-            if output_ext == ".mp3":
-                temp_wav = output_path.replace(".mp3", "_temp.wav")
-                sf.write(temp_wav, audio_data, sample_rate)
-                self._convert_to_mp3(temp_wav, output_path)
-                if os.path.exists(temp_wav):
-                    os.remove(temp_wav)
-            elif output_ext == ".flac":
-                sf.write(output_path, audio_data, sample_rate, format='FLAC')
-            elif output_ext == ".m4a":
-                temp_wav = output_path.replace(".m4a", "_temp.wav")
-                sf.write(temp_wav, audio_data, sample_rate)
-                self._convert_to_m4a(temp_wav, output_path)
-                if os.path.exists(temp_wav):
-                    os.remove(temp_wav)
-            else:
-                sf.write(output_path, audio_data, sample_rate)
+            self._write_output(output_path, audio_data, sample_rate)
                 
             self.log(f"  ✓ {tr('Saved:')} {os.path.basename(output_path)}")
             return True
@@ -196,6 +301,30 @@ class VoiceConverter:
             self.log(traceback.format_exc())
             return False
     
+    def _write_output(self, output_path, audio_data, sample_rate):
+        output_ext = os.path.splitext(output_path)[1].lower()
+        is_float = audio_data.dtype.kind == "f"
+        # float-выход пишем без потерь: WAV - FLOAT, FLAC - 24 бита
+        wav_subtype = "FLOAT" if is_float else None
+        
+        # не перезаписывать содержимое жёсткой ссылки, общей с дубликатом
+        if os.path.exists(output_path) and os.stat(output_path).st_nlink > 1:
+            os.remove(output_path)
+        
+        if output_ext == ".mp3":
+            self._convert_to_mp3(audio_data, sample_rate, output_path)
+        elif output_ext == ".flac":
+            if is_float:
+                # float-выход не нормирован по пику, а libsndfile при переводе в целые
+                # не ограничивает: сэмплы за пределами [-1, 1] перевернулись бы
+                audio_data = np.clip(audio_data, -1.0, 1.0)
+            sf.write(output_path, audio_data, sample_rate, format='FLAC',
+                     subtype="PCM_24" if is_float else None)
+        elif output_ext == ".m4a":
+            self._convert_to_m4a(audio_data, sample_rate, output_path)
+        else:
+            sf.write(output_path, audio_data, sample_rate, subtype=wav_subtype)
+    
     def _get_ffmpeg_path(self):
         ffmpeg_paths = [
             os.path.join(RVC_ROOT, "ffmpeg.exe"),
@@ -209,42 +338,41 @@ class VoiceConverter:
             if os.path.exists(p):
                 return p
         return None
+    
+    def _encode_ffmpeg(self, audio_data, sample_rate, output_path, codec_args):
+        """WAV подаётся в stdin ffmpeg, без временного файла"""
+        import io
+        import subprocess
+        buf = io.BytesIO()
+        subtype = "FLOAT" if audio_data.dtype.kind == "f" else "PCM_16"
+        sf.write(buf, audio_data, sample_rate, format='WAV', subtype=subtype)
+        cmd = [self._get_ffmpeg_path(), "-y", "-f", "wav", "-i", "pipe:0"] + codec_args + [output_path]
+        subprocess.run(cmd, input=buf.getvalue(), capture_output=True, check=True)
+    
+    def _save_wav_fallback(self, audio_data, sample_rate, output_path):
+        new_path = os.path.splitext(output_path)[0] + ".wav"
+        subtype = "FLOAT" if audio_data.dtype.kind == "f" else None
+        sf.write(new_path, audio_data, sample_rate, subtype=subtype)
             
-    def _convert_to_mp3(self, wav_path, mp3_path):
+    def _convert_to_mp3(self, audio_data, sample_rate, mp3_path):
         try:
-            import subprocess
-            ffmpeg_path = self._get_ffmpeg_path()
-            if ffmpeg_path:
-                cmd = [ffmpeg_path, "-y", "-i", wav_path, "-b:a", "320k", mp3_path]
-                subprocess.run(cmd, capture_output=True, check=True)
-            else:
-                import shutil
-                new_path = mp3_path.replace(".mp3", ".wav")
-                shutil.copy(wav_path, new_path)
-                self.log(tr("FFmpeg not found, saved as WAV"))
+            self._encode_ffmpeg(audio_data, sample_rate, mp3_path, ["-b:a", "320k"])
+        except FileNotFoundError:
+            self._save_wav_fallback(audio_data, sample_rate, mp3_path)
+            self.log(tr("FFmpeg not found, saved as WAV"))
         except Exception as e:
             self.log(f"{tr('MP3 conversion error:')} {e}")
-            import shutil
-            new_path = mp3_path.replace(".mp3", ".wav")
-            shutil.copy(wav_path, new_path)
+            self._save_wav_fallback(audio_data, sample_rate, mp3_path)
             
-    def _convert_to_m4a(self, wav_path, m4a_path):
+    def _convert_to_m4a(self, audio_data, sample_rate, m4a_path):
         try:
-            import subprocess
-            ffmpeg_path = self._get_ffmpeg_path()
-            if ffmpeg_path:
-                cmd = [ffmpeg_path, "-y", "-i", wav_path, "-c:a", "aac", "-b:a", "256k", m4a_path]
-                subprocess.run(cmd, capture_output=True, check=True)
-            else:
-                import shutil
-                new_path = m4a_path.replace(".m4a", ".wav")
-                shutil.copy(wav_path, new_path)
-                self.log(tr("FFmpeg not found, saved as WAV"))
+            self._encode_ffmpeg(audio_data, sample_rate, m4a_path, ["-c:a", "aac", "-b:a", "256k"])
+        except FileNotFoundError:
+            self._save_wav_fallback(audio_data, sample_rate, m4a_path)
+            self.log(tr("FFmpeg not found, saved as WAV"))
         except Exception as e:
             self.log(f"{tr('M4A conversion error:')} {e}")
-            import shutil
-            new_path = m4a_path.replace(".m4a", ".wav")
-            shutil.copy(wav_path, new_path)
+            self._save_wav_fallback(audio_data, sample_rate, m4a_path)
     
     def get_audio_files(self, folder_path):
         if not os.path.exists(folder_path):
@@ -255,33 +383,328 @@ class VoiceConverter:
                 files.append(os.path.join(folder_path, f))
         return sorted(files)
             
+    def _model_hash(self):
+        """md5 файла текущей модели (кэшируется по размеру и mtime)"""
+        from manifest import file_md5, file_stamp
+        path = self.current_model or ""
+        if path and not os.path.isabs(path):
+            path = os.path.join(os.environ.get("weight_root", ""), path)
+        if not os.path.isfile(path):
+            return self.current_model_name or ""
+        stamp = (path, *file_stamp(path))
+        if getattr(self, "_model_hash_cache", (None, None))[0] != stamp:
+            self._model_hash_cache = (stamp, file_md5(path))
+        return self._model_hash_cache[1]
+    
     def convert_folder(self, input_dir, output_dir, **kwargs):
         files = self.get_audio_files(input_dir)
         if not files:
             self.log(f"{tr('No audio files in folder:')} {input_dir}")
             return []
         
-        results = []
-        total = len(files)
         output_format = kwargs.get("output_format", "wav")
         
-        self.log(f"{tr('Files found:')} {total}")
+        self.log(f"{tr('Files found:')} {len(files)}")
+        
+        jobs = []
+        for input_path in files:
+            name, _ = os.path.splitext(os.path.basename(input_path))
+            jobs.append((input_path, os.path.join(output_dir, f"{name}_converted.{output_format}")))
+        
+        return self.convert_jobs(jobs, output_dir, **kwargs)
+    
+    def convert_jobs(self, all_jobs, output_dir, on_result=None, runner=None, **kwargs):
+        """Пакетная конвертация списка (вход, выход) с манифестом в output_dir.
+        
+        runner(jobs, on_result=..., **kwargs) выполняет конвертацию (по умолчанию _run_batch);
+        on_result получает словарь на каждый файл: input, output, ok, status, seconds.
+        cancel - threading.Event: задания тогда отдаются runner порциями по cancel_slice,
+        после установки события оставшиеся не конвертируются (ok=False).
+        """
+        from manifest import BatchManifest, link_or_copy
+        
+        short_clips = kwargs.pop("short_clips", False)
+        runner = runner or (self._run_short_batch if short_clips else self._run_batch)
+        use_manifest = kwargs.pop("use_manifest", True)
+        cancel = kwargs.pop("cancel", None)
+        cancel_slice = max(1, int(kwargs.pop("cancel_slice", 8)))
+        total = len(all_jobs)
+        status = {}
+        
+        def report(input_path, output_path, ok, state, seconds=0.0):
+            status[output_path] = ok
+            if on_result is not None:
+                on_result({"input": input_path, "output": output_path, "ok": ok,
+                           "status": state, "seconds": round(seconds, 3)})
+        
+        os.makedirs(output_dir, exist_ok=True)
+        manifest = BatchManifest(output_dir) if use_manifest else None
+        model_hash = self._model_hash()
+        params = dict(kwargs)
+        params.setdefault("index_path", self.current_index or "")
+        if params.get("f0_method") == "auto":
+            from tuning import load_tuning
+            params["f0_budget"] = float(params.get("f0_budget") if params.get("f0_budget") is not None
+                                        else self.f0_budget)
+            params["f0_calibration"] = load_tuning().get("f0", {}).get("created")
+        params_key = BatchManifest.params_key(params, model_hash)
+        
+        hashes = {}
+        first_by_hash = {}
+        duplicates = []
+        jobs = []
+        for input_path, output_path in all_jobs:
+            if manifest is None:
+                jobs.append((input_path, output_path))
+                continue
+            try:
+                h = hashes[input_path] = manifest.input_hash(input_path)
+            except OSError as e:
+                self.log(f"{tr('Conversion error:')} {e}")
+                report(input_path, output_path, False, "failed")
+                continue
+            if manifest.is_valid(output_path, h, params_key):
+                report(input_path, output_path, True, "skipped")
+                # следующие копии того же входа ссылаются на уже готовый выход
+                first_by_hash.setdefault(h, output_path)
+            elif h in first_by_hash:
+                duplicates.append((input_path, output_path, first_by_hash[h]))
+            else:
+                first_by_hash[h] = output_path
+                jobs.append((input_path, output_path))
+        
+        skipped = sum(1 for v in status.values() if v)
+        if skipped or duplicates:
+            self.log(f"{tr('Up to date, skipped:')} {skipped}, {tr('duplicates:')} {len(duplicates)}")
         
-        for i, input_path in enumerate(files):
-            self.set_progress(int(((i + 0.5) / total) * 100), f"{tr('File')} {i+1}/{total}")
-            filename = os.path.basename(input_path)
-            name, _ = os.path.splitext(filename)
-            output_path = os.path.join(output_dir, f"{name}_converted.{output_format}")
-            success = self.convert(input_path, output_path, **kwargs)
-            results.append((input_path, output_path, success))
+        def on_converted(result):
+            if manifest is not None and result["ok"] and os.path.exists(result["output"]):
+                manifest.record(result["input"], result["output"], hashes[result["input"]],
+                                params_key, model_hash, result.get("seconds", 0.0))
+            status[result["output"]] = result["ok"]
+            if on_result is not None:
+                on_result(result)
+        
+        try:
+            step = len(jobs) if cancel is None else cancel_slice
+            for i in range(0, len(jobs), max(1, step)):
+                if cancel is not None and cancel.is_set():
+                    break
+                for _, output_path, ok in runner(jobs[i:i + step], on_result=on_converted, **kwargs):
+                    status[output_path] = ok
+            
+            for input_path, output_path, src_output in duplicates:
+                # первый файл мог оказаться в манифесте ещё с прошлого запуска
+                ok = status.get(src_output, False) and os.path.exists(src_output)
+                if ok:
+                    try:
+                        link_or_copy(src_output, output_path)
+                        manifest.record(input_path, output_path, hashes[input_path], params_key,
+                                        model_hash, linked_from=src_output)
+                    except OSError as e:
+                        self.log(f"{tr('Conversion error:')} {e}")
+                        ok = False
+                report(input_path, output_path, ok, "linked" if ok else "failed")
+        finally:
+            if manifest is not None:
+                manifest.save()
+        
+        results = [(i, o, status.get(o, False)) for i, o in all_jobs]
             
         success_count = sum(1 for _, _, s in results if s)
         self.set_progress(100, f"{tr('Done:')} {success_count}/{total}")
         self.log(f"{tr('Processed:')} {success_count}/{total} {tr('successful')}")
         
         return results
+    
+    def _run_short_batch(self, jobs, on_result=None, **kwargs):
+        """Режим коротких клипов: файлы группами, внутри группы - пакеты в vc_batch"""
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from infer.modules.vc.modules import decode_audio
+        
+        group_size = max(1, int(kwargs.pop("group_size", 64)))
+        max_batch = max(1, int(kwargs.pop("max_batch", 16)))
+        writer_threads = max(1, int(kwargs.pop("writer_threads", 2)))
+        for key in ("prefetch", "writer_queue", "audio"):
+            kwargs.pop(key, None)
+        
+        results = []
+        total = len(jobs)
+        wall = time.perf_counter()
+        
+        def report(input_path, output_path, ok, seconds=0.0):
+            if on_result is not None:
+                on_result({"input": input_path, "output": output_path, "ok": ok,
+                           "status": "converted" if ok else "failed", "seconds": round(seconds, 3)})
+            results.append((input_path, output_path, ok))
+        
+        def decode(path):
+            try:
+                return decode_audio(path, 16000)
+            except Exception as e:
+                self.log(f"{tr('Conversion error:')} {e}")
+                return None
+        
+        def write(job, audio_data, sample_rate):
+            try:
+                self._write_output(job[1], audio_data, sample_rate)
+                return True
+            except Exception as e:
+                self.log(f"{tr('Conversion error:')} {str(e)}")
+                return False
+        
+        with ThreadPoolExecutor(max_workers=writer_threads) as pool:
+            for g in range(0, total, group_size):
+                group = jobs[g:g + group_size]
+                self.set_progress(int(g / total * 100), f"{tr('File')} {g + 1}/{total}")
+                audios = list(pool.map(decode, [i for i, _ in group]))
+                ready = [k for k, a in enumerate(audios) if a is not None]
+                for k, a in enumerate(audios):
+                    if a is None:
+                        report(group[k][0], group[k][1], False)
+                if not ready:
+                    continue
+                
+                t0 = time.perf_counter()
+                f0_method = self.resolve_f0_method(
+                    kwargs.get("f0_method", "rmvpe"),
+                    max(len(audios[k]) for k in ready) / 16000, kwargs.get("f0_budget"))
+                info, outs = self.vc.vc_batch(
+                    0, [audios[k] for k in ready], [group[k][0] for k in ready],
+                    kwargs.get("pitch", 0), f0_method,
+                    kwargs.get("index_path", self.current_index or ""),
+                    kwargs.get("index_rate", 0.75), kwargs.get("filter_radius", 3),
+                    kwargs.get("resample_sr", 0), kwargs.get("rms_mix_rate", 0.25),
+                    kwargs.get("protect", 0.33), kwargs.get("crepe_hop_length", 120),
+                    output_dtype=kwargs.get("output_dtype", "int16"), max_batch=max_batch,
+                )
+                seconds = (time.perf_counter() - t0) / len(ready)
+                if outs is None:
+                    self.log(f"{tr('Conversion error:')} {info}")
+                    for k in ready:
+                        report(group[k][0], group[k][1], False)
+                    continue
+                self.log(f"  {info.strip().splitlines()[-1]}")
+                
+                # None - клип не сконвертирован (пустой или ошибка в его пакете), остальные пишутся
+                futures = [pool.submit(write, group[k], out[1], out[0]) if out is not None else None
+                           for k, out in zip(ready, outs)]
+                for k, future in zip(ready, futures):
+                    report(group[k][0], group[k][1], future.result() if future is not None else False, seconds)
+        
+        wall = max(time.perf_counter() - wall, 1e-9)
+        self.log(f"{tr('Short clips:')} {total / wall:.1f} {tr('clips/s')}")
+        return results
+    
+    def _run_batch(self, jobs, on_result=None, **kwargs):
+        """Декодирование (поток предзагрузки) -> инференс -> запись (пул потоков).
+        
+        Очереди ограничены: prefetch входов и writer_queue выходов в ожидании записи.
+        """
+        import queue
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from infer.modules.vc.modules import decode_audio
+        
+        prefetch = max(1, int(kwargs.pop("prefetch", 4)))
+        writer_threads = max(1, int(kwargs.pop("writer_threads", 2)))
+        writer_queue = max(1, int(kwargs.pop("writer_queue", writer_threads * 2)))
+        kwargs.pop("audio", None)
+        
+        total = len(jobs)
+        decoded = queue.Queue(maxsize=prefetch)
+        write_slots = threading.BoundedSemaphore(writer_queue)
+        busy = {"decode": 0.0, "infer": 0.0, "write": 0.0}
+        busy_lock = threading.Lock()
+        stop = threading.Event()
+        
+        def decoder():
+            for input_path, output_path in jobs:
+                if stop.is_set():
+                    break
+                t0 = time.perf_counter()
+                try:
+                    audio = decode_audio(input_path, 16000)
+                except Exception as e:
+                    audio = e
+                busy["decode"] += time.perf_counter() - t0
+                decoded.put((input_path, output_path, audio))
+            decoded.put(None)
+        
+        def done(input_path, output_path, ok, seconds=0.0):
+            if on_result is not None:
+                on_result({"input": input_path, "output": output_path, "ok": ok,
+                           "status": "converted" if ok else "failed", "seconds": round(seconds, 3)})
+            return ok
+        
+        def writer(input_path, output_path, audio_data, sample_rate, seconds):
+            t0 = time.perf_counter()
+            try:
+                self._write_output(output_path, audio_data, sample_rate)
+                self.log(f"  ✓ {tr('Saved:')} {os.path.basename(output_path)}")
+                return done(input_path, output_path, True, seconds)
+            except Exception as e:
+                self.log(f"{tr('Conversion error:')} {str(e)}")
+                return done(input_path, output_path, False, seconds)
+            finally:
+                with busy_lock:
+                    busy["write"] += time.perf_counter() - t0
+                write_slots.release()
+        
+        results = []
+        wall = time.perf_counter()
+        decode_thread = threading.Thread(target=decoder, daemon=True)
+        decode_thread.start()
+        
+        with ThreadPoolExecutor(max_workers=writer_threads) as pool:
+            i = 0
+            while True:
+                item = decoded.get()
+                if item is None:
+                    break
+                input_path, output_path, audio = item
+                self.set_progress(int(((i + 0.5) / total) * 100), f"{tr('File')} {i+1}/{total}")
+                i += 1
+                
+                if isinstance(audio, Exception):
+                    self.log(f"{tr('Conversion error:')} {audio}")
+                    results.append((input_path, output_path, done(input_path, output_path, False)))
+                    continue
+                
+                t0 = time.perf_counter()
+                try:
+                    audio_tuple = self._infer(input_path, audio=audio, **kwargs)
+                except Exception as e:
+                    self.log(f"{tr('Conversion error:')} {str(e)}")
+                    self.log(traceback.format_exc())
+                    audio_tuple = None
+                seconds = time.perf_counter() - t0
+                busy["infer"] += seconds
+                
+                if audio_tuple is None:
+                    results.append((input_path, output_path, done(input_path, output_path, False, seconds)))
+                    continue
+                
+                write_slots.acquire()
+                sample_rate, audio_data = audio_tuple
+                results.append((input_path, output_path, pool.submit(writer, input_path, output_path, audio_data, sample_rate, seconds)))
+            
+            stop.set()
+            results = [(i, o, s.result() if hasattr(s, "result") else s) for i, o, s in results]
+        
+        wall = max(time.perf_counter() - wall, 1e-9)
+        self.log(f"{tr('Stage utilization:')} decode {busy['decode'] / wall:.0%}, "
+                 f"infer {busy['infer'] / wall:.0%}, "
+                 f"write {busy['write'] / (wall * writer_threads):.0%} (x{writer_threads})")
+        return results
         
     def cleanup(self):
+        pool = getattr(self, "_chunk_pool", None)
+        if pool is not None:
+            pool.close()
+            self._chunk_pool = None
         try:
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
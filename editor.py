@@ -11,6 +11,11 @@ from parts import PartGroup
 from waveform import TimeRulerCanvas, WaveformCanvas, PART_ROW_HEIGHT, PART_TOP_MARGIN
 from history import HistoryManager
 from mipmap import AudioMipmap
+from compositor import Compositor
+from intervals import PartIndex, PartList
+from version_cache import VERSION_CACHE
+from store import get_store, version_exists
+from autosave import ProjectSaver
 
 SNAP_THRESHOLD_PX = 10
 BLEND_VALUES = [0, 15, 30, 60, 120]
@@ -38,6 +43,10 @@ class EditorTab:
         self.result_audio_display = None
         self.source_mipmap = AudioMipmap()
         self.result_mipmap = AudioMipmap()
+        self.part_index = PartIndex()
+        self.compositor = Compositor(self.part_index)
+        self.saver = ProjectSaver(log=lambda m: self.parent.after(0, lambda: self.log(m)))
+        self._dirty_ranges = []  # изменённые с прошлого сохранения участки result_audio
         
         self.sr = None
         self.total_samples = 0
@@ -85,31 +94,71 @@ class EditorTab:
             if len(self.history.snapshots) == 0:
                 self._push_snapshot()
     
+    @property
+    def part_groups(self):
+        return self._part_groups
+    
+    @part_groups.setter
+    def part_groups(self, parts):
+        # PartList сообщает индексу об изменениях состава, см. intervals.PartIndex.sync
+        self._part_groups = PartList(parts)
+    
+    def _parts_index(self):
+        return self.part_index.sync(self.part_groups)
+    
     def _find_part_by_id(self, part_id):
         for g in self.part_groups:
             if g.id == part_id:
                 return g
         return None
     
-    def _rebuild_result_from_parts(self):
+    def _rebuild_result_from_parts(self, ranges=None):
+        """Пересборка результата из частей по плану компоновщика.
+        
+        ranges - затронутые операцией [(start, end)]: пересобирается только их
+        замыкание по перекрытиям частей, остальной результат не меняется.
+        От части зависит результат только внутри её границ, поэтому внутри
+        замыкания он совпадает с полной пересборкой бит в бит.
+        """
         if self.source_audio is None or self.total_samples == 0:
             return
         
-        self.result_audio = np.zeros(self.total_samples, dtype=np.float32)
-        self.result_audio_display = np.zeros(self.total_samples, dtype=np.float32)
-        self.result_mipmap.invalidate()
+        if (ranges is None or self.result_audio is None
+                or len(self.result_audio) != self.total_samples
+                or self.result_audio_display is None):
+            self.result_audio = np.zeros(self.total_samples, dtype=np.float32)
+            self.result_audio_display = np.zeros(self.total_samples, dtype=np.float32)
+            spans = [(0, self.total_samples)]
+            self.result_mipmap.invalidate()
+        else:
+            spans = self._closure_ranges(ranges)
+            if not spans:
+                return
+        self._mark_dirty(spans)
         
         self._assign_levels()
-        sorted_parts = sorted(self.part_groups, key=lambda p: p.apply_order)
-        
-        for part in sorted_parts:
-            self._apply_version_data(part, part.last_preserve, part.last_blend, part.last_crossfade_type)
-        
+        self.compositor.compose(self.part_groups, self.sr, self.result_audio, self.result_audio_display,
+                                spans, self.blend_mode, self.crossfade_type)
         self._compute_overwritten_ranges()
     
+    def _closure_ranges(self, ranges):
+        """Диапазоны, расширенные до границ всех частей, которые их (транзитивно) перекрывают"""
+        spans = self._merge_ranges([(max(0, s), min(self.total_samples, e))
+                                    for s, e in ranges if min(self.total_samples, e) > max(0, s)])
+        index = self._parts_index()
+        while spans:
+            grown = self._merge_ranges(spans + [
+                (max(0, p.start), min(self.total_samples, p.end))
+                for s, e in spans for p in index.overlapping(s, e) if p.end > p.start])
+            if grown == spans:
+                break
+            spans = grown
+        return spans
+    
     def _create_snapshot(self):
+        # записи частей общие между снимками: новый снимок - ссылки плюс изменённые части
         return {
-            "parts": [g.to_dict() for g in self.part_groups],
+            "parts": [g.record() for g in self.part_groups],
             "markers": self.markers[:]
         }
     
@@ -118,18 +167,30 @@ class EditorTab:
             self.history.push(self._create_snapshot())
     
     def _restore_snapshot(self, snapshot):
+        """Приводит части к снимку; трогаются и пересобираются только отличающиеся"""
         if not snapshot:
             return False
         
         self.markers = snapshot.get("markers", [])[:]
+        records = snapshot.get("parts", [])
+        current = {g.id: g for g in self.part_groups}
+        new_ids = {p["id"] for p in records}
         
         parts_dir = self._get_parts_dir()
-        new_ids = {p["id"] for p in snapshot.get("parts", [])}
-        
-        self.part_groups = [g for g in self.part_groups if g.id in new_ids]
-        
-        for p in snapshot.get("parts", []):
-            existing = self._find_part_by_id(p["id"])
+        dirty = [(g.start, g.end) for g in self.part_groups if g.id not in new_ids]
+        removed = set()
+        added = []
+        
+        for p in records:
+            existing = current.get(p["id"])
+            if existing is not None:
+                record = existing.record()
+                if record is p:
+                    continue
+                if record == p:
+                    # снимок из файла: та же часть, но своя копия записи
+                    existing.share_record(p)
+                    continue
             
             versions = []
             for v in p["versions"]:
@@ -137,51 +198,46 @@ class EditorTab:
                     versions.append(v)
                 else:
                     full_path = os.path.join(parts_dir, v)
-                    if os.path.exists(full_path):
+                    if version_exists(full_path):
                         versions.append(full_path)
             
             if p.get("has_base", False) and (not versions or versions[0] != "__COMPUTED_BASE__"):
                 versions.insert(0, "__COMPUTED_BASE__")
             
             if not versions:
-                if existing and existing in self.part_groups:
-                    self.part_groups.remove(existing)
+                if existing is not None:
+                    removed.add(existing.id)
+                    dirty.append((existing.start, existing.end))
                 continue
             
             if existing:
-                existing.start = p["start"]
-                existing.end = p["end"]
-                existing.has_base = p.get("has_base", False)
-                existing.last_blend = p.get("last_blend", 0)
-                existing.last_crossfade_type = p.get("last_crossfade_type", 0)
-                existing.last_preserve = p.get("last_preserve", True)
-                existing.apply_order = p.get("apply_order", 0)
-                existing.volume_db = p.get("volume_db", 0)
-                existing.versions = versions
-                existing.version_params = p.get("version_params", [None] * len(versions))
-                while len(existing.version_params) < len(versions):
-                    existing.version_params.append(None)
-                existing.active_idx = min(p["active_idx"], max(0, len(versions) - 1))
+                dirty.append((existing.start, existing.end))
+                g = existing
             else:
                 g = PartGroup(p["start"], p["end"], parts_dir, self.sr)
                 g.id = p["id"]
-                g.versions = versions
-                g.version_params = p.get("version_params", [None] * len(versions))
-                while len(g.version_params) < len(versions):
-                    g.version_params.append(None)
-                g.active_idx = min(p["active_idx"], max(0, len(versions) - 1))
-                g.has_base = p.get("has_base", False)
-                g.last_blend = p.get("last_blend", 0)
-                g.last_crossfade_type = p.get("last_crossfade_type", 0)
-                g.last_preserve = p.get("last_preserve", True)
-                g.apply_order = p.get("apply_order", 0)
-                g.volume_db = p.get("volume_db", 0)
-                self.part_groups.append(g)
+                added.append(g)
+            g.start = p["start"]
+            g.end = p["end"]
+            g.versions = versions
+            version_params = list(p.get("version_params", [None] * len(versions)))
+            g.version_params = version_params + [None] * (len(versions) - len(version_params))
+            g.active_idx = min(p["active_idx"], max(0, len(versions) - 1))
+            g.has_base = p.get("has_base", False)
+            g.last_blend = p.get("last_blend", 0)
+            g.last_crossfade_type = p.get("last_crossfade_type", 0)
+            g.last_preserve = p.get("last_preserve", True)
+            g.apply_order = p.get("apply_order", 0)
+            g.volume_db = p.get("volume_db", 0)
+            g.share_record(p)
+            dirty.append((g.start, g.end))
+        
+        self.part_groups = [g for g in self.part_groups if g.id in new_ids and g.id not in removed] + added
         
         if self.part_groups:
             self._apply_counter = max(g.apply_order for g in self.part_groups)
         
-        self._rebuild_result_from_parts()
+        self._rebuild_result_from_parts(dirty)
         return True
     
     def _undo(self):
@@ -283,75 +339,11 @@ class EditorTab:
             return None
         return audio.mean(axis=1).astype(np.float32) if len(audio.shape) > 1 else audio.astype(np.float32)
     
-    def _get_fade_curves(self, length, crossfade_type=None):
-        if crossfade_type is None:
-            crossfade_type = self.crossfade_type
-        t = np.linspace(0, 1, length, dtype=np.float32)
-        if crossfade_type == 0:
-            return t, 1 - t
-        else:
-            return np.sin(t * np.pi / 2), np.cos(t * np.pi / 2)
-    
     def _compute_base_for_part(self, part):
-        start, end = part.start, part.end
-        length = end - start
-        base = np.zeros(length, dtype=np.float32)
-        
-        underlying = [g for g in self.part_groups 
-                      if g.id != part.id 
-                      and g.apply_order < part.apply_order
-                      and g.start < end and g.end > start]
-        
-        if not underlying:
-            return base
-        
-        underlying.sort(key=lambda g: g.apply_order)
-        
-        for g in underlying:
-            data = self._get_part_data(g)
-            if data is None:
-                continue
-            
-            skip_vol = g.has_base and g.active_idx == 0 and len(g.versions) > 1
-            if g.volume_db != 0 and not skip_vol:
-                gain = 10 ** (g.volume_db / 20)
-                data = data * gain
-            
-            overlap_start = max(g.start, start)
-            overlap_end = min(g.end, end)
-            if overlap_start >= overlap_end:
-                continue
-            
-            base_pos = overlap_start - start
-            data_pos = overlap_start - g.start
-            copy_len = min(overlap_end - overlap_start, len(data) - data_pos, length - base_pos)
-            
-            if copy_len > 0:
-                base[base_pos:base_pos + copy_len] = data[data_pos:data_pos + copy_len]
-        
-        return base
+        return self.compositor.new_pass(self.part_groups, self.sr).base(part)
     
     def _get_part_data(self, part, idx=None):
-        if idx is None:
-            idx = part.active_idx
-        
-        if part.has_base and idx == 0:
-            return self._compute_base_for_part(part)
-        
-        data = part.get_data(idx)
-        if data is None:
-            return None
-        
-        nan_mask = np.isnan(data)
-        if np.any(nan_mask):
-            base = self._compute_base_for_part(part)
-            if base is not None and len(base) == len(data):
-                data = data.copy()
-                data[nan_mask] = base[nan_mask]
-            else:
-                data = np.nan_to_num(data, nan=0.0)
-        
-        return data
+        return self.compositor.new_pass(self.part_groups, self.sr).data(part, idx)
     
     def _set_blend(self, value):
         self.blend_mode = value
@@ -372,53 +364,6 @@ class EditorTab:
         name = tr("Linear blend") if self.crossfade_type == 0 else tr("Smooth blend")
         self.crossfade_btn.config(text=name)
     
-    def _write_audio(self, data, start, fade_ms=0, cf_right=None, cf_left=0, crossfade_type=None):
-        if data is None or len(data) == 0:
-            return
-        
-        write_len = len(data)
-        end = start + write_len
-        
-        if end > self.total_samples:
-            end = self.total_samples
-            write_len = end - start
-            data = data[:write_len]
-        
-        if write_len <= 0:
-            return
-        
-        if fade_ms == 0 or write_len < 200 or self.result_audio is None:
-            self.result_audio[start:end] = data
-            self.result_audio_display[start:end] = data
-            self.result_mipmap.invalidate()
-            return
-        
-        fade_samples = min(int(self.sr * fade_ms / 1000), write_len // 4)
-        fade_samples = max(20, fade_samples)
-        
-        result = data.copy()
-        fade_in, fade_out = self._get_fade_curves(fade_samples, crossfade_type)
-        
-        if cf_left + fade_samples <= write_len:
-            old_left = self.result_audio[start + cf_left:start + cf_left + fade_samples].copy()
-            if np.any(np.abs(old_left) > 0.0001):
-                result[cf_left:cf_left + fade_samples] = old_left * fade_out + result[cf_left:cf_left + fade_samples] * fade_in
-        
-        if cf_right is None:
-            cf_right = write_len
-        cf_right = min(cf_right, write_len)
-        
-        if cf_right > fade_samples and cf_right > cf_left + fade_samples:
-            right_abs = start + cf_right
-            old_right = self.result_audio[right_abs - fade_samples:right_abs].copy()
-            if np.any(np.abs(old_right) > 0.0001):
-                fade_start = cf_right - fade_samples
-                result[fade_start:cf_right] = result[fade_start:cf_right] * fade_out + old_right * fade_in
-        
-        self.result_audio[start:end] = result
-        self.result_audio_display[start:end] = result
-        self.result_mipmap.invalidate()
-    
     def _toggle_source_mode(self):
         if not self.is_stereo:
             return
@@ -449,19 +394,21 @@ class EditorTab:
         os.makedirs(d, exist_ok=True)
         return d
     
+    def _mark_dirty(self, ranges):
+        """Участки result_audio изменились: их дописывает автосохранение и пересчитывает mipmap"""
+        self._dirty_ranges.extend(ranges)
+        for s, e in ranges:
+            self.result_mipmap.invalidate_range(s, e)
+    
     def _save_project(self):
+        """Ставит сохранение в очередь фоновой записи: диск не трогается в этом потоке"""
         project_dir = self._get_project_dir()
         if not project_dir or self.source_audio is None:
             return
         
-        os.makedirs(project_dir, exist_ok=True)
-        import soundfile as sf
-        
-        if self.result_audio is not None:
-            sf.write(os.path.join(project_dir, "result.wav"), self.result_audio, self.sr)
-        
+        ranges, self._dirty_ranges = self._dirty_ranges, []
         data = {
-            "markers": self.markers,
+            "markers": self.markers[:],
             "sel_start": self.sel_start,
             "sel_end": self.sel_end,
             "cursor_pos": self.cursor_pos,
@@ -469,11 +416,24 @@ class EditorTab:
             "offset": self.offset,
             "active_track": self._active_track,
             "source_mode": self.source_mode,
-            "parts": [g.to_dict() for g in self.part_groups]
+            "parts": [g.record() for g in self.part_groups]
         }
-        
-        with open(os.path.join(project_dir, "project.json"), 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
+        # result_audio передаётся без копии: саму запись участков делает поток сохранения
+        self.saver.schedule(project_dir, data, self.result_audio, self.sr, ranges)
+    
+    def _open_version_store(self, parts_dir):
+        """Переносит WAV версий в хранилище проекта и сжимает его, если мусора больше половины"""
+        store = get_store(parts_dir)
+        try:
+            moved = store.migrate(self.log)
+            if moved:
+                self.log(f"{tr('Versions moved to store:')} {moved}")
+            if store.garbage_ratio() > 0.5:
+                # срезы старого файла держит только кэш версий
+                VERSION_CACHE.clear()
+                store.compact()
+        except Exception as e:
+            self.log(f"{tr('Version store error:')} {e}")
     
     def _load_project(self):
         project_dir = self._get_project_dir()
@@ -513,6 +473,7 @@ class EditorTab:
             self.source_mode_btn.config(text=self.source_mode)
             
             parts_dir = self._get_parts_dir()
+            self._open_version_store(parts_dir)
             for p in data.get("parts", []):
                 versions = []
                 for v in p["versions"]:
@@ -520,7 +481,7 @@ class EditorTab:
                         versions.append(v)
                     else:
                         full_path = os.path.join(parts_dir, v)
-                        if os.path.exists(full_path):
+                        if version_exists(full_path):
                             versions.append(full_path)
                 
                 if p.get("has_base", False) and (not versions or versions[0] != "__COMPUTED_BASE__"):
@@ -558,19 +519,7 @@ class EditorTab:
     def _assign_levels(self):
         if not self.part_groups:
             return
-        sorted_groups = sorted(self.part_groups, key=lambda g: (g.start, -(g.end - g.start)))
-        level_ends = []
-        for g in sorted_groups:
-            placed = False
-            for level, end in enumerate(level_ends):
-                if g.start >= end:
-                    g.level = level
-                    level_ends[level] = g.end
-                    placed = True
-                    break
-            if not placed:
-                g.level = len(level_ends)
-                level_ends.append(g.end)
+        self._parts_index().assign_levels()
     
     def _merge_ranges(self, ranges):
         if not ranges:
@@ -585,9 +534,10 @@ class EditorTab:
         return merged
 
     def _compute_overwritten_ranges(self):
+        index = self._parts_index()
         for part in self.part_groups:
             part.overwritten_ranges = []
-            for other in self.part_groups:
+            for other in index.overlapping(part.start, part.end):
                 if other.id == part.id:
                     continue
                 if other.has_base and other.active_idx == 0:
@@ -632,6 +582,7 @@ class EditorTab:
     
     def cleanup(self):
         self._save_project()
+        self.saver.flush()
         self._stop_stream()
     
     def update_preset_display(self):
@@ -642,7 +593,7 @@ class EditorTab:
         m = os.path.splitext(p["model"])[0]
         m = m[:10] + ".." if len(m) > 12 else m
         F0_SHORT = {"rmvpe": "RM", "mangio-crepe": "MC", "mangio-crepe-tiny": "MCt",
-                    "crepe": "CR", "crepe-tiny": "CRt", "harvest": "HV", "pm": "PM"}
+                    "crepe": "CR", "crepe-tiny": "CRt", "harvest": "HV", "pm": "PM", "auto": "AU"}
         f0 = F0_SHORT.get(p.get("f0_method", ""), "?")
         def fmt(v): return f"{v:.2f}".lstrip('0') or '0'
         parts = [f0, f"{p.get('pitch', 0):+d}", f"I{fmt(p.get('index_rate', .9))}",
@@ -898,7 +849,7 @@ class EditorTab:
         sample = self._x2s(e.x, width)
         
         if is_result:
-            matching = [g for g in self.part_groups if g.start <= sample < g.end]
+            matching = self._parts_index().at(sample)
             if matching:
                 smallest = min(matching, key=lambda g: g.size())
                 self.sel_start, self.sel_end = smallest.start, smallest.end
@@ -952,18 +903,18 @@ class EditorTab:
         samples_per_px = self.total_samples / self.zoom / width
         threshold = max(1, int(SNAP_THRESHOLD_PX * samples_per_px))
         
-        snap_points = []
-        for g in self.part_groups:
-            if g is not exclude_part:
-                snap_points.extend([g.start, g.end])
+        best, best_dist = sample, threshold + 1
+        point, dist = self._parts_index().nearest_point(sample, exclude=exclude_part)
+        if point is not None and dist < best_dist:
+            best, best_dist = point, dist
         
+        snap_points = []
         if snap_to_markers:
             snap_points.extend(self.markers)
         
         if snap_to_selection and self.sel_start is not None:
             snap_points.extend([self.sel_start, self.sel_end])
         
-        best, best_dist = sample, threshold + 1
         for pt in snap_points:
             dist = abs(sample - pt)
             if dist < best_dist:
@@ -1032,7 +983,7 @@ class EditorTab:
             return "break"
         
         pos = self.cursor_pos or 0
-        matching = [g for g in self.part_groups if g.start <= pos < g.end]
+        matching = self._parts_index().at(pos)
         if not matching:
             return "break"
         
@@ -1047,6 +998,7 @@ class EditorTab:
         end = part.end
         idx = part.active_idx
         
+        VERSION_CACHE.invalidate(part.versions[idx])
         part.versions.pop(idx)
         part.version_params.pop(idx)
         part.active_idx = min(idx, len(part.versions) - 1)
@@ -1061,7 +1013,7 @@ class EditorTab:
                     base_data = tmp
                 self.result_audio[part.start:part.end] = base_data
                 self.result_audio_display[part.start:part.end] = base_data
-                self.result_mipmap.invalidate()
+                self._mark_dirty([(part.start, part.end)])
             self.part_groups.remove(part)
             self._push_snapshot()
             self._save_project()
@@ -1093,7 +1045,7 @@ class EditorTab:
         if self.sel_start is not None:
             boundary = min(self.sel_start, self.sel_end) if to_start else max(self.sel_start, self.sel_end)
         elif self.part_groups:
-            matching = [g for g in self.part_groups if g.start <= pos < g.end]
+            matching = self._parts_index().at(pos)
             if matching:
                 part = min(matching, key=lambda g: g.size())
                 boundary = part.start if to_start else part.end
@@ -1126,13 +1078,10 @@ class EditorTab:
         return self.total_samples
 
     def _find_group(self, start, end):
-        for g in self.part_groups:
-            if g.start == start and g.end == end:
-                return g
-        return None
+        return self._parts_index().find(start, end)
     
     def _get_group_at(self, sample):
-        matching = [g for g in self.part_groups if g.start <= sample < g.end]
+        matching = self._parts_index().at(sample)
         return max(matching, key=lambda g: g.level) if matching else None
     
     def _switch_version_at(self, sample, delta):
@@ -1153,6 +1102,7 @@ class EditorTab:
         
         part.active_idx = new_idx
         self._apply_version(part, preserve_nested)
+        part.prefetch_neighbours()
         self._push_snapshot()
         self._save_project()
         
@@ -1176,115 +1126,19 @@ class EditorTab:
         self.play_btn.config(text="⏸")
     
     def _apply_version_data(self, group, preserve_nested=False, blend_override=None, crossfade_override=None):
-        data = self._get_part_data(group)
-        if data is None:
-            return
-        
-        skip_vol = group.has_base and group.active_idx == 0 and len(group.versions) > 1
-        if group.volume_db != 0 and not skip_vol:
-            gain = 10 ** (group.volume_db / 20)
-            data = data * gain
-        
         blend = blend_override if blend_override is not None else self.blend_mode
         cf_type = crossfade_override if crossfade_override is not None else self.crossfade_type
-        max_len = group.end - group.start
-        write_len = min(len(data), max_len)
-        if write_len <= 0:
-            return
-        
-        write_data = data[:write_len]
-        is_base = group.has_base and group.active_idx == 0
         
-        params = group.get_params()
-        wav_start = params.get("wav_start", group.start) if params else group.start
-        wav_end = params.get("wav_end", group.end) if params else group.end
-        cf_left = max(0, wav_start - group.start)
-        cf_right = min(wav_end - group.start, write_len)
-        
-        need_fade = blend > 0 and (not is_base or (group.volume_db != 0 and not skip_vol))
-        need_tail = write_len < max_len and not is_base
-        
-        base_data = None
-        if need_fade or need_tail:
-            base_data = self._compute_base_for_part(group)
-        
-        use_fade = 0
-        if need_fade and base_data is not None and np.any(np.abs(base_data) > 0.0001):
-            use_fade = blend
+        rendered = self.compositor.new_pass(self.part_groups, self.sr).render(group, preserve_nested, blend, cf_type)
+        if rendered is None:
+            return
         
-        if preserve_nested:
-            nested = self._get_nested_parts(group)
-            if nested:
-                occupied = sorted([(n.start - group.start, n.end - group.start) for n in nested])
-                segments = []
-                current = 0
-                
-                for occ_start, occ_end in occupied:
-                    seg_end = min(occ_start, write_len)
-                    if current < seg_end:
-                        segments.append((group.start + current, group.start + seg_end, current, seg_end))
-                    current = max(current, occ_end)
-                
-                if current < write_len:
-                    segments.append((group.start + current, group.start + write_len, current, write_len))
-                
-                for i, (abs_s, abs_e, d_s, d_e) in enumerate(segments):
-                    seg_data = write_data[d_s:d_e]
-                    
-                    if use_fade > 0 and base_data is not None:
-                        base_seg = base_data[d_s:d_e] if d_e <= len(base_data) else base_data[d_s:]
-                        seg_len = min(len(base_seg), abs_e - abs_s)
-                        if seg_len > 0:
-                            self.result_audio[abs_s:abs_s + seg_len] = base_seg[:seg_len]
-                            self.result_audio_display[abs_s:abs_s + seg_len] = base_seg[:seg_len]
-                        
-                        is_first = (i == 0)
-                        is_last = (i == len(segments) - 1)
-                        
-                        seg_cf_right = None
-                        if is_last and cf_right > d_s and cf_right <= d_e:
-                            seg_cf_right = cf_right - d_s
-                        
-                        seg_cf_left = 0
-                        if is_first and d_s < cf_left:
-                            seg_cf_left = cf_left - d_s
-                        
-                        if is_first or is_last:
-                            self._write_audio_segment(seg_data, abs_s, 
-                                                     fade_left=is_first, fade_right=is_last,
-                                                     fade_ms=use_fade, cf_right=seg_cf_right,
-                                                     cf_left=seg_cf_left, crossfade_type=cf_type)
-                        else:
-                            self.result_audio[abs_s:abs_e] = seg_data
-                            self.result_audio_display[abs_s:abs_e] = seg_data
-                    else:
-                        self.result_audio[abs_s:abs_e] = seg_data
-                        self.result_audio_display[abs_s:abs_e] = seg_data
-            else:
-                if use_fade > 0 and base_data is not None:
-                    base_len = min(len(base_data), max_len)
-                    self.result_audio[group.start:group.start + base_len] = base_data[:base_len]
-                    self.result_audio_display[group.start:group.start + base_len] = base_data[:base_len]
-                self._write_audio(write_data, group.start, fade_ms=use_fade, cf_right=cf_right, cf_left=cf_left, crossfade_type=cf_type)
-        else:
-            if use_fade > 0 and base_data is not None:
-                base_len = min(len(base_data), max_len)
-                self.result_audio[group.start:group.start + base_len] = base_data[:base_len]
-                self.result_audio_display[group.start:group.start + base_len] = base_data[:base_len]
-            self._write_audio(write_data, group.start, fade_ms=use_fade, cf_right=cf_right, cf_left=cf_left, crossfade_type=cf_type)
-        
-        if need_tail and base_data is not None:
-            tail_start = write_len
-            tail_end = min(len(base_data), max_len)
-            if tail_end > tail_start:
-                tail_data = base_data[tail_start:tail_end]
-                if np.any(np.abs(tail_data) > 0.0001):
-                    abs_start = group.start + tail_start
-                    self.result_audio[abs_start:abs_start + len(tail_data)] = tail_data
-                    self.result_audio_display[abs_start:abs_start + len(tail_data)] = tail_data
-        
-        self.result_mipmap.invalidate()
-                    
+        out, runs = rendered
+        for s, e in runs:
+            self.result_audio[group.start + s:group.start + e] = out[s:e]
+            self.result_audio_display[group.start + s:group.start + e] = out[s:e]
+        self._mark_dirty([(group.start + s, group.start + e) for s, e in runs])
+    
     def _apply_version(self, group, preserve_nested=False, blend_override=None, update_state=True):
         blend = blend_override if blend_override is not None else self.blend_mode
         cf_type = self.crossfade_type
@@ -1310,56 +1164,11 @@ class EditorTab:
         self._compute_overwritten_ranges()
         self._redraw_result()
     
-    def _write_audio_segment(self, data, start, fade_left=True, fade_right=True, fade_ms=None, cf_right=None, cf_left=0, crossfade_type=None):
-        if fade_ms is None:
-            fade_ms = self.blend_mode
-            
-        if data is None or len(data) == 0:
-            return
-        
-        write_len = len(data)
-        end = start + write_len
-        
-        if write_len < 100 or self.result_audio is None or fade_ms == 0:
-            self.result_audio[start:end] = data
-            self.result_audio_display[start:end] = data
-            self.result_mipmap.invalidate()
-            return
-        
-        fade_samples = min(int(self.sr * fade_ms / 1000), write_len // 4)
-        fade_samples = max(20, fade_samples)
-        
-        result = data.copy()
-        fade_in, fade_out = self._get_fade_curves(fade_samples, crossfade_type)
-        
-        if fade_left and cf_left + fade_samples <= write_len:
-            old_left = self.result_audio[start + cf_left:start + cf_left + fade_samples].copy()
-            if np.any(np.abs(old_left) > 0.0001):
-                result[cf_left:cf_left + fade_samples] = old_left * fade_out + result[cf_left:cf_left + fade_samples] * fade_in
-        
-        if fade_right:
-            if cf_right is None:
-                cf_right = write_len
-            cf_right = min(cf_right, write_len)
-            
-            if cf_right > fade_samples and cf_right > cf_left + fade_samples:
-                right_abs = start + cf_right
-                old_right = self.result_audio[right_abs - fade_samples:right_abs].copy()
-                if np.any(np.abs(old_right) > 0.0001):
-                    fade_start = cf_right - fade_samples
-                    result[fade_start:cf_right] = result[fade_start:cf_right] * fade_out + old_right * fade_in
-        
-        self.result_audio[start:end] = result
-        self.result_audio_display[start:end] = result
-        self.result_mipmap.invalidate()
-
     def _get_nested_parts(self, part):
-        return [g for g in self.part_groups 
-                if g.id != part.id and g.start >= part.start and g.end <= part.end]
+        return self._parts_index().nested(part)
 
     def _get_overlapping_parts(self, part):
-        return [g for g in self.part_groups 
-                if g.id != part.id and g.start < part.end and g.end > part.start]
+        return [g for g in self._parts_index().overlapping(part.start, part.end) if g.id != part.id]
 
     def _is_replace_all_mode(self):
         try:
@@ -1396,6 +1205,11 @@ class EditorTab:
                 menu.add_command(label=tr("Delete current version"), command=lambda: self._delete_version(part))
             menu.add_command(label=tr("Keep only current"), command=lambda: self._delete_others(part))
         
+        active = part.versions[part.active_idx] if part.versions else None
+        if active not in (None, "__COMPUTED_BASE__", "__SILENT__"):
+            menu.add_separator()
+            menu.add_command(label=tr("Export version as WAV..."), command=lambda: self._export_version(part))
+        
         menu.add_separator()
         menu.add_command(label=tr("Delete part (restore)"), command=lambda: self._delete_part(part))
         
@@ -1415,6 +1229,7 @@ class EditorTab:
         
         part.active_idx = idx
         self._apply_version(part, preserve_nested)
+        part.prefetch_neighbours()
         self._push_snapshot()
         self._save_project()
         
@@ -1429,6 +1244,7 @@ class EditorTab:
             return
         
         idx = part.active_idx
+        VERSION_CACHE.invalidate(part.versions[idx])
         part.versions.pop(idx)
         part.version_params.pop(idx)
         part.active_idx = min(idx, len(part.versions) - 1)
@@ -1478,7 +1294,7 @@ class EditorTab:
                     base_data = tmp
                 self.result_audio[part.start:part.end] = base_data
                 self.result_audio_display[part.start:part.end] = base_data
-                self.result_mipmap.invalidate()
+                self._mark_dirty([(part.start, part.end)])
         
         if part in self.part_groups:
             self.part_groups.remove(part)
@@ -1491,6 +1307,26 @@ class EditorTab:
         self.result_wf._wf_cache_key = None
         self._redraw()
     
+    def _export_version(self, part):
+        path = part.versions[part.active_idx]
+        name = os.path.splitext(os.path.basename(path))[0]
+        target = filedialog.asksaveasfilename(
+            defaultextension=".wav", filetypes=[("WAV", "*.wav")],
+            initialdir=self._get_project_dir(), initialfile=f"{name}.wav"
+        )
+        if not target:
+            return
+        try:
+            store = get_store(os.path.dirname(path))
+            if os.path.basename(path) in store:
+                store.export(os.path.basename(path), target, self.sr)
+            else:
+                import shutil
+                shutil.copyfile(path, target)
+            self.log(f"{tr('Saved:')} {os.path.basename(target)}")
+        except Exception as e:
+            self.log(f"{tr('Error:')} {e}")
+    
     def _delete_part_files(self, part):
         part.cleanup()
         self.part_groups.remove(part)
@@ -1517,7 +1353,7 @@ class EditorTab:
         if self._active_track == 'result' and self.sel_start is not None:
             s1, s2 = sorted([self.sel_start, self.sel_end])
             if s2 - s1 > 100:
-                containing = [g for g in self.part_groups if g.start < s1 and g.end > s2]
+                containing = [g for g in self._parts_index().overlapping(s1, s2) if g.start < s1 and g.end > s2]
                 if containing:
                     part = min(containing, key=lambda g: g.size())
                     is_base = part.has_base and part.active_idx == 0
@@ -1660,12 +1496,17 @@ class EditorTab:
             self.markers.clear()
             self.result_audio = None
             self.result_audio_display = None
+            self._dirty_ranges = []
+            # отложенная запись прошлого проекта должна лечь на диск до чтения
+            self.saver.flush()
             
             self.source_audio = data.astype(np.float32)
             self.is_stereo = len(data.shape) > 1
             self.source_audio_display = self._to_mono(data)
             self.source_mipmap.build(self.source_audio_display)
             self.result_mipmap = AudioMipmap()
+            self.compositor.reset()
+            VERSION_CACHE.clear()
             
             self.source_mode = "M" if not self.is_stereo else "F"
             self.source_mode_btn.config(text=self.source_mode)
@@ -1821,7 +1662,7 @@ class EditorTab:
             return
         
         pos = self.cursor_pos or 0
-        matching = [g for g in self.part_groups if g.start <= pos < g.end]
+        matching = self._parts_index().at(pos)
         if not matching:
             return
         
@@ -1997,7 +1838,7 @@ class EditorTab:
             for params in part.version_params
         ]
         
-        self._rebuild_result_from_parts()
+        self._rebuild_result_from_parts([(part.start - delta, part.end - delta), (part.start, part.end)])
         self._push_snapshot()
         self._save_project()
         self.log(f"{tr('Part moved:')} {delta/self.sr:+.2f}s")
@@ -2008,7 +1849,7 @@ class EditorTab:
             return
         
         pos = self.cursor_pos or 0
-        matching = [g for g in self.part_groups if g.start <= pos < g.end]
+        matching = self._parts_index().at(pos)
         if not matching:
             return
         
@@ -2038,7 +1879,7 @@ class EditorTab:
             new_part.last_preserve = False
             self.part_groups.append(new_part)
             
-            self._rebuild_result_from_parts()
+            self._rebuild_result_from_parts([(s1, s2)])
             self._push_snapshot()
             self._save_project()
             self.log(f"{tr('Volume part:')} {new_part.volume_db:+d} dB")
@@ -2049,7 +1890,7 @@ class EditorTab:
             for n in nested:
                 n.volume_db += delta
             
-            self._rebuild_result_from_parts()
+            self._rebuild_result_from_parts([(part.start, part.end)])
             self._push_snapshot()
             self._save_project()
             
@@ -2098,15 +1939,16 @@ class EditorTab:
                     os.makedirs(project_dir, exist_ok=True)
                 
                 tmp_in = os.path.join(tmp_dir, "_temp_in.wav")
-                tmp_out = os.path.join(tmp_dir, "_temp_out.wav")
-                sf.write(tmp_in, self._get_source_for_convert(start, send_end), self.sr)
+                sf.write(tmp_in, self._get_source_for_convert(start, send_end), self.sr, subtype='FLOAT')
                 
                 self.parent.after(0, lambda: self.log(f"{tr('Converting')} {(end-start)/self.sr:.2f}s..."))
                 self.set_progress(30, tr("Conversion..."))
                 
-                if conv.convert(tmp_in, tmp_out, **params) and os.path.exists(tmp_out):
-                    converted, csr = sf.read(tmp_out)
-                    converted = converted.astype(np.float32)
+                # пайплайн сразу ресемплирует в частоту проекта
+                convert_params = dict(params, resample_sr=self.sr)
+                result = conv.convert_audio(tmp_in, **convert_params)
+                if result is not None:
+                    csr, converted = result
                     
                     if csr != self.sr:
                         import librosa
@@ -2167,9 +2009,8 @@ class EditorTab:
                     self.set_progress(0, tr("Error"))
                     self.parent.after(0, lambda: self.log(tr("Conversion error")))
                     
-                for f in [tmp_in, tmp_out]:
-                    try: os.remove(f)
-                    except: pass
+                try: os.remove(tmp_in)
+                except: pass
                         
             except Exception as ex:
                 import traceback
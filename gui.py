@@ -175,7 +175,11 @@ class RVCConverterGUI:
             "preset_load_pitch": self.preset_load_pitch.get(),
             "preset_load_f0": self.preset_load_f0.get(),
             "blend_mode": self.editor.blend_mode if self.editor else 0,
-            "crossfade_type": self.editor.crossfade_type if self.editor else 0
+            "crossfade_type": self.editor.crossfade_type if self.editor else 0,
+            "service_address": self.saved_settings.get("service_address", ""),
+            "threads": self.saved_settings.get("threads", "auto"),
+            "f0_budget": self.saved_settings.get("f0_budget", DEFAULT_SETTINGS["f0_budget"]),
+            "version_cache_mb": self.saved_settings.get("version_cache_mb", DEFAULT_SETTINGS["version_cache_mb"])
         }
         save_settings(settings)
         
@@ -559,6 +563,8 @@ class RVCConverterGUI:
         
     def _create_editor_tab(self, parent):
         from editor import EditorTab
+        from version_cache import VERSION_CACHE
+        VERSION_CACHE.set_budget(self.saved_settings.get("version_cache_mb", DEFAULT_SETTINGS["version_cache_mb"]))
         self.editor = EditorTab(
             parent, 
             self._get_converter_for_editor, 
@@ -647,6 +653,19 @@ class RVCConverterGUI:
         if text:
             self.progress_label.config(text=text[:25])
         
+    def _create_converter(self):
+        # запущенная служба держит модели прогретыми - работаем через неё
+        address = self.saved_settings.get("service_address", "")
+        if address:
+            from client import RemoteConverter, is_available
+            if is_available(address):
+                self.log(f"{tr('Using conversion service:')} {address}")
+                return RemoteConverter(address, self.set_progress, self.log)
+        from converter import VoiceConverter
+        return VoiceConverter(self.set_progress, self.log,
+                              threads=self.saved_settings.get("threads", "auto"),
+                              f0_budget=self.saved_settings.get("f0_budget"))
+        
     def _ensure_model_loaded(self):
         model_name = self.model_path.get()
         if not model_name:
@@ -656,8 +675,7 @@ class RVCConverterGUI:
         if self.index_path.get() and self.index_path.get() != "(no index)":
             index_path = os.path.join(RVC_ROOT, self.index_path.get())
         if self.converter is None:
-            from converter import VoiceConverter
-            self.converter = VoiceConverter(self.set_progress, self.log)
+            self.converter = self._create_converter()
         if self.converter.is_model_loaded(model_name, index_path):
             return True
         self.log(f"{tr('Loading model:')} {model_name}")
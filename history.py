@@ -1,72 +1,216 @@
 import os
 import json
 import time
+from collections import deque
+
+# История правок хранится журналом history.jsonl, в который строки только дописываются:
+# снимок - разница с предыдущим (изменённые и удалённые части, порядок и прочие поля,
+# если поменялись), undo/redo - строка с новой позицией. Снимки нумеруются сквозным
+# seq, поэтому отбрасывание старых не трогает файл. Когда строк набирается заметно
+# больше, чем снимков, журнал переписывается: первый снимок целиком, дальше разницы.
+
+HISTORY_FILE = "history.jsonl"
+LEGACY_FILE = "history.json"
+COMPACT_SLACK = 500
+
+
+def _dump(record):
+    return json.dumps(record, separators=(',', ':')) + "\n"
+
+
+def snapshot_delta(prev, snap):
+    """Запись журнала, превращающая prev в snap"""
+    prev_parts = {p["id"]: p for p in prev.get("parts", [])}
+    parts = snap.get("parts", [])
+    ids = {p["id"] for p in parts}
+    # записи неизменённых частей обычно те же объекты, сравнение по значению - запасной путь
+    record = {"set": [p for p in parts if prev_parts.get(p["id"]) is not p and prev_parts.get(p["id"]) != p],
+              "del": [i for i in prev_parts if i not in ids]}
+    order = [p["id"] for p in parts]
+    if order != _order(prev, record):
+        record["order"] = order
+    values = {k: v for k, v in snap.items() if k != "parts" and prev.get(k) != v}
+    if values:
+        record["values"] = values
+    return record
+
+
+def _order(prev, record):
+    removed = set(record.get("del", ()))
+    order = [p["id"] for p in prev.get("parts", []) if p["id"] not in removed]
+    known = set(order)
+    order.extend(p["id"] for p in record.get("set", ()) if p["id"] not in known)
+    return order
+
+
+def apply_delta(prev, record):
+    """Снимок из prev и записи snapshot_delta; неизменённые части общие с prev"""
+    parts = {p["id"]: p for p in prev.get("parts", [])}
+    for i in record.get("del", ()):
+        parts.pop(i, None)
+    for p in record.get("set", ()):
+        parts[p["id"]] = p
+    order = record.get("order") or _order(prev, record)
+    snap = {k: v for k, v in prev.items() if k != "parts"}
+    snap.update(record.get("values", {}))
+    snap["parts"] = [parts[i] for i in order if i in parts]
+    return snap
 
 
 class HistoryManager:
-    
+
     def __init__(self, project_dir, sr=44100):
         self.project_dir = project_dir
         self.sr = sr
-        self.history_file = os.path.join(project_dir, "history.json")
-        self.snapshots = []
+        self.history_file = os.path.join(project_dir, HISTORY_FILE)
+        self.snapshots = deque()
+        self._deltas = deque()  # запись журнала для каждого снимка (у первого не нужна)
+        self.first_seq = 0
         self.position = -1
         self.max_history = 5000
+        self._records = 0
         self._load()
-    
+
     def _load(self):
-        if os.path.exists(self.history_file):
-            try:
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.snapshots = data.get("snapshots", [])
-                    self.position = data.get("position", -1)
-                    self.position = min(self.position, len(self.snapshots) - 1)
-            except:
-                self.snapshots, self.position = [], -1
-    
+        if not os.path.exists(self.history_file):
+            self._load_legacy()
+            return
+        position_seq = -1
+        try:
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # недописанная последняя строка после сбоя
+                        continue
+                    self._records += 1
+                    op = record.get("op")
+                    if op == "full":
+                        self.snapshots = deque([record["snap"]])
+                        self._deltas = deque([None])
+                        self.first_seq = position_seq = record["seq"]
+                    elif op == "snap":
+                        i = record["seq"] - self.first_seq
+                        if not self.snapshots or not 0 < i <= len(self.snapshots):
+                            continue
+                        self._truncate(i)
+                        self.snapshots.append(apply_delta(self.snapshots[-1], record))
+                        self._deltas.append(record)
+                        position_seq = record["seq"]
+                        self._trim()
+                    elif op == "pos":
+                        position_seq = record["seq"]
+        except:
+            self.snapshots, self._deltas, self.first_seq = deque(), deque(), 0
+            position_seq = -1
+        if self.snapshots:
+            self.position = max(0, min(position_seq - self.first_seq, len(self.snapshots) - 1))
+        else:
+            self.position = -1
+        if self._records > 2 * len(self.snapshots) + COMPACT_SLACK:
+            self.save()
+
+    def _load_legacy(self):
+        """Переводит history.json прежнего формата (все снимки целиком) в журнал"""
+        legacy = os.path.join(self.project_dir, LEGACY_FILE)
+        if not os.path.exists(legacy):
+            return
+        try:
+            with open(legacy, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            snapshots = data.get("snapshots", [])[-self.max_history:]
+            skipped = len(data.get("snapshots", [])) - len(snapshots)
+            self.snapshots = deque(snapshots)
+            self._deltas = deque([None] + [snapshot_delta(a, b) for a, b in zip(snapshots, snapshots[1:])])
+            self.position = min(data.get("position", -1) - skipped, len(self.snapshots) - 1)
+            if self.snapshots:
+                self.position = max(0, self.position)
+            self.save()
+            os.remove(legacy)
+        except:
+            self.snapshots, self._deltas, self.position = deque(), deque(), -1
+
+    def _append(self, record):
+        try:
+            with open(self.history_file, 'a', encoding='utf-8') as f:
+                f.write(_dump(record))
+            self._records += 1
+        except:
+            pass
+
+    def _truncate(self, length):
+        while len(self.snapshots) > length:
+            self.snapshots.pop()
+            self._deltas.pop()
+
+    def _trim(self):
+        while len(self.snapshots) > self.max_history:
+            self.snapshots.popleft()
+            self._deltas.popleft()
+            self.first_seq += 1
+
     def save(self):
+        """Переписывает журнал: первый снимок целиком, остальные разницами, и позиция"""
+        tmp = self.history_file + ".tmp"
         try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump({"snapshots": self.snapshots, "position": self.position}, f)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                lines = 0
+                if self.snapshots:
+                    f.write(_dump({"op": "full", "seq": self.first_seq, "snap": self.snapshots[0]}))
+                    for seq, record in enumerate(self._deltas):
+                        if seq:
+                            f.write(_dump(dict(record, op="snap", seq=self.first_seq + seq)))
+                    f.write(_dump({"op": "pos", "seq": self.first_seq + self.position}))
+                    lines = len(self.snapshots) + 1
+            os.replace(tmp, self.history_file)
+            self._records = lines
         except:
             pass
-    
+
     def push(self, snapshot):
-        if self.position < len(self.snapshots) - 1:
-            self.snapshots = self.snapshots[:self.position + 1]
-        
+        self._truncate(self.position + 1)
+
         snapshot["ts"] = time.time()
-        self.snapshots.append(snapshot)
+        if self.snapshots:
+            record = snapshot_delta(self.snapshots[-1], snapshot)
+            seq = self.first_seq + len(self.snapshots)
+            self.snapshots.append(snapshot)
+            self._deltas.append(record)
+            self._append(dict(record, op="snap", seq=seq))
+        else:
+            self.snapshots.append(snapshot)
+            self._deltas.append(None)
+            self._append({"op": "full", "seq": self.first_seq, "snap": snapshot})
+        self._trim()
         self.position = len(self.snapshots) - 1
-        
-        while len(self.snapshots) > self.max_history:
-            self.snapshots.pop(0)
-            self.position -= 1
-        
-        self.save()
-    
+
+        if self._records > 2 * len(self.snapshots) + COMPACT_SLACK:
+            self.save()
+
+    def _move(self, position):
+        self.position = position
+        self._append({"op": "pos", "seq": self.first_seq + position})
+        return self.snapshots[position]
+
     def undo(self):
         if self.position <= 0:
             return None
-        self.position -= 1
-        self.save()
-        return self.snapshots[self.position]
-    
+        return self._move(self.position - 1)
+
     def redo(self):
         if self.position >= len(self.snapshots) - 1:
             return None
-        self.position += 1
-        self.save()
-        return self.snapshots[self.position]
-    
+        return self._move(self.position + 1)
+
     def can_undo(self):
         return self.position > 0
-    
+
     def can_redo(self):
         return self.position < len(self.snapshots) - 1
-    
+
     def clear(self):
-        self.snapshots = []
+        self.snapshots = deque()
+        self._deltas = deque()
         self.position = -1
-        self.save()
\ No newline at end of file
+        self.save()
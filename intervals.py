@@ -0,0 +1,191 @@
+import bisect
+import heapq
+from itertools import count
+from operator import attrgetter
+
+import numpy as np
+
+from parts import PartGroup
+
+# Индекс частей по границам для попаданий мышью, перекрытий и вложенности.
+# Части отсортированы по началу (при равном - длинные раньше, как в уровнях),
+# рядом - префиксный максимум концов: всё, что может перекрыть точку, лежит
+# между первым префиксом, выходящим за неё, и последним началом до неё.
+# Индекс перестраивается, когда меняется состав списка или границы любой части
+# (PartGroup.bounds_revision растёт при каждой записи start/end, PartList.revision -
+# при любом изменении списка). Концы, точки привязки и поиск по границам строятся
+# при первом запросе после перестройки.
+
+_revisions = count(1)
+
+
+def _changes(name):
+    method = getattr(list, name)
+
+    def changed(self, *args):
+        self.revision = next(_revisions)
+        return method(self, *args)
+    changed.__name__ = name
+    return changed
+
+
+class PartList(list):
+    """Список частей редактора; revision меняется при каждом изменении, и sync не сравнивает списки"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.revision = next(_revisions)
+
+    append = _changes("append")
+    extend = _changes("extend")
+    insert = _changes("insert")
+    remove = _changes("remove")
+    pop = _changes("pop")
+    clear = _changes("clear")
+    sort = _changes("sort")
+    reverse = _changes("reverse")
+    __setitem__ = _changes("__setitem__")
+    __delitem__ = _changes("__delitem__")
+    __iadd__ = _changes("__iadd__")
+    __imul__ = _changes("__imul__")
+
+
+class PartIndex:
+
+    def __init__(self):
+        self._key = None
+        self.parts = []
+        self._order = {}
+        self._by_start = []
+        self._starts = []
+        self._max_ends = []
+        self._start_ends = []
+        self._ends = []
+        self._end_parts = []
+        self._points = []
+        self._by_range = {}
+        self._levels_key = None
+
+    def sync(self, parts):
+        """Перестраивает индекс, если список частей или их границы изменились; возвращает self"""
+        revision = getattr(parts, "revision", None)
+        if revision is None:
+            key = (PartGroup.bounds_revision, tuple(map(id, parts)))
+        else:
+            # номер ревизии общий для всех PartList, так что и замена списка его меняет
+            key = (PartGroup.bounds_revision, revision)
+        if key == self._key:
+            return self
+        self._key = key
+        self.parts = list(parts)
+        self._order = {id(g): i for i, g in enumerate(self.parts)}
+
+        # по началу, при равном - длинные раньше; lexsort устойчив, равные - в порядке списка
+        starts = np.fromiter(map(attrgetter("start"), self.parts), np.int64, len(self.parts))
+        ends = np.fromiter(map(attrgetter("end"), self.parts), np.int64, len(self.parts))
+        order = np.lexsort((starts - ends, starts))
+        self._by_start = [self.parts[i] for i in order.tolist()]
+        self._starts = starts[order].tolist()
+        ends = ends[order]
+        self._start_ends = ends.tolist()
+        self._max_ends = np.maximum.accumulate(ends).tolist()
+
+        self._end_parts = None
+        self._points = None
+        self._by_range = None
+        return self
+
+    def order(self, part):
+        return self._order.get(id(part), len(self.parts))
+
+    def _in_order(self, parts):
+        # как при переборе списка: от этого зависят равные apply_order и уровни
+        return sorted(parts, key=self.order)
+
+    def find(self, start, end):
+        if self._by_range is None:
+            self._by_range = {}
+            for g in self.parts:
+                self._by_range.setdefault((g.start, g.end), g)
+        return self._by_range.get((start, end))
+
+    def overlapping(self, start, end):
+        """Части с g.start < end и g.end > start, в порядке списка"""
+        hi = bisect.bisect_left(self._starts, end)
+        lo = bisect.bisect_right(self._max_ends, start, 0, hi)
+        return self._in_order(g for g in self._by_start[lo:hi] if g.end > start)
+
+    def at(self, sample):
+        return self.overlapping(sample, sample + 1)
+
+    def nested(self, part):
+        """Части внутри границ part (кроме неё самой)"""
+        lo = bisect.bisect_left(self._starts, part.start)
+        hi = bisect.bisect_right(self._starts, part.end)
+        return self._in_order(g for g in self._by_start[lo:hi] if g.end <= part.end and g.id != part.id)
+
+    def starting_between(self, lo, hi):
+        return self._by_start[bisect.bisect_left(self._starts, lo):bisect.bisect_right(self._starts, hi)]
+
+    def ending_between(self, lo, hi):
+        if self._end_parts is None:
+            self._end_parts = sorted(self.parts, key=attrgetter("end"))
+            self._ends = [g.end for g in self._end_parts]
+        return self._end_parts[bisect.bisect_left(self._ends, lo):bisect.bisect_right(self._ends, hi)]
+
+    def nearest_point(self, sample, exclude=None):
+        """Ближайшая граница части (кроме exclude) и расстояние до неё; (None, None), если нет.
+
+        При равном расстоянии - та, что раньше в списке частей, как при полном переборе.
+        """
+        if self._points is None:
+            # в порядке обхода списка: (значение, номер части, 0 - начало / 1 - конец)
+            self._points = sorted((b, i, k) for i, g in enumerate(self.parts) for k, b in enumerate((g.start, g.end)))
+        skip = self.order(exclude) if exclude is not None else -1
+        pos = bisect.bisect_left(self._points, (sample, -1, -1))
+        best = None
+        # влево и вправо до первой подходящей точки; равные по значению перебираются все
+        for step, i in ((-1, pos - 1), (1, pos)):
+            found = None
+            while 0 <= i < len(self._points):
+                value, n, k = self._points[i]
+                if n != skip:
+                    if found is not None and value != found[0]:
+                        break
+                    dist = abs(sample - value)
+                    if found is None or (n, k) < found[1]:
+                        found = (value, (n, k), dist)
+                i += step
+            if found is not None and (best is None or (found[2], found[1]) < (best[2], best[1])):
+                best = found
+        if best is None:
+            return None, None
+        return best[0], best[2]
+
+    def assign_levels(self):
+        """Ряды для отрисовки: часть занимает первый ряд, где предыдущая уже кончилась"""
+        if self._levels_key == self._key:
+            return
+        self._levels_key = self._key
+        push, pop, replace = heapq.heappush, heapq.heappop, heapq.heapreplace
+        busy = []  # (конец, ряд) занятых рядов
+        free = []
+        levels = []
+        for start, end in zip(self._starts, self._start_ends):
+            if busy and busy[0][0] <= start:
+                # освободившиеся ряды: берётся меньший из них и прежде свободных
+                level = pop(busy)[1]
+                while busy and busy[0][0] <= start:
+                    push(free, pop(busy)[1])
+                if free and free[0] < level:
+                    level = replace(free, level)
+            elif free:
+                level = pop(free)
+            else:
+                level = len(busy)
+            push(busy, (end, level))
+            levels.append(level)
+        # запись атрибута части идёт через PartGroup.__setattr__, неизменённые пропускаются
+        for g, level in zip(self._by_start, levels):
+            if g.__dict__.get("level") != level:
+                g.level = level
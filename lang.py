@@ -83,6 +83,16 @@ TRANSLATIONS = {
     "Files found:": {"ru": "Найдено файлов:", "zh": "找到文件:"},
     "File": {"ru": "Файл", "zh": "文件"},
     "Processed:": {"ru": "Обработано:", "zh": "已处理:"},
+    "Stage utilization:": {"ru": "Загрузка стадий:", "zh": "各阶段利用率:"},
+    "Using conversion service:": {"ru": "Используется служба конвертации:", "zh": "使用转换服务:"},
+    "Short clips:": {"ru": "Короткие клипы:", "zh": "短片段:"},
+    "clips/s": {"ru": "клипов/с", "zh": "片段/秒"},
+    "Starting chunk workers:": {"ru": "Запуск процессов для кусков:", "zh": "启动分块工作进程:"},
+    "Shared weights unavailable:": {"ru": "Общая память для весов недоступна:", "zh": "共享内存权重不可用:"},
+    "Threads:": {"ru": "Потоки:", "zh": "线程:"},
+    "budget": {"ru": "бюджет", "zh": "预算"},
+    "Up to date, skipped:": {"ru": "Актуальны, пропущено:", "zh": "已是最新，跳过:"},
+    "duplicates:": {"ru": "дубликатов:", "zh": "重复:"},
     "Linear blend": {"ru": "Линейное смешивание", "zh": "线性混合"},
     "Smooth blend": {"ru": "Плавное смешивание", "zh": "平滑混合"},
     "Original": {"ru": "Исходное", "zh": "原始"},
@@ -101,6 +111,9 @@ TRANSLATIONS = {
     "Keep only current": {"ru": "Оставить только текущую", "zh": "仅保留当前"},
     "Delete part (restore)": {"ru": "Удалить часть (восстановить)", "zh": "删除片段（恢复）"},
     "Flatten to single file": {"ru": "Свести в общий файл", "zh": "合并为单个文件"},
+    "Export version as WAV...": {"ru": "Экспорт версии в WAV...", "zh": "导出版本为WAV..."},
+    "Versions moved to store:": {"ru": "Версии перенесены в хранилище:", "zh": "版本已迁移到存储:"},
+    "Version store error:": {"ru": "Ошибка хранилища версий:", "zh": "版本存储错误:"},
     "Version deleted": {"ru": "Версия удалена", "zh": "版本已删除"},
     "Other versions deleted": {"ru": "Другие версии удалены", "zh": "其他版本已删除"},
     "Part deleted, data restored": {"ru": "Часть удалена, данные восстановлены", "zh": "片段已删除，数据已恢复"},
@@ -193,9 +206,9 @@ TRANSLATIONS = {
     "mangio-crepe folder not found:": {"ru": "Папка mangio-crepe не найдена:", "zh": "未找到mangio-crepe文件夹:"},
     "mangio-crepe files updated:": {"ru": "Обновлены файлы mangio-crepe:", "zh": "mangio-crepe文件已更新:"},
     "hint_f0_method": {
-        "ru": "Алгоритм извлечения основного тона (F0):\n\n• rmvpe - лучший баланс качества и скорости, рекомендуется\n• mangio-crepe - высокая точность, медленнее, есть настройка шага\n• crepe - точный, но медленный\n• harvest - хорош для низких голосов\n• pm - быстрый, но менее точный",
-        "zh": "基频(F0)提取算法:\n\n• rmvpe - 质量和速度的最佳平衡，推荐使用\n• mangio-crepe - 高精度，较慢，可调步长\n• crepe - 精确但慢\n• harvest - 适合低音\n• pm - 快但不太精确",
-        "en": "Pitch extraction algorithm (F0):\n\n• rmvpe - best balance of quality and speed, recommended\n• mangio-crepe - high accuracy, slower, adjustable step\n• crepe - accurate but slow\n• harvest - good for low voices\n• pm - fast but less accurate"
+        "ru": "Алгоритм извлечения основного тона (F0):\n\n• rmvpe - лучший баланс качества и скорости, рекомендуется\n• mangio-crepe - высокая точность, медленнее, есть настройка шага\n• crepe - точный, но медленный\n• harvest - хорош для низких голосов\n• pm - быстрый, но менее точный\n• auto - самый точный метод, который укладывается в бюджет времени (f0_budget, нужна калибровка tuning.py f0)",
+        "zh": "基频(F0)提取算法:\n\n• rmvpe - 质量和速度的最佳平衡，推荐使用\n• mangio-crepe - 高精度，较慢，可调步长\n• crepe - 精确但慢\n• harvest - 适合低音\n• pm - 快但不太精确\n• auto - 在时间预算内最精确的方法 (f0_budget，需要先运行 tuning.py f0 校准)",
+        "en": "Pitch extraction algorithm (F0):\n\n• rmvpe - best balance of quality and speed, recommended\n• mangio-crepe - high accuracy, slower, adjustable step\n• crepe - accurate but slow\n• harvest - good for low voices\n• pm - fast but less accurate\n• auto - the most accurate method that fits the time budget (f0_budget, needs tuning.py f0 calibration)"
     },
     "hint_hop_length": {
         "ru": "Шаг анализа для crepe методов.\n\nМеньшее значение = более точное определение тона,\nно медленнее обработка.\n\n• 64-128 - высокая точность (медленно)\n• 128-256 - баланс (рекомендуется)\n• 256-512 - быстрая обработка",
@@ -8,6 +8,7 @@ import shutil
 
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 RVC_ROOT = os.path.dirname(APP_DIR)
+LAUNCH_DIR = os.getcwd()
 
 # ВАЖНО: Устанавливаем рабочую директорию на RVC_ROOT
 os.chdir(RVC_ROOT)
@@ -96,6 +97,11 @@ def check_dependencies():
 
 
 def main():
+    if len(sys.argv) > 1:
+        # аргументы командной строки - консольная конвертация без GUI
+        from cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:], cwd=LAUNCH_DIR))
+    
     print(tr("RVC Editor"))
     print(f"RVC: {RVC_ROOT}")
     print()
@@ -1,5 +1,7 @@
+import os
 import traceback
 import logging
+from time import time as ttime
 
 logger = logging.getLogger(__name__)
 
@@ -7,6 +9,7 @@ import numpy as np
 import soundfile as sf
 import torch
 from io import BytesIO
+from collections import OrderedDict
 
 from infer.lib.audio import load_audio, wav2
 from infer.lib.infer_pack.models import (
@@ -15,9 +18,25 @@ from infer.lib.infer_pack.models import (
     SynthesizerTrnMs768NSFsid,
     SynthesizerTrnMs768NSFsid_nono,
 )
-from infer.modules.vc.pipeline import Pipeline
+from infer.modules.vc.pipeline import Pipeline, resample, share_rmvpe, attach_rmvpe
 from infer.modules.vc.utils import *
 
+# форматы, которые libsndfile читает сам, без запуска ffmpeg
+SF_EXTENSIONS = (".wav", ".flac", ".ogg", ".aif", ".aiff")
+
+
+def decode_audio(path, sr):
+    """WAV/FLAC/OGG декодируются в процессе, остальное - через ffmpeg"""
+    if str(path).lower().endswith(SF_EXTENSIONS):
+        try:
+            audio, file_sr = sf.read(path, dtype="float32", always_2d=True)
+            # как у ffmpeg с ac=1: среднее по каналам
+            audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+            return resample(audio, file_sr, sr).astype(np.float32, copy=False)
+        except Exception as e:
+            logger.info("In-process decode failed, using ffmpeg: %s" % e)
+    return load_audio(path, sr)
+
 
 class VC:
     def __init__(self, config):
@@ -33,6 +52,9 @@ class VC:
 
         self.config = config
         self.dop_name = ""
+        # прогретые модели: sid -> состояние после загрузки (долгоживущий процесс)
+        self.warm_models = OrderedDict()
+        self.warm_limit = int(os.getenv("rvc_warm_models", "2"))
 
     def get_vc(self, sid, *to_return_protect):
         logger.info("Get sid: " + sid)
@@ -57,6 +79,7 @@ class VC:
                 self.hubert_model is not None
             ):  # 考虑到轮询, 需要加个判断看是否 sid 是由有模型切换到无模型的
                 logger.info("Clean model cache")
+                self.warm_models.clear()
                 del (self.net_g, self.n_spk, self.hubert_model, self.tgt_sr)  # ,cpt
                 self.hubert_model = self.net_g = self.n_spk = self.hubert_model = (
                     self.tgt_sr
@@ -99,9 +122,25 @@ class VC:
                 "",
             )
         person = f'{os.getenv("weight_root")}/{sid}'
-        logger.info(f"Loading: {person}")
-
         self.dop_name = sid.split('.')[0]
+
+        if self._restore_warm(sid, person):
+            logger.info(f"Warm model: {person}")
+            n_spk = self.cpt["config"][-3]
+            index = {"value": get_index_path_from_model(sid), "__type__": "update"}
+            return (
+                (
+                    {"visible": True, "maximum": n_spk, "__type__": "update"},
+                    to_return_protect0,
+                    to_return_protect1,
+                    index,
+                    index,
+                )
+                if to_return_protect
+                else {"visible": True, "maximum": n_spk, "__type__": "update"}
+            )
+
+        logger.info(f"Loading: {person}")
         self.cpt = torch.load(person, map_location="cpu")
         self.tgt_sr = self.cpt["config"][-1]
         self.cpt["config"][-3] = self.cpt["weight"]["emb_g.weight"].shape[0]  # n_spk
@@ -129,6 +168,7 @@ class VC:
             self.net_g = self.net_g.float()
 
         self.pipeline = Pipeline(self.tgt_sr, self.config)
+        self._store_warm(sid, person)
         n_spk = self.cpt["config"][-3]
         index = {"value": get_index_path_from_model(sid), "__type__": "update"}
         logger.info("Select index: " + index["value"])
@@ -145,6 +185,80 @@ class VC:
             else {"visible": True, "maximum": n_spk, "__type__": "update"}
         )
 
+    def _store_warm(self, sid, person):
+        if self.warm_limit <= 0:
+            return
+        self.warm_models[sid] = {
+            "mtime": os.path.getmtime(person),
+            "cpt": self.cpt,
+            "net_g": self.net_g,
+            "tgt_sr": self.tgt_sr,
+            "if_f0": self.if_f0,
+            "version": self.version,
+            "pipeline": self.pipeline,
+        }
+        self.warm_models.move_to_end(sid)
+        while len(self.warm_models) > self.warm_limit:
+            self.warm_models.popitem(last=False)
+
+    def _restore_warm(self, sid, person):
+        state = self.warm_models.get(sid)
+        if state is None or not os.path.exists(person):
+            return False
+        if state["mtime"] != os.path.getmtime(person):
+            del self.warm_models[sid]
+            return False
+        self.warm_models.move_to_end(sid)
+        self.cpt = state["cpt"]
+        self.net_g = state["net_g"]
+        self.tgt_sr = state["tgt_sr"]
+        self.if_f0 = state["if_f0"]
+        self.version = state["version"]
+        self.pipeline = state["pipeline"]
+        self.n_spk = self.cpt["config"][-3]
+        return True
+
+    def export_shared(self, sid, with_rmvpe=False):
+        """Загруженные веса в общей памяти для процессов-воркеров.
+
+        Тензоры hubert, net_g (и RMVPE) переносятся в shared memory; при передаче
+        в spawn-процесс через multiprocessing они не копируются, а отображаются
+        в ту же память, и воркер добавляет только память активаций.
+        Только для CPU: на GPU веса и так в одной видеопамяти.
+        """
+        if self.net_g is None or str(self.config.device) != "cpu":
+            return None
+        # много тензоров - много дескрипторов, поэтому стратегия через файлы в /dev/shm
+        torch.multiprocessing.set_sharing_strategy("file_system")
+        if self.hubert_model is None:
+            self.hubert_model = load_hubert(self.config)
+        return {
+            "sid": sid,
+            "cpt": {k: v for k, v in self.cpt.items() if k != "weight"},
+            "net_g": self.net_g.share_memory(),
+            "hubert": self.hubert_model.share_memory(),
+            "tgt_sr": self.tgt_sr,
+            "if_f0": self.if_f0,
+            "version": self.version,
+            "rmvpe": share_rmvpe(self.config.is_half, self.config.device)
+            if with_rmvpe
+            else None,
+        }
+
+    def attach_shared(self, shared):
+        """Модель из export_shared() другого процесса вместо загрузки с диска"""
+        self.cpt = shared["cpt"]
+        self.net_g = shared["net_g"]
+        self.hubert_model = shared["hubert"]
+        self.tgt_sr = shared["tgt_sr"]
+        self.if_f0 = shared["if_f0"]
+        self.version = shared["version"]
+        self.n_spk = self.cpt["config"][-3]
+        self.dop_name = shared["sid"].split(".")[0]
+        self.pipeline = Pipeline(self.tgt_sr, self.config)
+        if shared.get("rmvpe") is not None:
+            attach_rmvpe(shared["rmvpe"], self.config.is_half, self.config.device)
+
     def vc_single(
         self,
         sid,
@@ -160,15 +274,21 @@ class VC:
         rms_mix_rate,
         protect,
         crepe_hop_length,
+        output_dtype="int16",
+        audio=None,
+        chunk_map=None,
     ):
         if input_audio_path is None:
             return "You need to upload an audio", None
         f0_up_key = int(f0_up_key)
         try:
-            audio = load_audio(input_audio_path, 16000)
+            t_decode = ttime()
+            if audio is None:
+                audio = decode_audio(input_audio_path, 16000)
+            t_decode = ttime() - t_decode
             audio_max = np.abs(audio).max() / 0.95
             if audio_max > 1:
-                audio /= audio_max
+                audio = audio / audio_max
             times = [0, 0, 0]
 
             if self.hubert_model is None:
@@ -208,6 +328,8 @@ class VC:
                 protect,
                 crepe_hop_length,
                 f0_file,
+                output_dtype=output_dtype,
+                chunk_map=chunk_map,
             )
             if self.tgt_sr != resample_sr >= 16000:
                 tgt_sr = resample_sr
@@ -219,8 +341,8 @@ class VC:
                 else "Index not used."
             )
             return (
-                "Success.\n%s\nTime:\nnpy: %.2fs, f0: %.2fs, infer: %.2fs."
-                % (index_info, *times),
+                "Success.\n%s\nTime:\ndecode: %.2fs, npy: %.2fs, f0: %.2fs, infer: %.2fs."
+                % (index_info, t_decode, *times),
                 (tgt_sr, audio_opt),
             )
         except:
@@ -228,6 +350,129 @@ class VC:
             logger.warning(info)
             return info, (None, None)
 
+    def vc_batch(
+        self,
+        sid,
+        audios,
+        names,
+        f0_up_key,
+        f0_method,
+        file_index,
+        index_rate,
+        filter_radius,
+        resample_sr,
+        rms_mix_rate,
+        protect,
+        crepe_hop_length,
+        output_dtype="int16",
+        max_batch=16,
+        max_batch_seconds=32,
+    ):
+        """Короткие клипы (float32, 16 кГц) пакетами через Pipeline.pipeline_batch.
+
+        Возвращает (info, [(sr, audio) или None на клип]); длинные и совсем
+        короткие клипы идут обычным pipeline(). Если пакет падает, его клипы
+        повторяются по одному через pipeline(), и None получает только тот клип,
+        который не конвертируется и сам по себе.
+        """
+        try:
+            f0_up_key = int(f0_up_key)
+            if self.hubert_model is None:
+                self.hubert_model = load_hubert(self.config)
+            file_index = (
+                file_index.strip(" ").strip('"').strip("\n").strip('"').strip(" ")
+                .replace("trained", "added")
+                if file_index
+                else ""
+            )
+            clips = []
+            for audio in audios:
+                if audio is None or len(audio) == 0:
+                    # пустой файл: нормировать и конвертировать нечего
+                    clips.append(None)
+                    continue
+                audio_max = np.abs(audio).max() / 0.95
+                clips.append(audio / audio_max if audio_max > 1 else audio)
+
+            times = [0, 0, 0]
+            common = (
+                f0_up_key,
+                f0_method,
+                file_index,
+                index_rate,
+                self.if_f0,
+                filter_radius,
+                self.tgt_sr,
+                resample_sr,
+                rms_mix_rate,
+                self.version,
+                protect,
+                crepe_hop_length,
+            )
+            results = [None] * len(clips)
+            batch = []
+
+            def convert_single(i):
+                try:
+                    results[i] = self.pipeline.pipeline(
+                        self.hubert_model, self.net_g, sid, clips[i], names[i],
+                        times, *common, output_dtype=output_dtype,
+                    )
+                except:
+                    logger.warning("Clip failed (%s):\n%s", names[i], traceback.format_exc())
+
+            def flush():
+                try:
+                    outs = self.pipeline.pipeline_batch(
+                        self.hubert_model,
+                        self.net_g,
+                        sid,
+                        [clips[i] for i in batch],
+                        [names[i] for i in batch],
+                        times,
+                        *common,
+                        output_dtype=output_dtype,
+                    )
+                    for i, out in zip(batch, outs):
+                        results[i] = out
+                except:
+                    logger.warning(
+                        "Batch failed (%s), retrying clips one by one:\n%s",
+                        ", ".join(str(names[i]) for i in batch), traceback.format_exc(),
+                    )
+                    for i in batch:
+                        convert_single(i)
+                del batch[:]
+
+            # по длине, чтобы в пакете было меньше нулевого дополнения
+            limit = max_batch_seconds * 16000
+            valid = [i for i in range(len(clips)) if clips[i] is not None]
+            for i in sorted(valid, key=lambda i: clips[i].shape[0]):
+                length = clips[i].shape[0]
+                # то, что plan() режет на куски, пакетом не считается
+                if length + self.pipeline.window > self.pipeline.t_max or length <= self.pipeline.window * 2:
+                    convert_single(i)
+                    continue
+                if batch and (len(batch) >= max_batch or (len(batch) + 1) * length > limit):
+                    flush()
+                batch.append(i)
+            if batch:
+                flush()
+
+            if self.tgt_sr != resample_sr >= 16000:
+                tgt_sr = resample_sr
+            else:
+                tgt_sr = self.tgt_sr
+            return (
+                "Success.\nClips: %d\nTime:\nnpy: %.2fs, f0: %.2fs, infer: %.2fs."
+                % (len(clips), *times),
+                [(tgt_sr, out) if out is not None else None for out in results],
+            )
+        except:
+            info = traceback.format_exc()
+            logger.warning(info)
+            return info, None
+
     def vc_multi(
         self,
         sid,
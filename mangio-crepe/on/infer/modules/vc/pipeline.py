@@ -5,18 +5,17 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+from collections import OrderedDict
 from functools import lru_cache
 from time import time as ttime
 
 import faiss
-import librosa
 import numpy as np
 import parselmouth
 import pyworld
 import torch
-import torch.nn.functional as F
 import torchcrepe
-from scipy import signal
+from scipy import signal, sparse
 
 now_dir = os.getcwd()
 sys.path.append(now_dir)
@@ -40,46 +39,276 @@ def cache_harvest_f0(input_audio_path, fs, f0max, f0min, frame_period):
     return f0
 
 
-def change_rms(data1, sr1, data2, sr2, rate):  # 1是输入音频，2是输出音频,rate是2的占比
-    # print(data1.max(),data2.max())
-    rms1 = librosa.feature.rms(
-        y=data1, frame_length=sr1 // 2 * 2, hop_length=sr1 // 2
-    )  # 每半秒一个点
-    rms2 = librosa.feature.rms(y=data2, frame_length=sr2 // 2 * 2, hop_length=sr2 // 2)
-    rms1 = torch.from_numpy(rms1)
-    rms1 = F.interpolate(
-        rms1.unsqueeze(0), size=data2.shape[0], mode="linear"
-    ).squeeze()
-    rms2 = torch.from_numpy(rms2)
-    rms2 = F.interpolate(
-        rms2.unsqueeze(0), size=data2.shape[0], mode="linear"
-    ).squeeze()
-    rms2 = torch.max(rms2, torch.zeros_like(rms2) + 1e-6)
-    data2 *= (
-        torch.pow(rms1, torch.tensor(1 - rate))
-        * torch.pow(rms2, torch.tensor(rate - 1))
-    ).numpy()
-    return data2
+# crepe: окно 1024 отсчёта, активации на кадр (оценка) и бюджет памяти на батч
+CREPE_WINDOW = 1024
+CREPE_FRAME_MB = {"full": 4.0, "tiny": 0.5}
+CREPE_MEMORY_MB = float(os.getenv("rvc_crepe_memory_mb", "512"))
+# кадры тише самого громкого на столько дБ не декодируются (f0 = 0)
+CREPE_GATE_DB = 50
+CREPE_GATE_MARGIN = 2  # кадров контекста вокруг озвученного участка
+CREPE_MIN_GAP = 8  # паузы короче - не разрывают участок
+
+
+def _crepe_batch_size(model, device):
+    """Кадров на батч из бюджета памяти; на CPU ещё и по числу потоков"""
+    batch_size = int(CREPE_MEMORY_MB / CREPE_FRAME_MB.get(model, CREPE_FRAME_MB["full"]))
+    if "cuda" not in str(device):
+        # на CPU большой батч уже не ускоряет, а память держит
+        batch_size = min(batch_size, 128 * torch.get_num_threads())
+    return max(32, min(batch_size, 2048))
+
+
+def _voiced_runs(x, hop_length, n_frames):
+    """[(начало, конец)] кадров crepe, где есть энергия; кадр i - окно с центром i * hop"""
+    xp = np.pad(x.astype(np.float64), CREPE_WINDOW // 2)
+    csum = np.concatenate(([0.0], np.cumsum(xp * xp)))
+    starts = np.arange(n_frames) * hop_length
+    energy = csum[np.minimum(starts + CREPE_WINDOW, len(xp))] - csum[starts]
+    voiced = energy > energy.max() * 10 ** (-CREPE_GATE_DB / 10)
+    if not voiced.any():
+        return []
+    # расширение на margin кадров и склейка коротких пауз
+    idx = np.flatnonzero(voiced)
+    breaks = np.flatnonzero(np.diff(idx) > CREPE_MIN_GAP + 2 * CREPE_GATE_MARGIN)
+    run_starts = np.concatenate(([idx[0]], idx[breaks + 1]))
+    run_ends = np.concatenate((idx[breaks], [idx[-1]])) + 1
+    return [
+        (max(0, a - CREPE_GATE_MARGIN), min(n_frames, b + CREPE_GATE_MARGIN))
+        for a, b in zip(run_starts, run_ends)
+    ]
+
+
+# прогретые между вызовами и пересозданиями Pipeline (смена модели) ресурсы
+_rmvpe_models = {}
+_index_cache = OrderedDict()
+INDEX_CACHE_SIZE = 4
+
+
+def _get_rmvpe(is_half, device):
+    key = (str(device), is_half)
+    if key not in _rmvpe_models:
+        from infer.lib.rmvpe import RMVPE
+
+        logger.info(
+            "Loading rmvpe model,%s" % "%s/rmvpe.pt" % os.environ["rmvpe_root"]
+        )
+        _rmvpe_models[key] = RMVPE(
+            "%s/rmvpe.pt" % os.environ["rmvpe_root"],
+            is_half=is_half,
+            device=device,
+        )
+    return _rmvpe_models[key]
+
+
+def share_rmvpe(is_half, device):
+    """RMVPE с весами в общей памяти для процессов-воркеров; None, если rmvpe.pt нет"""
+    if not os.path.exists("%s/rmvpe.pt" % os.environ["rmvpe_root"]):
+        return None
+    rmvpe = _get_rmvpe(is_half, device)
+    rmvpe.model.share_memory()
+    return rmvpe
+
+
+def attach_rmvpe(rmvpe, is_half, device):
+    _rmvpe_models[(str(device), is_half)] = rmvpe
+
+
+def _load_index(file_index):
+    """faiss-индекс и его векторы, кэш по пути и mtime"""
+    key = (os.path.abspath(file_index), os.path.getmtime(file_index))
+    if key in _index_cache:
+        _index_cache.move_to_end(key)
+        return _index_cache[key]
+    index = faiss.read_index(file_index)
+    big_npy = index.reconstruct_n(0, index.ntotal)
+    _index_cache[key] = (index, big_npy)
+    while len(_index_cache) > INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
+    return index, big_npy
+
+
+@lru_cache(maxsize=None)
+def _polyphase_filter(up, down):
+    # тот же фильтр, что scipy.signal.resample_poly строит по умолчанию,
+    # но проектируется один раз на пару частот
+    max_rate = max(up, down)
+    h = signal.firwin(20 * max_rate + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+    h.flags.writeable = False
+    return h
+
+
+class StreamResampler(object):
+    """Полифазный ресемплинг блоками, совпадает с resample_poly по всему сигналу"""
+
+    def __init__(self, sr_in, sr_out):
+        g = np.gcd(int(sr_in), int(sr_out))
+        self.up = int(sr_out) // g
+        self.down = int(sr_in) // g
+        self.h = _polyphase_filter(self.up, self.down)
+        # сколько входных отсчётов влияет на выходной, с запасом до кратного down
+        ctx = (len(self.h) - 1) // 2 // self.up + 1
+        self.ctx = -(-ctx // self.down) * self.down
+        self.buf = np.zeros(0, dtype=np.float32)
+        self.buf_start = 0  # всегда кратен down, тогда фаза фильтра не сдвигается
+        self.n_in = 0
+        self.n_out = 0
+
+    def output_length(self, n_in):
+        return -(-n_in * self.up // self.down)
+
+    def push(self, x, final=False):
+        if len(x):
+            self.buf = np.concatenate((self.buf, x))
+            self.n_in += len(x)
+        if final:
+            end_out = self.output_length(self.n_in)
+        else:
+            end_out = (self.n_in - self.ctx) * self.up // self.down
+        if end_out <= self.n_out or not len(self.buf):
+            return np.zeros(0, dtype=np.float32)
+        y = signal.resample_poly(self.buf, self.up, self.down, window=self.h)
+        off = self.buf_start * self.up // self.down
+        out = y[self.n_out - off : end_out - off].astype(np.float32)
+        self.n_out = end_out
+        keep = (self.n_out * self.down // self.up - self.ctx) // self.down * self.down
+        if keep > self.buf_start:
+            self.buf = self.buf[keep - self.buf_start :]
+            self.buf_start = keep
+        return out
+
+
+def resample(audio, sr_in, sr_out):
+    if sr_in == sr_out:
+        return audio
+    return StreamResampler(sr_in, sr_out).push(audio, final=True)
+
+
+def _frame_rms(power, hop):
+    # librosa.feature.rms(frame_length=2 * hop, center=True): кадр k
+    # покрывает блоки k - 1 и k, за краями нули
+    p = np.concatenate(([0.0], power))
+    return np.sqrt((p[:-1] + p[1:]) / (2 * hop))
+
+
+def _block_power(x, hop):
+    n = len(x) // hop
+    sq = np.square(x, dtype=np.float64)
+    power = sq[: n * hop].reshape(n, hop).sum(axis=1)
+    return np.append(power, sq[n * hop :].sum())
+
+
+class PostProcessor(object):
+    """RMS-выравнивание выхода по входу (огибающая по полсекунды) и ресемплинг в один проход, блоками"""
+
+    def __init__(self, audio, sr1, sr2, out_sr, rate, total_len=None):
+        self.rate = rate
+        self.total_len = total_len
+        self.hop2 = sr2 // 2
+        self.match_rms = rate != 1
+        self.resampler = StreamResampler(sr2, out_sr) if out_sr != sr2 else None
+        if self.match_rms:
+            self.rms1 = _frame_rms(_block_power(audio, sr1 // 2), sr1 // 2)
+        self.pending = np.zeros(0, dtype=np.float32)
+        self.pos = 0
+        self.power = []
+        self._acc = 0.0
+        self._acc_n = 0
+
+    def output_length(self, n):
+        return self.resampler.output_length(n) if self.resampler else n
+
+    def _accumulate(self, x):
+        sq = np.square(x, dtype=np.float64)
+        i = 0
+        while i < len(sq):
+            take = min(self.hop2 - self._acc_n, len(sq) - i)
+            self._acc += sq[i : i + take].sum()
+            self._acc_n += take
+            i += take
+            if self._acc_n == self.hop2:
+                self.power.append(self._acc)
+                self._acc, self._acc_n = 0.0, 0
+
+    def _src(self, idx, n_frames):
+        # позиции как у F.interpolate(mode="linear", align_corners=False);
+        # без известной длины n_frames / total_len -> 1 / hop2
+        if self.total_len:
+            return (idx + 0.5) * (n_frames / self.total_len) - 0.5
+        return (idx + 0.5) / self.hop2 - 0.5
+
+    def _match_rms(self, block, final):
+        self._accumulate(block)
+        self.pending = np.concatenate((self.pending, block))
+        power = self.power + [self._acc] if final else self.power
+        if not power:
+            return np.zeros(0, dtype=np.float32)
+        rms2 = _frame_rms(np.asarray(power), self.hop2)
+        # полное число кадров огибающей выхода, если длина известна заранее
+        m2 = 1 + self.total_len // self.hop2 if self.total_len else len(rms2)
+        idx = self.pos + np.arange(len(self.pending))
+        src2 = self._src(idx, m2)
+        if not final:
+            # отсчёт готов, когда известны оба соседних кадра огибающей выхода
+            need = np.minimum(np.floor(src2) + 1, m2 - 1)
+            n = int(np.count_nonzero(need <= len(rms2) - 1))
+            idx, src2 = idx[:n], src2[:n]
+        else:
+            n = len(self.pending)
+        if not n:
+            return np.zeros(0, dtype=np.float32)
+        n1 = len(self.rms1)
+        env1 = np.interp(np.maximum(self._src(idx, n1), 0), np.arange(n1), self.rms1)
+        env2 = np.interp(np.maximum(src2, 0), np.arange(len(rms2)), rms2)
+        gain = np.power(env1, 1 - self.rate) * np.power(
+            np.maximum(env2, 1e-6), self.rate - 1
+        )
+        out = (self.pending[:n] * gain).astype(np.float32)
+        self.pending = self.pending[n:]
+        self.pos += n
+        return out
+
+    def process(self, block, final=False):
+        if self.match_rms:
+            block = self._match_rms(block, final)
+        if self.resampler is not None:
+            block = self.resampler.push(block, final)
+        return block
+
+    def run(self, audio, block_size=None):
+        block_size = block_size or self.hop2 * 20
+        out = np.empty(self.output_length(len(audio)), dtype=np.float32)
+        n = 0
+        for i in range(0, len(audio), block_size):
+            final = i + block_size >= len(audio)
+            y = self.process(audio[i : i + block_size], final)
+            out[n : n + len(y)] = y
+            n += len(y)
+        return out[:n]
 
 
 class Pipeline(object):
     def __init__(self, tgt_sr, config):
-        self.x_pad, self.x_query, self.x_center, self.x_max, self.is_half = (
-            config.x_pad,
-            config.x_query,
-            config.x_center,
-            config.x_max,
-            config.is_half,
-        )
+        self.is_half = config.is_half
         self.sr = 16000  # hubert输入采样率
         self.window = 160  # 每帧点数
+        self.tgt_sr = tgt_sr
+        self.set_chunking(config.x_pad, config.x_query, config.x_center, config.x_max)
+        self.device = config.device
+
+    def set_chunking(self, x_pad, x_query, x_center, x_max):
+        """Паддинг и нарезка в секундах (x_pad - целое); см. tuning.py в приложении"""
+        self.x_pad, self.x_query, self.x_center, self.x_max = (
+            int(x_pad),
+            x_query,
+            x_center,
+            x_max,
+        )
         self.t_pad = self.sr * self.x_pad  # 每条前后pad时间
-        self.t_pad_tgt = tgt_sr * self.x_pad
+        self.t_pad_tgt = self.tgt_sr * self.x_pad
         self.t_pad2 = self.t_pad * 2
-        self.t_query = self.sr * self.x_query  # 查询切点前后查询时间
-        self.t_center = self.sr * self.x_center  # 查询切点位置
-        self.t_max = self.sr * self.x_max  # 免查询时长阈值
-        self.device = config.device
+        self.t_query = int(self.sr * self.x_query)  # 查询切点前后查询时间
+        self.t_center = int(self.sr * self.x_center)  # 查询切点位置
+        self.t_max = int(self.sr * self.x_max)  # 免查询时长阈值
 
     def get_f0_crepe_computation(
         self,
@@ -93,29 +322,13 @@ class Pipeline(object):
         """Mangio-crepe с настраиваемым hop_length"""
         x = x.astype(np.float32)
         x /= np.quantile(np.abs(x), 0.999)
-        audio = torch.from_numpy(x).to(self.device, copy=True)
-        audio = torch.unsqueeze(audio, dim=0)
-        if audio.ndim == 2 and audio.shape[0] > 1:
-            audio = torch.mean(audio, dim=0, keepdim=True).detach()
-        audio = audio.detach()
         
         print(f"Initiating prediction with a crepe_hop_length of: {hop_length}")
         
-        pitch = torchcrepe.predict(
-            audio,
-            self.sr,
-            hop_length,
-            f0_min,
-            f0_max,
-            model,
-            batch_size=hop_length * 2,
-            device=self.device,
-            pad=True,
-        )
+        source, _ = self._crepe_predict(x, hop_length, f0_min, f0_max, model)
         
         p_len = p_len or x.shape[0] // hop_length
         
-        source = np.array(pitch.squeeze(0).cpu().float().numpy())
         source[source < 0.001] = np.nan
         target = np.interp(
             np.arange(0, len(source) * p_len, len(source)) / p_len,
@@ -126,6 +339,41 @@ class Pipeline(object):
         
         return f0
 
+    def _crepe_predict(
+        self, x, hop_length, f0_min, f0_max, model, return_periodicity=False
+    ):
+        """torchcrepe.predict(pad=True) только по озвученным участкам.
+
+        Кадры те же, что при проходе по всему сигналу, тихие получают f0 = 0 и
+        периодичность 0. Кадры режутся батчами по бюджету памяти, так что длинный
+        вход не держит все окна сразу. Возвращает numpy (f0, periodicity или None).
+        """
+        n_frames = 1 + len(x) // hop_length
+        f0 = np.zeros(n_frames, dtype=np.float32)
+        pd = np.zeros(n_frames, dtype=np.float32) if return_periodicity else None
+        batch_size = _crepe_batch_size(model, self.device)
+        xp = np.pad(x.astype(np.float32), CREPE_WINDOW // 2)
+        for a, b in _voiced_runs(x, hop_length, n_frames):
+            segment = xp[a * hop_length : (b - 1) * hop_length + CREPE_WINDOW]
+            audio = torch.from_numpy(np.ascontiguousarray(segment))[None].to(self.device)
+            out = torchcrepe.predict(
+                audio,
+                self.sr,
+                hop_length,
+                f0_min,
+                f0_max,
+                model,
+                batch_size=batch_size,
+                device=self.device,
+                pad=False,
+                return_periodicity=return_periodicity,
+            )
+            if return_periodicity:
+                out, periodicity = out
+                pd[a:b] = periodicity[0].cpu().float().numpy()
+            f0[a:b] = out[0].cpu().float().numpy()
+        return f0, pd
+
     def get_f0_official_crepe_computation(
         self,
         x,
@@ -134,21 +382,11 @@ class Pipeline(object):
         model="full",
     ):
         """Стандартный crepe (без настройки hop_length)"""
-        batch_size = 512
-        
-        audio = torch.tensor(np.copy(x))[None].float()
-        
-        f0, pd = torchcrepe.predict(
-            audio,
-            self.sr,
-            self.window,
-            f0_min,
-            f0_max,
-            model,
-            batch_size=batch_size,
-            device=self.device,
-            return_periodicity=True,
+        f0, pd = self._crepe_predict(
+            x, self.window, f0_min, f0_max, model, return_periodicity=True
         )
+        f0 = torch.from_numpy(f0)[None]
+        pd = torch.from_numpy(pd)[None]
         
         pd = torchcrepe.filter.median(pd, 3)
         f0 = torchcrepe.filter.mean(f0, 3)
@@ -213,20 +451,11 @@ class Pipeline(object):
                 x, f0_min, f0_max, p_len, crepe_hop_length, "tiny"
             )
         elif f0_method == "rmvpe":
-            if not hasattr(self, "model_rmvpe"):
-                from infer.lib.rmvpe import RMVPE
-
-                logger.info(
-                    "Loading rmvpe model,%s" % "%s/rmvpe.pt" % os.environ["rmvpe_root"]
-                )
-                self.model_rmvpe = RMVPE(
-                    "%s/rmvpe.pt" % os.environ["rmvpe_root"],
-                    is_half=self.is_half,
-                    device=self.device,
-                )
+            self.model_rmvpe = _get_rmvpe(self.is_half, self.device)
             f0 = self.model_rmvpe.infer_from_audio(x, thred=0.03)
 
             if "privateuseone" in str(self.device):
+                _rmvpe_models.pop((str(self.device), self.is_half), None)
                 del self.model_rmvpe.model
                 del self.model_rmvpe
                 logger.info("Cleaning ortruntime memory")
@@ -254,6 +483,32 @@ class Pipeline(object):
         f0_coarse = np.rint(f0_mel).astype(np.int32)
         return f0_coarse, f0bak
 
+    def _get_padding_mask(self, length):
+        # hubert всегда получает маску без паддинга, поэтому держим один
+        # буфер нужного размера и отдаём срез вместо новой аллокации на чанк
+        mask = getattr(self, "_padding_mask", None)
+        if mask is None or mask.shape[1] < length:
+            mask = torch.zeros((1, length), dtype=torch.bool, device=self.device)
+            self._padding_mask = mask
+        return mask[:, :length]
+
+    def _knn_blend(self, npy, index, big_npy):
+        score, ix = index.search(npy, k=8)
+        weight = np.square(1 / score)
+        weight /= weight.sum(axis=1, keepdims=True)
+        # sum_k w[t, k] * big_npy[ix[t, k]] как разреженное (T, N) @ (N, C),
+        # без промежуточного (T, 8, C); -1 от faiss указывает на последнюю строку
+        n_frames, k = ix.shape
+        blend = sparse.csr_matrix(
+            (
+                weight.ravel(),
+                (ix % big_npy.shape[0]).ravel(),
+                np.arange(0, n_frames * k + 1, k),
+            ),
+            shape=(n_frames, big_npy.shape[0]),
+        )
+        return np.asarray(blend @ big_npy, dtype=np.float32)
+
     def vc(
         self,
         model,
@@ -278,19 +533,19 @@ class Pipeline(object):
             feats = feats.mean(-1)
         assert feats.dim() == 1, feats.dim()
         feats = feats.view(1, -1)
-        padding_mask = torch.BoolTensor(feats.shape).to(self.device).fill_(False)
 
         inputs = {
             "source": feats.to(self.device),
-            "padding_mask": padding_mask,
+            "padding_mask": self._get_padding_mask(feats.shape[1]),
             "output_layer": 9 if version == "v1" else 12,
         }
         t0 = ttime()
         with torch.no_grad():
             logits = model.extract_features(**inputs)
             feats = model.final_proj(logits[0]) if version == "v1" else logits[0]
-        if protect < 0.5 and pitch is not None and pitchf is not None:
-            feats0 = feats.clone()
+        use_protect = protect < 0.5 and pitch is not None and pitchf is not None
+        # ниже feats только пересоздаётся, поэтому копия для protect не нужна
+        feats0 = feats if use_protect else None
         if (
             not isinstance(index, type(None))
             and not isinstance(big_npy, type(None))
@@ -300,13 +555,7 @@ class Pipeline(object):
             if self.is_half:
                 npy = npy.astype("float32")
 
-            # _, I = index.search(npy, 1)
-            # npy = big_npy[I.squeeze()]
-
-            score, ix = index.search(npy, k=8)
-            weight = np.square(1 / score)
-            weight /= weight.sum(axis=1, keepdims=True)
-            npy = np.sum(big_npy[ix] * np.expand_dims(weight, axis=2), axis=1)
+            npy = self._knn_blend(npy, index, big_npy)
 
             if self.is_half:
                 npy = npy.astype("float16")
@@ -315,11 +564,10 @@ class Pipeline(object):
                 + (1 - index_rate) * feats
             )
 
-        feats = F.interpolate(feats.permute(0, 2, 1), scale_factor=2).permute(0, 2, 1)
-        if protect < 0.5 and pitch is not None and pitchf is not None:
-            feats0 = F.interpolate(feats0.permute(0, 2, 1), scale_factor=2).permute(
-                0, 2, 1
-            )
+        # nearest x2 по времени == повтор каждого кадра, без permute туда-обратно
+        feats = feats.repeat_interleave(2, dim=1)
+        if use_protect:
+            feats0 = feats0.repeat_interleave(2, dim=1)
         t1 = ttime()
         p_len = audio0.shape[0] // self.window
         if feats.shape[1] < p_len:
@@ -328,20 +576,18 @@ class Pipeline(object):
                 pitch = pitch[:, :p_len]
                 pitchf = pitchf[:, :p_len]
 
-        if protect < 0.5 and pitch is not None and pitchf is not None:
-            pitchff = pitchf.clone()
-            pitchff[pitchf > 0] = 1
-            pitchff[pitchf < 1] = protect
-            pitchff = pitchff.unsqueeze(-1)
-            feats = feats * pitchff + feats0 * (1 - pitchff)
-            feats = feats.to(feats0.dtype)
+        if use_protect:
+            pitchff = torch.full_like(pitchf, protect)
+            pitchff.masked_fill_(pitchf >= 1, 1)
+            feats = torch.lerp(feats0, feats, pitchff.unsqueeze(-1).to(feats.dtype))
+            del pitchff
         p_len = torch.tensor([p_len], device=self.device).long()
         with torch.no_grad():
             hasp = pitch is not None and pitchf is not None
             arg = (feats, p_len, pitch, pitchf, sid) if hasp else (feats, p_len, sid)
             audio1 = (net_g.infer(*arg)[0][0, 0]).data.cpu().float().numpy()
             del hasp, arg
-        del feats, p_len, padding_mask
+        del feats, feats0, p_len
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
         t2 = ttime()
@@ -370,30 +616,103 @@ class Pipeline(object):
         protect,
         crepe_hop_length,
         f0_file=None,
+        output_dtype="int16",
+        chunk_map=None,
     ):
-        if (
-            file_index != ""
-            # and file_big_npy != ""
-            # and os.path.exists(file_big_npy) == True
-            and os.path.exists(file_index)
-            and index_rate != 0
-        ):
-            try:
-                index = faiss.read_index(file_index)
-                # big_npy = np.load(file_big_npy)
-                big_npy = index.reconstruct_n(0, index.ntotal)
-            except:
-                traceback.print_exc()
-                index = big_npy = None
+        """chunk_map(chunks, sid, file_index, index_rate, protect) -> выходы кусков
+        по порядку; если задан, куски считаются вне этого процесса (см. workers.py)"""
+        audio, audio_pad, chunks, pitch, pitchf = self.plan(
+            audio,
+            input_audio_path,
+            times,
+            f0_up_key,
+            f0_method,
+            if_f0,
+            filter_radius,
+            crepe_hop_length,
+            f0_file,
+        )
+        pieces = [
+            (
+                audio_pad[a:b],
+                pitch[fa:fb] if pitch is not None else None,
+                pitchf[fa:fb] if pitchf is not None else None,
+            )
+            for a, b, fa, fb in chunks
+        ]
+        del audio_pad
+
+        # выход пишется сразу в заранее выделенный массив, без списка и concatenate
+        frame_tgt = tgt_sr // 100
+        audio_opt = np.empty(
+            (audio.shape[0] // self.window + len(chunks) + 1) * frame_tgt,
+            dtype=np.float32,
+        )
+        if chunk_map is not None:
+            t0 = ttime()
+            outputs = chunk_map(pieces, sid, file_index, index_rate, protect)
+            times[2] += ttime() - t0
         else:
-            index = big_npy = None
+            index, big_npy = self._get_index(file_index, index_rate)
+            sid_t = torch.tensor(sid, device=self.device).unsqueeze(0).long()
+            outputs = (
+                self.run_chunk(
+                    model, net_g, sid_t, piece, times, index, big_npy,
+                    index_rate, version, protect,
+                )
+                for piece in pieces
+            )
+        n_opt = 0
+        for chunk in outputs:
+            if n_opt + chunk.shape[0] > audio_opt.shape[0]:
+                audio_opt = np.resize(audio_opt, n_opt + chunk.shape[0])
+            audio_opt[n_opt : n_opt + chunk.shape[0]] = chunk
+            n_opt += chunk.shape[0]
+            del chunk
+        audio_opt = audio_opt[:n_opt]
+        del pieces, outputs
+        audio_opt = self._finish_output(
+            audio, audio_opt, tgt_sr, resample_sr, rms_mix_rate, output_dtype
+        )
+        del pitch, pitchf
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return audio_opt
+
+    def plan(
+        self,
+        audio,
+        input_audio_path,
+        times,
+        f0_up_key,
+        f0_method,
+        if_f0,
+        filter_radius,
+        crepe_hop_length,
+        f0_file=None,
+    ):
+        """Фильтр, паддинг, точки разреза и F0 на весь файл.
+
+        Возвращает (audio, audio_pad, chunks, pitch, pitchf): chunks - список
+        (начало, конец) куска audio_pad и его кадров f0; куски независимы.
+        """
         audio = signal.filtfilt(bh, ah, audio)
-        audio_pad = np.pad(audio, (self.window // 2, self.window // 2), mode="reflect")
+        audio_pad = np.pad(audio, (self.t_pad, self.t_pad), mode="reflect")
         opt_ts = []
-        if audio_pad.shape[0] > self.t_max:
+        if audio.shape[0] + self.window > self.t_max:
+            # reflect-паддинг на window // 2 — это внутренняя часть паддинга
+            # на t_pad, поэтому берём срез вместо второго np.pad
+            half = self.window // 2
+            if self.t_pad >= half:
+                audio_abs = np.abs(
+                    audio_pad[self.t_pad - half : self.t_pad + audio.shape[0] + half]
+                )
+            else:
+                audio_abs = np.abs(np.pad(audio, (half, half), mode="reflect"))
             audio_sum = np.zeros_like(audio)
             for i in range(self.window):
-                audio_sum += np.abs(audio_pad[i : i - self.window])
+                audio_sum += audio_abs[i : i - self.window]
+            del audio_abs
             for t in range(self.t_center, audio.shape[0], self.t_center):
                 opt_ts.append(
                     t
@@ -403,11 +722,8 @@ class Pipeline(object):
                         == audio_sum[t - self.t_query : t + self.t_query].min()
                     )[0][0]
                 )
-        s = 0
-        audio_opt = []
-        t = None
+            del audio_sum
         t1 = ttime()
-        audio_pad = np.pad(audio, (self.t_pad, self.t_pad), mode="reflect")
         p_len = audio_pad.shape[0] // self.window
         inp_f0 = None
         if hasattr(f0_file, "name"):
@@ -420,7 +736,6 @@ class Pipeline(object):
                 inp_f0 = np.array(inp_f0, dtype="float32")
             except:
                 traceback.print_exc()
-        sid = torch.tensor(sid, device=self.device).unsqueeze(0).long()
         pitch, pitchf = None, None
         if if_f0 == 1:
             pitch, pitchf = self.get_f0(
@@ -434,97 +749,246 @@ class Pipeline(object):
                 inp_f0,
             )
             pitch = pitch[:p_len]
-            pitchf = pitchf[:p_len]
-            if "mps" not in str(self.device) or "xpu" not in str(self.device):
-                pitchf = pitchf.astype(np.float32)
-            pitch = torch.tensor(pitch, device=self.device).unsqueeze(0).long()
-            pitchf = torch.tensor(pitchf, device=self.device).unsqueeze(0).float()
+            pitchf = pitchf[:p_len].astype(np.float32)
         t2 = ttime()
         times[1] += t2 - t1
+
+        # (начало, конец) куска audio_pad и соответствующие кадры f0
+        chunks = []
+        s = 0
         for t in opt_ts:
             t = t // self.window * self.window
-            if if_f0 == 1:
-                audio_opt.append(
-                    self.vc(
-                        model,
-                        net_g,
-                        sid,
-                        audio_pad[s : t + self.t_pad2 + self.window],
-                        pitch[:, s // self.window : (t + self.t_pad2) // self.window],
-                        pitchf[:, s // self.window : (t + self.t_pad2) // self.window],
-                        times,
-                        index,
-                        big_npy,
-                        index_rate,
-                        version,
-                        protect,
-                    )[self.t_pad_tgt : -self.t_pad_tgt]
-                )
-            else:
-                audio_opt.append(
-                    self.vc(
-                        model,
-                        net_g,
-                        sid,
-                        audio_pad[s : t + self.t_pad2 + self.window],
-                        None,
-                        None,
-                        times,
-                        index,
-                        big_npy,
-                        index_rate,
-                        version,
-                        protect,
-                    )[self.t_pad_tgt : -self.t_pad_tgt]
+            chunks.append(
+                (
+                    s,
+                    t + self.t_pad2 + self.window,
+                    s // self.window,
+                    (t + self.t_pad2) // self.window,
                 )
+            )
             s = t
-        if if_f0 == 1:
-            audio_opt.append(
-                self.vc(
-                    model,
-                    net_g,
-                    sid,
-                    audio_pad[t:],
-                    pitch[:, t // self.window :] if t is not None else pitch,
-                    pitchf[:, t // self.window :] if t is not None else pitchf,
-                    times,
-                    index,
-                    big_npy,
-                    index_rate,
-                    version,
-                    protect,
-                )[self.t_pad_tgt : -self.t_pad_tgt]
+        chunks.append((s, None, s // self.window, None))
+        return audio, audio_pad, chunks, pitch, pitchf
+
+    def run_chunk(
+        self,
+        model,
+        net_g,
+        sid,
+        piece,
+        times,
+        index,
+        big_npy,
+        index_rate,
+        version,
+        protect,
+    ):
+        """Один кусок из plan(): (audio_pad[a:b], pitch, pitchf) -> выход без паддинга"""
+        audio_chunk, pitch, pitchf = piece
+        if pitch is not None:
+            pitch = torch.tensor(pitch, device=self.device).unsqueeze(0).long()
+            pitchf = torch.tensor(pitchf, device=self.device).unsqueeze(0).float()
+        return self.vc(
+            model,
+            net_g,
+            sid,
+            audio_chunk,
+            pitch,
+            pitchf,
+            times,
+            index,
+            big_npy,
+            index_rate,
+            version,
+            protect,
+        )[self.t_pad_tgt : -self.t_pad_tgt]
+
+    def _get_index(self, file_index, index_rate):
+        if (
+            file_index != ""
+            # and file_big_npy != ""
+            # and os.path.exists(file_big_npy) == True
+            and os.path.exists(file_index)
+            and index_rate != 0
+        ):
+            try:
+                # big_npy = np.load(file_big_npy)
+                return _load_index(file_index)
+            except:
+                traceback.print_exc()
+        return None, None
+
+    def _finish_output(
+        self, audio, audio_opt, tgt_sr, resample_sr, rms_mix_rate, output_dtype
+    ):
+        out_sr = resample_sr if tgt_sr != resample_sr >= 16000 else tgt_sr
+        if rms_mix_rate != 1 or out_sr != tgt_sr:
+            audio_opt = PostProcessor(
+                audio, 16000, tgt_sr, out_sr, rms_mix_rate, total_len=len(audio_opt)
+            ).run(audio_opt)
+        if output_dtype == "int16":
+            audio_max = np.abs(audio_opt).max() / 0.99
+            max_int16 = 32768
+            if audio_max > 1:
+                max_int16 /= audio_max
+            return (audio_opt * max_int16).astype(np.int16)
+        # float32 в единичной шкале, без пиковой нормализации
+        return audio_opt.astype(np.float32, copy=False)
+
+    def _extract_features_batch(self, model, clips, version):
+        """Признаки hubert для нескольких клипов: (B, T, C) и число кадров каждого.
+
+        Повторяет HubertModel.extract_features (fairseq), но свёрточный энкодер
+        идёт по клипу: в его первом слое GroupNorm по всему времени, и нулевое
+        дополнение изменило бы признаки коротких клипов. Трансформер считается
+        пакетом - паддинг по маске он не видит, как и в одиночном прогоне.
+        """
+        with torch.no_grad():
+            frames = []
+            for clip in clips:
+                x = torch.from_numpy(clip)
+                x = x.half() if self.is_half else x.float()
+                frames.append(model.feature_extractor(x.view(1, -1).to(self.device))[0].transpose(0, 1))
+            n_feats = [f.shape[0] for f in frames]
+            x = torch.nn.utils.rnn.pad_sequence(frames, batch_first=True)
+            del frames
+            padding_mask = torch.arange(x.shape[1], device=self.device).unsqueeze(0) >= torch.tensor(
+                n_feats, device=self.device
+            ).unsqueeze(1)
+            x = model.layer_norm(x)
+            if model.post_extract_proj is not None:
+                x = model.post_extract_proj(x)
+            x, _ = model.encoder(
+                x, padding_mask=padding_mask, layer=(9 if version == "v1" else 12) - 1
             )
-        else:
-            audio_opt.append(
-                self.vc(
-                    model,
-                    net_g,
-                    sid,
-                    audio_pad[t:],
-                    None,
-                    None,
-                    times,
-                    index,
-                    big_npy,
-                    index_rate,
-                    version,
-                    protect,
-                )[self.t_pad_tgt : -self.t_pad_tgt]
+            if version == "v1":
+                x = model.final_proj(x)
+        return x, n_feats
+
+    def pipeline_batch(
+        self,
+        model,
+        net_g,
+        sid,
+        audios,
+        names,
+        times,
+        f0_up_key,
+        f0_method,
+        file_index,
+        index_rate,
+        if_f0,
+        filter_radius,
+        tgt_sr,
+        resample_sr,
+        rms_mix_rate,
+        version,
+        protect,
+        crepe_hop_length,
+        output_dtype="int16",
+    ):
+        """Несколько коротких клипов за один проход трансформера hubert / поиска / net_g.
+
+        Клип готовится как в pipeline() (plan: фильтр, x_pad, F0), его свёрточные
+        признаки hubert считаются отдельно (см. _extract_features_batch), дальше
+        клипы дополняются нулями до общей длины: трансформер видит маску, net_g -
+        длины, а хвост дополнения уходит в срезаемый x_pad. Клипы, которые plan()
+        режет на куски (длиннее t_max), сюда отдавать нельзя.
+        """
+        index, big_npy = self._get_index(file_index, index_rate)
+        frame_tgt = tgt_sr // 100
+        n = len(audios)
+
+        filtered, clips, p_lens, pitches, pitchfs = [], [], [], [], []
+        for audio, name in zip(audios, names):
+            audio, audio_pad, chunks, pitch, pitchf = self.plan(
+                audio,
+                name,
+                times,
+                f0_up_key,
+                f0_method,
+                if_f0,
+                filter_radius,
+                crepe_hop_length,
             )
-        audio_opt = np.concatenate(audio_opt)
-        if rms_mix_rate != 1:
-            audio_opt = change_rms(audio, 16000, audio_opt, tgt_sr, rms_mix_rate)
-        if tgt_sr != resample_sr >= 16000:
-            audio_opt = librosa.resample(
-                audio_opt, orig_sr=tgt_sr, target_sr=resample_sr
+            assert len(chunks) == 1, "pipeline_batch: clip longer than t_max"
+            filtered.append(audio)
+            clips.append(audio_pad)
+            p_lens.append(audio_pad.shape[0] // self.window)
+            pitches.append(pitch)
+            pitchfs.append(pitchf)
+        t2 = ttime()
+
+        feats, n_feats = self._extract_features_batch(model, clips, version)
+
+        # один поиск по индексу на все клипы сразу
+        if index is not None and big_npy is not None and index_rate != 0:
+            npy = torch.cat([feats[b, : n_feats[b]] for b in range(n)]).float().cpu().numpy()
+            npy = self._knn_blend(npy, index, big_npy)
+            blended = torch.zeros_like(feats)
+            offset = 0
+            for b in range(n):
+                blended[b, : n_feats[b]] = torch.from_numpy(
+                    npy[offset : offset + n_feats[b]]
+                ).to(feats.device, feats.dtype)
+                offset += n_feats[b]
+            feats = blended * index_rate + (1 - index_rate) * feats
+            del npy, blended
+        t3 = ttime()
+
+        use_protect = protect < 0.5 and if_f0 == 1
+        feats0 = feats if use_protect else None
+        feats = feats.repeat_interleave(2, dim=1)
+        if use_protect:
+            feats0 = feats0.repeat_interleave(2, dim=1)
+        p_lens = [min(p, 2 * k) for p, k in zip(p_lens, n_feats)]
+        max_p = min(max(p_lens), feats.shape[1])
+        feats = feats[:, :max_p]
+
+        pitch = pitchf = None
+        if if_f0 == 1:
+            pitch = torch.zeros((n, max_p), dtype=torch.long)
+            pitchf = torch.zeros((n, max_p), dtype=torch.float32)
+            for b in range(n):
+                k = min(p_lens[b], len(pitches[b]))
+                pitch[b, :k] = torch.from_numpy(pitches[b][:k].astype(np.int64))
+                pitchf[b, :k] = torch.from_numpy(pitchfs[b][:k])
+            pitch = pitch.to(self.device)
+            pitchf = pitchf.to(self.device)
+        if use_protect:
+            feats0 = feats0[:, :max_p]
+            pitchff = torch.full_like(pitchf, protect)
+            pitchff.masked_fill_(pitchf >= 1, 1)
+            feats = torch.lerp(feats0, feats, pitchff.unsqueeze(-1).to(feats.dtype))
+            del pitchff
+        del feats0
+
+        sid = torch.full((n,), int(sid), dtype=torch.long, device=self.device)
+        lengths = torch.tensor(p_lens, dtype=torch.long, device=self.device)
+        with torch.no_grad():
+            if if_f0 == 1:
+                out = net_g.infer(feats, lengths, pitch, pitchf, sid)[0]
+            else:
+                out = net_g.infer(feats, lengths, sid)[0]
+            out = out[:, 0].data.cpu().float().numpy()
+        del feats, pitch, pitchf, sid, lengths
+        t4 = ttime()
+        times[0] += t3 - t2
+        times[2] += t4 - t3
+
+        results = []
+        for b in range(n):
+            audio_opt = out[b, self.t_pad_tgt : p_lens[b] * frame_tgt - self.t_pad_tgt]
+            results.append(
+                self._finish_output(
+                    filtered[b],
+                    np.ascontiguousarray(audio_opt),
+                    tgt_sr,
+                    resample_sr,
+                    rms_mix_rate,
+                    output_dtype,
+                )
             )
-        audio_max = np.abs(audio_opt).max() / 0.99
-        max_int16 = 32768
-        if audio_max > 1:
-            max_int16 /= audio_max
-        audio_opt = (audio_opt * max_int16).astype(np.int16)
-        del pitch, pitchf, sid
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
-        return audio_opt
+        return results
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+MANIFEST_NAME = ".rvc_manifest.json"
+MANIFEST_VERSION = 1
+
+# параметры, от которых зависит результат конвертации
+PARAM_KEYS = [
+    "pitch", "f0_method", "index_path", "index_rate", "filter_radius",
+    "resample_sr", "rms_mix_rate", "protect", "crepe_hop_length", "output_dtype",
+]
+# при f0_method="auto" метод выбирается по бюджету и калибровке (tuning.py f0)
+AUTO_F0_KEYS = ["f0_budget", "f0_calibration"]
+
+
+def file_md5(path, chunk_size=1 << 20):
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_stamp(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class BatchManifest:
+    """Журнал пакетной конвертации в папке вывода.
+
+    outputs: имя выходного файла -> хэш входа, ключ параметров, хэш модели, время.
+    inputs: путь входа -> (размер, mtime) и md5, чтобы не перечитывать неизменённые файлы.
+    """
+
+    def __init__(self, output_dir, save_interval=2.0):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.output_dir = output_dir
+        self.save_interval = save_interval
+        self.inputs = {}
+        self.outputs = {}
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.inputs = data.get("inputs", {})
+                self.outputs = data.get("outputs", {})
+        except Exception as e:
+            print(f"Manifest load error: {e}")
+
+    def save(self, force=True):
+        with self._lock:
+            if not self._dirty:
+                return
+            if not force and time.time() - self._last_save < self.save_interval:
+                return
+            data = {"version": MANIFEST_VERSION, "inputs": self.inputs, "outputs": self.outputs}
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                tmp = self.path + ".tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp, self.path)
+                self._dirty = False
+                self._last_save = time.time()
+            except Exception as e:
+                print(f"Manifest save error: {e}")
+
+    def input_hash(self, path):
+        key = os.path.abspath(path)
+        stamp = file_stamp(path)
+        cached = self.inputs.get(key)
+        if cached and cached.get("stamp") == stamp:
+            return cached["md5"]
+        digest = file_md5(path)
+        with self._lock:
+            self.inputs[key] = {"stamp": stamp, "md5": digest}
+            self._dirty = True
+        return digest
+
+    @staticmethod
+    def params_key(params, model_hash):
+        data = {k: params.get(k) for k in PARAM_KEYS}
+        if params.get("f0_method") == "auto":
+            data.update({k: params.get(k) for k in AUTO_F0_KEYS})
+        data["model"] = model_hash
+        blob = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.md5(blob.encode('utf-8')).hexdigest()
+
+    def _key(self, output_path):
+        return os.path.relpath(os.path.abspath(output_path), os.path.abspath(self.output_dir))
+
+    def is_valid(self, output_path, input_hash, params_key):
+        entry = self.outputs.get(self._key(output_path))
+        if not entry:
+            return False
+        if entry.get("input_md5") != input_hash or entry.get("params") != params_key:
+            return False
+        try:
+            return os.path.getsize(output_path) == entry.get("size")
+        except OSError:
+            return False
+
+    def record(self, input_path, output_path, input_hash, params_key, model_hash, seconds=0.0, linked_from=None):
+        entry = {
+            "input": os.path.abspath(input_path),
+            "input_md5": input_hash,
+            "params": params_key,
+            "model": model_hash,
+            "size": os.path.getsize(output_path),
+            "seconds": round(seconds, 3),
+            "done_at": time.time(),
+        }
+        if linked_from:
+            entry["linked_from"] = self._key(linked_from)
+        with self._lock:
+            self.outputs[self._key(output_path)] = entry
+            self._dirty = True
+        self.save(force=False)
+
+
+def link_or_copy(src, dst):
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        import shutil
+        shutil.copy2(src, dst)
@@ -1,5 +1,13 @@
+import threading
+
 import numpy as np
 
+# Пирамида min/max по блокам для отрисовки волны: уровень 0 - блоки по block_size
+# сэмплов, каждый следующий - пары блоков предыдущего.
+# После правки участка (invalidate_range) пересчитываются только его блоки уровня 0
+# и их предки, с тем же дополнением краёв, что и в build, - результат совпадает
+# с полной перестройкой. Целиком пирамида строится при загрузке и при смене массива.
+
 
 class AudioMipmap:
     def __init__(self, block_size=256):
@@ -7,8 +15,14 @@ class AudioMipmap:
         self.levels = []
         self.audio_len = 0
         self.dirty = True
+        self._audio = None
+        self._ranges = []
+        self._lock = threading.Lock()  # правки приходят и из потока конвертации
     
     def build(self, audio):
+        self._audio = audio
+        with self._lock:
+            self._ranges = []
         if audio is None or len(audio) == 0:
             self.levels = []
             self.audio_len = 0
@@ -50,12 +64,57 @@ class AudioMipmap:
     def invalidate(self):
         self.dirty = True
     
+    def invalidate_range(self, start, end):
+        """Сэмплы [start, end) изменились; пересчёт - при следующем get_envelope"""
+        if not self.dirty and end > start:
+            with self._lock:
+                self._ranges.append((start, end))
+    
+    def update(self, audio):
+        """Пересчитывает блоки изменённых участков; при другом массиве или длине - build"""
+        if self.dirty or audio is not self._audio or len(audio) != self.audio_len or not self.levels:
+            self.build(audio)
+            return
+        with self._lock:
+            ranges, self._ranges = self._ranges, []
+        bs = self.block_size
+        blocks = []
+        for start, end in sorted(ranges):
+            lo = max(0, start) // bs
+            hi = min(-(-end // bs), len(self.levels[0][0]))
+            if hi <= lo:
+                continue
+            if blocks and lo <= blocks[-1][1]:
+                blocks[-1] = (blocks[-1][0], max(blocks[-1][1], hi))
+            else:
+                blocks.append((lo, hi))
+        
+        for lo, hi in blocks:
+            # уровень 0: блоки из сэмплов, последний неполный дополняется нулями, как в build
+            seg_end = min(hi * bs, self.audio_len)
+            padded = np.zeros((hi - lo) * bs, dtype=np.float32)
+            padded[:seg_end - lo * bs] = audio[lo * bs:seg_end]
+            reshaped = padded.reshape(hi - lo, bs)
+            lvl_min, lvl_max = self.levels[0]
+            lvl_min[lo:hi] = np.min(reshaped, axis=1)
+            lvl_max[lo:hi] = np.max(reshaped, axis=1)
+            
+            # предки: пара (2i, 2i+1), у нечётной длины последний блок в паре сам с собой
+            for k in range(1, len(self.levels)):
+                prev_min, prev_max = self.levels[k - 1]
+                lo, hi = lo // 2, min(-(-hi // 2), len(self.levels[k][0]))
+                left = np.arange(2 * lo, 2 * hi, 2)
+                right = np.minimum(left + 1, len(prev_min) - 1)
+                cur_min, cur_max = self.levels[k]
+                cur_min[lo:hi] = np.minimum(prev_min[left], prev_min[right])
+                cur_max[lo:hi] = np.maximum(prev_max[left], prev_max[right])
+    
     def get_envelope(self, audio, offset, visible, width):
         if audio is None or width <= 0 or visible <= 0:
             return None, None
         
-        if self.dirty:
-            self.build(audio)
+        if self.dirty or self._ranges or audio is not self._audio:
+            self.update(audio)
         
         spp = visible / width
         
@@ -73,42 +132,45 @@ class AudioMipmap:
         lvl_min, lvl_max = self.levels[lvl_idx]
         lvl_len = len(lvl_min)
         
-        res_min = np.zeros(width, dtype=np.float32)
-        res_max = np.zeros(width, dtype=np.float32)
-        
-        for x in range(width):
-            ps = offset + x * visible // width
-            pe = offset + (x + 1) * visible // width
-            bi = ps // bs
-            bj = (pe + bs - 1) // bs
-            
-            bi = max(0, min(bi, lvl_len))
-            bj = max(bi, min(bj, lvl_len))
-            
-            if bj > bi:
-                res_min[x] = np.min(lvl_min[bi:bj])
-                res_max[x] = np.max(lvl_max[bi:bj])
-        
-        return res_min, res_max
+        ps, pe = _column_bounds(offset, visible, width)
+        bi = np.clip(ps // bs, 0, lvl_len)
+        bj = np.maximum(bi, np.clip((pe + bs - 1) // bs, 0, lvl_len))
+        return _reduce_ranges(lvl_min, bi, bj, np.minimum), _reduce_ranges(lvl_max, bi, bj, np.maximum)
     
     def _compute_direct(self, audio, offset, visible, width):
         audio_len = len(audio)
         if audio_len == 0:
             return np.zeros(width, dtype=np.float32), np.zeros(width, dtype=np.float32)
         
-        res_min = np.zeros(width, dtype=np.float32)
-        res_max = np.zeros(width, dtype=np.float32)
-        
-        for x in range(width):
-            ps = offset + x * visible // width
-            pe = offset + (x + 1) * visible // width
-            
-            ps = max(0, min(ps, audio_len))
-            pe = max(ps, min(pe, audio_len))
-            
-            if pe > ps:
-                seg = audio[ps:pe]
-                res_min[x] = seg.min()
-                res_max[x] = seg.max()
-        
-        return res_min, res_max
\ No newline at end of file
+        ps, pe = _column_bounds(offset, visible, width)
+        ps = np.clip(ps, 0, audio_len)
+        pe = np.maximum(ps, np.clip(pe, 0, audio_len))
+        return _reduce_ranges(audio, ps, pe, np.minimum), _reduce_ranges(audio, ps, pe, np.maximum)
+
+
+def _column_bounds(offset, visible, width):
+    """Начала и концы столбцов в сэмплах: offset + x * visible // width"""
+    bounds = offset + np.arange(width + 1, dtype=np.int64) * visible // width
+    return bounds[:-1], bounds[1:]
+
+
+def _reduce_ranges(values, starts, ends, ufunc):
+    """ufunc.reduce по values[s:e] для каждой пары одним вызовом reduceat; пустые - 0.
+    
+    Индексы идут парами (s, e): reduceat сворачивает values[s:e] на чётных местах,
+    нечётные (от e до следующего s) отбрасываются. Берётся только видимый кусок
+    values и ноль в конце, чтобы e могло указывать на его край.
+    """
+    out = np.zeros(len(starts), dtype=np.float32)
+    nonempty = ends > starts
+    if not nonempty.any():
+        return out
+    lo = int(starts[nonempty].min())
+    hi = int(ends[nonempty].max())
+    seg = np.zeros(hi - lo + 1, dtype=values.dtype)
+    seg[:-1] = values[lo:hi]
+    idx = np.empty(2 * len(starts), dtype=np.intp)
+    idx[0::2] = np.clip(starts, lo, hi) - lo
+    idx[1::2] = np.clip(ends, lo, hi) - lo
+    out[nonempty] = ufunc.reduceat(seg, idx)[0::2][nonempty]
+    return out
@@ -4,10 +4,24 @@ import time
 import numpy as np
 
 from lang import tr
+from version_cache import VERSION_CACHE
+from store import write_version, remove_version
 
 
 class PartGroup:
     
+    bounds_revision = 0  # растёт при любом изменении start/end, см. intervals.PartIndex
+    # поля, попадающие в to_dict: запись любого сбрасывает общую запись снимка (record)
+    RECORD_FIELDS = frozenset(("id", "start", "end", "active_idx", "has_base", "versions", "version_params",
+                               "last_blend", "last_crossfade_type", "last_preserve", "apply_order", "volume_db"))
+    
+    def __setattr__(self, name, value):
+        if name in ("start", "end"):
+            PartGroup.bounds_revision += 1
+        if name in PartGroup.RECORD_FIELDS:
+            object.__setattr__(self, "_record", None)
+        object.__setattr__(self, name, value)
+    
     def __init__(self, start, end, parts_dir, sr):
         self.id = uuid.uuid4().hex[:8]
         self.start = start
@@ -36,11 +50,11 @@ class PartGroup:
         self.active_idx = 0
     
     def add_version(self, audio_data, params=None):
-        import soundfile as sf
         real_versions = [v for v in self.versions if v not in ("__COMPUTED_BASE__", "__SILENT__")]
         idx = len(real_versions)
         path = os.path.join(self.parts_dir, f"{self.id}_v{idx}.wav")
-        sf.write(path, audio_data, self.sr)
+        write_version(path, audio_data)
+        VERSION_CACHE.invalidate(path)
         self.versions.append(path)
         
         if params is None:
@@ -75,11 +89,8 @@ class PartGroup:
         if path == "__SILENT__":
             return np.zeros(current_len, dtype=np.float32)
         
-        if path and os.path.exists(path):
-            import soundfile as sf
-            data, _ = sf.read(path)
-            data = data.astype(np.float32)
-            
+        data = VERSION_CACHE.get(path) if path else None
+        if data is not None:
             params = self.version_params[idx] if idx < len(self.version_params) else None
             original_start = self.start
             original_end = self.end
@@ -110,6 +121,12 @@ class PartGroup:
             return result
         return None
     
+    def prefetch_neighbours(self):
+        """Соседние с активной версии - в кэш заранее, для переключения хоткеями"""
+        paths = [self.versions[i] for i in (self.active_idx - 1, self.active_idx + 1)
+                 if 0 <= i < len(self.versions)]
+        VERSION_CACHE.prefetch([p for p in paths if p not in ("__COMPUTED_BASE__", "__SILENT__")])
+    
     def get_base_data(self):
         return None
     
@@ -124,7 +141,7 @@ class PartGroup:
             "id": self.id, "start": self.start, "end": self.end,
             "active_idx": self.active_idx, "has_base": self.has_base,
             "versions": versions_out,
-            "version_params": self.version_params,
+            "version_params": list(self.version_params),
             "last_blend": self.last_blend,
             "last_crossfade_type": self.last_crossfade_type,
             "last_preserve": self.last_preserve,
@@ -132,6 +149,21 @@ class PartGroup:
             "volume_db": self.volume_db
         }
     
+    def record(self):
+        """to_dict, общий для снимков истории, пока часть не изменится; изменять его нельзя.
+        
+        Списки versions/version_params меняются на месте только вместе с записью
+        active_idx (как в методах ниже), которая и сбрасывает запись.
+        """
+        if self._record is None:
+            self._record = self.to_dict()
+        return self._record
+    
+    def share_record(self, record):
+        """Берёт record из снимка вместо своей копии, если они совпадают"""
+        if record == self.record():
+            self._record = record
+    
     def get_params(self, idx=None):
         if idx is None:
             idx = self.active_idx
@@ -151,6 +183,7 @@ class PartGroup:
             return False
         if self.has_base and self.active_idx == 0 and len(self.versions) == 2:
             return False
+        VERSION_CACHE.invalidate(self.versions[self.active_idx])
         self.versions.pop(self.active_idx)
         self.version_params.pop(self.active_idx)
         self.active_idx = min(self.active_idx, len(self.versions) - 1)
@@ -161,6 +194,9 @@ class PartGroup:
             return
         keep_path = self.versions[self.active_idx]
         keep_params = self.version_params[self.active_idx]
+        for p in self.versions:
+            if p != keep_path:
+                VERSION_CACHE.invalidate(p)
         self.versions = [keep_path]
         self.version_params = [keep_params]
         self.active_idx = 0
@@ -169,7 +205,8 @@ class PartGroup:
     def cleanup(self):
         for p in self.versions:
             if p not in ("__COMPUTED_BASE__", "__SILENT__"):
-                try: os.remove(p)
+                VERSION_CACHE.invalidate(p)
+                try: remove_version(p)
                 except: pass
         self.versions = []
         self.version_params = []
@@ -0,0 +1,342 @@
+import os
+import sys
+import time
+import heapq
+import stat
+import socket
+import argparse
+import itertools
+import threading
+import traceback
+import socketserver
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from client import (
+    DEFAULT_ADDRESS, FINISHED, parse_address, send_frame, recv_frame,
+    audio_to_bytes, bytes_to_audio,
+)
+
+# Локальная служба конвертации: один процесс держит RVC, hubert, RMVPE, индексы
+# и последние модели прогретыми, задания выполняются по очереди с приоритетом.
+# Слушает только localhost или Unix-сокет.
+
+MAX_FINISHED_JOBS = 1000
+FOLDER_SLICE = 8
+
+
+class Job:
+
+    def __init__(self, job_id, request, payload):
+        self.id = job_id
+        self.kind = request.get("kind", "file")
+        self.request = request
+        self.payload = payload
+        self.priority = int(request.get("priority", 0))
+        self.status = "queued"
+        self.error = None
+        self.result = None
+        self.sr = None
+        self.audio = None
+        self.progress = {}
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+
+    def info(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "error": self.error,
+            "result": self.result,
+            "sr": self.sr,
+            "progress": self.progress,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class ConversionService:
+
+    def __init__(self, address, verbose=False):
+        from converter import VoiceConverter
+        self.address = address
+        self.verbose = verbose
+        self.converter = VoiceConverter(log_callback=self._log)
+        self.jobs = {}
+        self.queue = []
+        self.cond = threading.Condition()
+        self.ids = itertools.count(1)
+        self.running = True
+        self.current = None
+
+    def _log(self, message):
+        if self.verbose:
+            print(message, file=sys.stderr, flush=True)
+
+    # --- очередь ---
+
+    def submit(self, request, payload):
+        if request.get("kind") not in ("file", "buffer", "folder", "load"):
+            raise ValueError(f"Unknown job kind: {request.get('kind')}")
+        with self.cond:
+            job = Job(str(next(self.ids)), request, payload)
+            self.jobs[job.id] = job
+            # больший приоритет - раньше, при равном - в порядке поступления
+            heapq.heappush(self.queue, (-job.priority, next(self.ids), job))
+            self.cond.notify()
+        return job
+
+    def get(self, job_id):
+        job = self.jobs.get(str(job_id))
+        if job is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        with self.cond:
+            job.cancelled.set()
+            if job.status == "queued":
+                self._finish(job, "cancelled")
+        return job
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        job.payload = b""
+        job.done.set()
+        self._trim_finished()
+
+    def _trim_finished(self):
+        finished = [j for j in self.jobs.values() if j.status in FINISHED]
+        for job in sorted(finished, key=lambda j: j.finished)[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.id]
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def run_forever(self):
+        while True:
+            with self.cond:
+                while self.running and not self.queue:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                _, _, job = heapq.heappop(self.queue)
+                if job.status != "queued":
+                    continue
+                job.status = "running"
+                job.started = time.time()
+                self.current = job
+            try:
+                self._run(job)
+                status = "cancelled" if job.cancelled.is_set() else "done"
+                error = None
+            except Exception as e:
+                status, error = "failed", str(e)
+                self._log(traceback.format_exc())
+            with self.cond:
+                if status == "cancelled":
+                    job.audio = None
+                self.current = None
+                self._finish(job, status, error)
+
+    # --- выполнение ---
+
+    def _ensure_model(self, job):
+        model = job.request.get("model") or self.converter.current_model_name
+        if not model:
+            raise RuntimeError("Model not specified")
+        index = job.request.get("index", "")
+        if not self.converter.ensure_model(model, index):
+            raise RuntimeError(f"Model load failed: {model}")
+        return index
+
+    def _run(self, job):
+        index = self._ensure_model(job)
+        if job.kind == "load":
+            return
+        params = dict(job.request.get("params") or {}, index_path=index)
+        conv = self.converter
+
+        if job.kind == "buffer":
+            result = conv.convert_array(bytes_to_audio(job.payload), job.request["sr"],
+                                        name=f"<job {job.id}>", **params)
+            if result is None:
+                raise RuntimeError("Conversion failed")
+            job.sr, job.audio = result
+        elif job.kind == "file":
+            output = job.request.get("output")
+            if output:
+                if not conv.convert(job.request["input"], output, **params):
+                    raise RuntimeError("Conversion failed")
+                job.result = output
+            else:
+                result = conv.convert_audio(job.request["input"], **params)
+                if result is None:
+                    raise RuntimeError("Conversion failed")
+                job.sr, job.audio = result
+        elif job.kind == "folder":
+            self._run_folder(job, params)
+
+    def _run_folder(self, job, params):
+        conv = self.converter
+        files = conv.get_audio_files(job.request["input"])
+        output_dir = job.request["output"]
+        output_format = params.get("output_format", "wav")
+        jobs = []
+        for input_path in files:
+            name, _ = os.path.splitext(os.path.basename(input_path))
+            jobs.append((input_path, os.path.join(output_dir, f"{name}_converted.{output_format}")))
+        job.progress = {"done": 0, "total": len(jobs)}
+
+        def on_result(result):
+            job.progress = dict(job.progress, done=job.progress["done"] + 1)
+
+        # манифест, пропуск готовых и дубликаты - как в пакетной конвертации;
+        # задание идёт порциями, отмена срабатывает между ними
+        job.result = conv.convert_jobs(jobs, output_dir, on_result=on_result, cancel=job.cancelled,
+                                       cancel_slice=FOLDER_SLICE, **params)
+
+    # --- протокол ---
+
+    def handle(self, header, payload):
+        op = header.get("op")
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "address": self.address,
+                    "queued": len(self.queue), "model": self.converter.current_model_name,
+                    "current": self.current.id if self.current else None}, b""
+        if op == "submit":
+            job = self.submit(header, payload)
+            return {"ok": True, "id": job.id}, b""
+        if op == "status":
+            return {"ok": True, "job": self.get(header.get("id")).info()}, b""
+        if op == "cancel":
+            return {"ok": True, "job": self.cancel(header.get("id")).info()}, b""
+        if op == "list":
+            with self.cond:
+                jobs = [j.info() for j in self.jobs.values()]
+            return {"ok": True, "jobs": jobs}, b""
+        if op == "result":
+            job = self.get(header.get("id"))
+            job.done.wait(header.get("wait"))
+            data = b""
+            if job.done.is_set() and job.audio is not None:
+                data = audio_to_bytes(job.audio)
+                # буфер отдаётся один раз
+                job.audio = None
+            return {"ok": True, "job": job.info()}, data
+        if op == "shutdown":
+            self.stop()
+            return {"ok": True}, b""
+        raise ValueError(f"Unknown op: {op}")
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        service = self.server.service
+        while True:
+            try:
+                header, payload = recv_frame(self.request)
+            except (OSError, ValueError):
+                return
+            if header is None:
+                return
+            try:
+                response, data = service.handle(header, payload)
+            except Exception as e:
+                response, data = {"ok": False, "error": str(e)}, b""
+            try:
+                send_frame(self.request, response, data)
+            except OSError:
+                return
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _remove_stale_socket(path):
+    """Удаляет сокет, оставшийся от упавшей службы; чужой файл или живую службу не трогает"""
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise SystemExit(f"{path} exists and is not a socket")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.settimeout(1.0)
+        probe.connect(path)
+    except OSError:
+        os.remove(path)
+        return
+    finally:
+        probe.close()
+    raise SystemExit(f"A service is already listening on {path}")
+
+
+def make_server(service, address):
+    family, addr = parse_address(address)
+    if family == socket.AF_INET:
+        # сервер и клиент только IPv4, поэтому ::1 не принимается
+        if addr[0] not in ("127.0.0.1", "localhost"):
+            raise SystemExit("The service only listens on localhost")
+        server = _TCPServer(addr, _Handler)
+    else:
+        _remove_stale_socket(addr)
+
+        class _UnixServer(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+        server = _UnixServer(addr, _Handler)
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RVC Editor conversion service")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="host:port or unix:/path.sock")
+    parser.add_argument("--model", default="", help="model to warm up at start")
+    parser.add_argument("--index", default="", help="index for --model")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    service = ConversionService(args.address, verbose=args.verbose)
+    if not service.converter.initialize():
+        return 2
+    if args.model:
+        service.submit({"kind": "load", "model": args.model, "index": args.index, "priority": 10}, b"")
+
+    server = make_server(service, args.address)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"RVC service listening on {args.address}", file=sys.stderr, flush=True)
+    try:
+        service.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        family, addr = parse_address(args.address)
+        if family != socket.AF_INET and os.path.exists(addr):
+            os.remove(addr)
+    return 0
+
+
+if __name__ == "__main__":
+    import main as _bootstrap  # окружение RVC и патч mangio-crepe
+    sys.exit(main())
@@ -0,0 +1,257 @@
+import os
+import json
+import glob
+import threading
+
+import numpy as np
+
+# Хранилище версий частей проекта: один файл сэмплов float32, в который версии
+# только дописываются, и журнал индекса (строка JSON на операцию).
+# Версии по-прежнему называются путями parts/{id}_v{n}.wav - так они записаны в
+# project.json и истории, - но данные лежат в хранилище и читаются через memmap
+# без копирования. Старые WAV из parts/ переносятся сюда при загрузке проекта.
+# compact пишет живые данные в файл следующего поколения (versions.N.f32), и
+# первая строка нового индекса называет его: замена индекса - единственный шаг,
+# переключающий хранилище, старые данные удаляются уже после неё.
+
+DATA_FILE = "versions.f32"
+DATA_PATTERN = "versions.*.f32"
+INDEX_FILE = "versions.idx"
+SAMPLE_BYTES = 4
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class VersionStore:
+
+    def __init__(self, parts_dir):
+        self.parts_dir = parts_dir
+        self.data_path = os.path.join(parts_dir, DATA_FILE)
+        self.index_path = os.path.join(parts_dir, INDEX_FILE)
+        self.entries = {}  # имя -> (смещение в сэмплах, длина в сэмплах, каналы)
+        self._map = None
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _data_samples(self):
+        try:
+            return os.path.getsize(self.data_path) // SAMPLE_BYTES
+        except OSError:
+            return 0
+
+    def _load_index(self):
+        self.entries = {}
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        try:
+            head = json.loads(lines[0]) if lines else {}
+        except ValueError:
+            head = {}
+        if head.get("op") == "data":
+            self.data_path = os.path.join(self.parts_dir, head["file"])
+        self._remove_stale_data()
+        size = self._data_samples()
+        for line in lines:
+            try:
+                op = json.loads(line)
+            except ValueError:
+                # недописанная последняя строка после сбоя
+                continue
+            if op.get("op") == "add":
+                offset, length = op["offset"], op["length"]
+                if offset + length <= size:
+                    self.entries[op["name"]] = (offset, length, op.get("channels", 1))
+            elif op.get("op") == "del":
+                self.entries.pop(op["name"], None)
+
+    def _remove_stale_data(self):
+        """Файлы данных, которых индекс не называет: остатки compact после сбоя"""
+        paths = glob.glob(os.path.join(self.parts_dir, DATA_PATTERN)) + [os.path.join(self.parts_dir, DATA_FILE)]
+        for path in paths:
+            if os.path.abspath(path) != os.path.abspath(self.data_path) and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _generation(self):
+        name = os.path.basename(self.data_path)
+        parts = name.split(".")
+        return int(parts[1]) if len(parts) == 3 and parts[1].isdigit() else 0
+
+    def _log(self, op):
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(op, separators=(',', ':')) + "\n")
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def stamp(self, name):
+        entry = self.entries.get(name)
+        return None if entry is None else entry[:2]
+
+    def append(self, name, audio):
+        """Дописывает версию; то же имя заменяет прежние данные (место освободит compact)"""
+        audio = np.ascontiguousarray(audio, dtype='<f4')
+        channels = audio.shape[1] if audio.ndim > 1 else 1
+        with self._lock:
+            with open(self.data_path, 'ab') as f:
+                offset = f.tell() // SAMPLE_BYTES
+                f.write(audio.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            length = audio.size
+            # индекс пишется после данных: при сбое между ними запись просто не появится
+            self._log({"op": "add", "name": name, "offset": offset, "length": length, "channels": channels})
+            self.entries[name] = (offset, length, channels)
+
+    def read(self, name):
+        """Данные версии как memmap-срез (только чтение) или None"""
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                return None
+            offset, length, channels = entry
+            if self._map is None or len(self._map) < offset + length:
+                self._map = np.memmap(self.data_path, dtype='<f4', mode='r') if self._data_samples() else None
+            if self._map is None:
+                return None
+            view = self._map[offset:offset + length]
+        return view.reshape(-1, channels) if channels > 1 else view
+
+    def remove(self, name):
+        with self._lock:
+            if self.entries.pop(name, None) is not None:
+                self._log({"op": "del", "name": name})
+
+    def garbage_ratio(self):
+        total = self._data_samples()
+        live = sum(length for _, length, _ in self.entries.values())
+        return 1 - live / total if total else 0.0
+
+    def compact(self):
+        """Переписывает живые версии в файл следующего поколения.
+
+        Срезы, выданные read() до этого, нужно отпустить заранее (VERSION_CACHE.clear()):
+        под Windows отображённый файл нельзя удалить. При сбое до замены индекса
+        остаётся прежнее хранилище, после неё - новое; лишний файл данных удалит
+        следующая загрузка.
+        """
+        with self._lock:
+            data_name = f"versions.{self._generation() + 1}.f32"
+            new_data = os.path.join(self.parts_dir, data_name)
+            tmp_index = self.index_path + ".tmp"
+            source = np.memmap(self.data_path, dtype='<f4', mode='r') if self._data_samples() else None
+            entries = {}
+            try:
+                with open(new_data, 'wb') as fd, open(tmp_index, 'w', encoding='utf-8') as fi:
+                    fi.write(json.dumps({"op": "data", "file": data_name}, separators=(',', ':')) + "\n")
+                    offset = 0
+                    for name, (old_offset, length, channels) in sorted(self.entries.items(), key=lambda e: e[1][0]):
+                        fd.write(source[old_offset:old_offset + length].tobytes())
+                        fi.write(json.dumps({"op": "add", "name": name, "offset": offset, "length": length,
+                                             "channels": channels}, separators=(',', ':')) + "\n")
+                        entries[name] = (offset, length, channels)
+                        offset += length
+                    fd.flush()
+                    os.fsync(fd.fileno())
+                    fi.flush()
+                    os.fsync(fi.fileno())
+                del source
+                self._map = None
+                os.replace(tmp_index, self.index_path)
+            except BaseException:
+                for path in (new_data, tmp_index):
+                    if os.path.exists(path):
+                        os.remove(path)
+                raise
+            old_data = self.data_path
+            self.data_path = new_data
+            self.entries = entries
+            try:
+                os.remove(old_data)
+            except OSError:
+                pass
+
+    def export(self, name, path, sr):
+        import soundfile as sf
+        data = self.read(name)
+        if data is None:
+            raise KeyError(name)
+        sf.write(path, np.asarray(data), sr, subtype='FLOAT')
+
+    def migrate(self, log=None):
+        """Переносит parts/*.wav в хранилище; возвращает число перенесённых файлов"""
+        import soundfile as sf
+        moved = 0
+        for wav in sorted(glob.glob(os.path.join(self.parts_dir, "*.wav"))):
+            name = os.path.basename(wav)
+            try:
+                if name not in self.entries:
+                    data, _ = sf.read(wav, dtype='float32')
+                    self.append(name, data)
+                os.remove(wav)
+                moved += 1
+            except Exception as e:
+                if log:
+                    log(f"{name}: {e}")
+        return moved
+
+
+def get_store(parts_dir):
+    """Общий VersionStore на папку частей"""
+    key = os.path.abspath(parts_dir)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            os.makedirs(key, exist_ok=True)
+            store = _stores[key] = VersionStore(key)
+        return store
+
+
+def _split(path):
+    return get_store(os.path.dirname(path)), os.path.basename(path)
+
+
+def version_exists(path):
+    store, name = _split(path)
+    return name in store or os.path.exists(path)
+
+
+def version_stamp(path):
+    """Отметка содержимого версии для кэша: меняется при перезаписи под тем же именем"""
+    store, name = _split(path)
+    stamp = store.stamp(name)
+    if stamp is not None:
+        return ("store",) + tuple(stamp)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def read_version(path):
+    store, name = _split(path)
+    data = store.read(name)
+    if data is not None:
+        return data
+    # проект ещё не перенесён в хранилище
+    import soundfile as sf
+    data, _ = sf.read(path, dtype='float32')
+    return data
+
+
+def write_version(path, audio):
+    store, name = _split(path)
+    store.append(name, audio)
+
+
+def remove_version(path):
+    store, name = _split(path)
+    store.remove(name)
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,105 @@
+import os
+from contextlib import contextmanager
+
+# Бюджет потоков на процесс: torch intra/inter-op, OpenMP у FAISS и BLAS у numpy/scipy/librosa.
+# По умолчанию каждая библиотека берёт все ядра, и при нескольких процессах или
+# потоках конвертации они мешают друг другу. Здесь ядра делятся между воркерами.
+
+BLAS_ENV = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+_limits = None  # threadpoolctl держит ограничение, пока объект жив
+_interop_set = False
+
+
+def cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def plan(threads="auto", workers=1):
+    """Потоки на процесс: {"torch", "interop", "faiss", "blas"}.
+
+    threads - "auto" (ядра поровну между workers) или число потоков на процесс.
+    """
+    workers = max(1, int(workers or 1))
+    if threads in (None, "", "auto", 0, "0"):
+        per_process = max(1, cpu_count() // workers)
+    else:
+        per_process = max(1, int(threads))
+    return {
+        "torch": per_process,
+        # inter-op параллелизм RVC почти не использует, в воркерах он только лишние потоки
+        "interop": 1 if workers > 1 else min(2, per_process),
+        "faiss": per_process,
+        "blas": per_process,
+    }
+
+
+def worker_env(budget):
+    """Переменные окружения для дочерних процессов: BLAS читает их при загрузке"""
+    return {name: str(budget["blas"]) for name in BLAS_ENV}
+
+
+@contextmanager
+def child_env(budget):
+    """Окружение на время запуска процессов пула, родителю оно возвращается"""
+    saved = {name: os.environ.get(name) for name in BLAS_ENV}
+    os.environ.update(worker_env(budget))
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def apply(budget, log=None):
+    """Применяет бюджет к текущему процессу; возвращает его же"""
+    global _limits, _interop_set
+    log = log or (lambda m: None)
+    os.environ.update(worker_env(budget))
+
+    try:
+        from threadpoolctl import threadpool_limits
+        _limits = threadpool_limits(limits=budget["blas"], user_api="blas")
+    except ImportError:
+        pass
+    except Exception as e:
+        log(f"threadpoolctl: {e}")
+
+    try:
+        import torch
+        torch.set_num_threads(budget["torch"])
+        # inter-op задаётся один раз и только до первой параллельной операции
+        if not _interop_set:
+            try:
+                torch.set_num_interop_threads(budget["interop"])
+            except RuntimeError:
+                pass
+            _interop_set = True
+    except ImportError:
+        pass
+
+    try:
+        import faiss
+        faiss.omp_set_num_threads(budget["faiss"])
+    except ImportError:
+        pass
+    except Exception as e:
+        log(f"faiss: {e}")
+    return budget
+
+
+def describe(budget):
+    return (f"torch {budget['torch']}/{budget['interop']}, faiss {budget['faiss']}, "
+            f"BLAS {budget['blas']}")
@@ -0,0 +1,419 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from config_app import TUNING_FILE
+from thread_budget import cpu_count
+
+# Калибровка под конкретную машину: короткий синтетический прогон подбирает
+# параметры нарезки Pipeline (x_pad, x_query, x_center, x_max) по скорости
+# в пределах потолка памяти и замеряет цену каждого метода F0 (для f0_method="auto").
+# Результат - tuning.json рядом с settings.json, VoiceConverter подхватывает его сам.
+
+TUNING_VERSION = 1
+CHUNK_KEYS = ("x_pad", "x_query", "x_center", "x_max")
+F0_LENGTHS = (5, 20, 60)
+# порядок точности, если сравнить с rmvpe не удалось
+F0_ACCURACY_ORDER = ["rmvpe", "crepe", "mangio-crepe", "harvest", "crepe-tiny", "mangio-crepe-tiny", "pm"]
+
+
+def host_signature(config):
+    return {"cpus": cpu_count(), "device": str(config.device), "is_half": bool(config.is_half)}
+
+
+def load_tuning():
+    if not os.path.exists(TUNING_FILE):
+        return {}
+    try:
+        with open(TUNING_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if data.get("version") == TUNING_VERSION else {}
+    except Exception as e:
+        print(f"Tuning load error: {e}")
+        return {}
+
+
+def save_section(name, section):
+    data = load_tuning()
+    data["version"] = TUNING_VERSION
+    data[name] = section
+    tmp = TUNING_FILE + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, TUNING_FILE)
+
+
+def apply_chunking(config, log=None):
+    """Откалиброванная нарезка в Config, если калибровка сделана на этой же машине"""
+    section = load_tuning().get("chunking")
+    if not section or section.get("host") != host_signature(config):
+        return False
+    for key in CHUNK_KEYS:
+        setattr(config, key, section[key])
+    if log:
+        log("Tuned chunking: " + ", ".join(f"{k}={section[k]}" for k in CHUNK_KEYS))
+    return True
+
+
+# --- память ---
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        return 0.0
+
+
+def reset_peak_rss():
+    """Сбрасывает пик RSS процесса (VmHWM, Linux); False, если сбросить нельзя"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_since_reset_mb():
+    """VmHWM после reset_peak_rss в МБ или None"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_mb():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.virtual_memory().available / 2 ** 20
+    except ImportError:
+        return None
+
+
+class PeakSampler:
+    """Пиковый прирост RSS за время блока with (опрос в отдельном потоке).
+
+    Где можно, на входе сбрасывается VmHWM ядра, и на выходе пик берётся и из
+    него: так не пропадают всплески короче интервала опроса, а пики до блока
+    (загрузка модели, прогрев) в замер не попадают.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.base_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._hwm = False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def __enter__(self):
+        self._hwm = reset_peak_rss()
+        self.base_mb = self.peak_mb = current_rss_mb()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+        hwm = peak_rss_since_reset_mb() if self._hwm else None
+        if hwm is not None:
+            self.peak_mb = max(self.peak_mb, hwm)
+
+    @property
+    def delta_mb(self):
+        return self.peak_mb - self.base_mb
+
+
+# --- калибровка нарезки ---
+
+def chunking_candidates(config):
+    seen = set()
+    default = tuple(getattr(config, k) for k in CHUNK_KEYS)
+    grid = [default]
+    for x_pad in (1, 2, 3):
+        for x_center in (8, 15, 25, 38, 60):
+            # соотношения как у пресетов Config: query ~ center/6, max чуть больше center
+            grid.append((x_pad, max(2, round(x_center / 6)), x_center, x_center + 3))
+    for values in grid:
+        if values not in seen:
+            seen.add(values)
+            yield dict(zip(CHUNK_KEYS, values))
+
+
+def measure_chunking(model, index_path, threads, path, warm_path, params, candidate):
+    """Один вариант нарезки в свежем процессе: (ok, секунды, пиковый прирост памяти в МБ).
+
+    Прогрев на коротком входе грузит hubert, F0-модель и индекс, почти не оставляя
+    памяти в аллокаторе и кэше torch, - от этого уровня и считается прирост.
+    Пик берётся только за время замеряемого вызова (PeakSampler), без загрузки и прогрева.
+    """
+    from converter import VoiceConverter
+
+    conv = VoiceConverter(log_callback=lambda m: None, threads=threads)
+    if not conv.load_model(model, index_path):
+        raise RuntimeError(f"Model load failed: {model}")
+    conv.vc.pipeline.set_chunking(**candidate)
+    conv.convert_audio(warm_path, **params)
+    with PeakSampler() as peak:
+        t0 = time.perf_counter()
+        ok = conv.convert_audio(path, **params) is not None
+        elapsed = time.perf_counter() - t0
+    return ok, elapsed, peak.delta_mb
+
+
+def calibrate_chunking(conv, seconds=90, max_memory_mb=None, f0_method="rmvpe", log=print):
+    """Перебирает нарезку для модели conv, сохраняет лучшую в tuning.json.
+
+    Каждый вариант меряется в своём процессе (spawn): память, оставшаяся от
+    предыдущих вариантов, не занижает пик следующих.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    import soundfile as sf
+    from bench import synth_voice
+
+    config = conv.config
+    pipeline = conv.vc.pipeline
+    if max_memory_mb is None:
+        available = available_mb()
+        max_memory_mb = available / 2 if available else None
+
+    tmp_dir = tempfile.mkdtemp(prefix="rvc_tune_")
+    path = os.path.join(tmp_dir, "tune.wav")
+    warm_path = os.path.join(tmp_dir, "warm.wav")
+    audio, sr = synth_voice(seconds)
+    sf.write(path, audio, sr)
+    warm, sr = synth_voice(2, seed=1)
+    sf.write(warm_path, warm, sr)
+    params = {"pitch": 0, "f0_method": f0_method, "index_path": conv.current_index or "",
+              "index_rate": 0.75 if conv.current_index else 0, "protect": 0.33}
+    ctx = multiprocessing.get_context("spawn")
+
+    results = []
+    try:
+        for candidate in chunking_candidates(config):
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    ok, elapsed, peak_mb = pool.submit(
+                        measure_chunking, conv.current_model, conv.current_index or "", conv.threads,
+                        path, warm_path, params, candidate).result()
+            except Exception as e:
+                log(", ".join(f"{k}={candidate[k]}" for k in CHUNK_KEYS) + f": {e}")
+                ok, elapsed, peak_mb = False, 0.0, 0.0
+            result = dict(candidate, ok=ok, rtf=round(elapsed / seconds, 4), peak_mb=round(peak_mb, 1))
+            results.append(result)
+            log(", ".join(f"{k}={candidate[k]}" for k in CHUNK_KEYS)
+                + f": x{seconds / max(elapsed, 1e-9):.1f} realtime, +{peak_mb:.0f} MB")
+    finally:
+        os.remove(path)
+        os.remove(warm_path)
+
+    fits = [r for r in results if r["ok"] and (max_memory_mb is None or r["peak_mb"] <= max_memory_mb)]
+    if not fits:
+        pipeline.set_chunking(*(getattr(config, k) for k in CHUNK_KEYS))
+        return None
+    fastest = min(r["rtf"] for r in fits)
+    # в пределах 3% от лучшей скорости - больший паддинг: больше контекста на стыках
+    best = max((r for r in fits if r["rtf"] <= fastest * 1.03), key=lambda r: (r["x_pad"], -r["rtf"]))
+
+    for key in CHUNK_KEYS:
+        setattr(config, key, best[key])
+    pipeline.set_chunking(*(best[k] for k in CHUNK_KEYS))
+    section = {key: best[key] for key in CHUNK_KEYS}
+    section.update({
+        "host": host_signature(config),
+        "rtf": best["rtf"],
+        "peak_mb": best["peak_mb"],
+        "max_memory_mb": max_memory_mb,
+        "seconds": seconds,
+        "f0_method": f0_method,
+        "memory": "fresh process per candidate",
+        "results": results,
+        "created": time.time(),
+    })
+    save_section("chunking", section)
+    return section
+
+
+# --- методы F0 ---
+
+def f0_agreement(f0, ref, cents=50):
+    """Доля озвученных по ref кадров, где f0 в пределах cents (raw pitch accuracy)"""
+    n = min(len(f0), len(ref))
+    f0, ref = np.asarray(f0[:n], dtype=np.float64), np.asarray(ref[:n], dtype=np.float64)
+    voiced = ref > 0
+    if not voiced.any():
+        return None
+    both = voiced & (f0 > 0)
+    diff = 1200 * np.abs(np.log2(f0[both] / ref[both]))
+    return float((diff <= cents).sum() / voiced.sum())
+
+
+def calibrate_f0(conv, lengths=F0_LENGTHS, methods=None, crepe_hop_length=128, log=print):
+    """RTF, пиковая память и совпадение с rmvpe для каждого метода F0; сохраняет в tuning.json"""
+    from config_app import F0_METHODS
+    from infer.modules.vc.pipeline import Pipeline
+    from bench import synth_voice
+
+    pipeline = Pipeline(40000, conv.config)
+    methods = methods or [m for m in F0_METHODS if m != "auto"]
+    # rmvpe первым - он эталон для совпадения
+    methods = sorted(methods, key=lambda m: m != "rmvpe")
+    results = {m: {"rtf": {}, "peak_mb": {}, "agreement": None, "error": None} for m in methods}
+
+    warm, _ = synth_voice(1, sr=16000)
+    for seconds in sorted(lengths):
+        audio, _ = synth_voice(seconds, sr=16000, seed=int(seconds))
+        audio = audio.astype(np.float64)
+        p_len = len(audio) // 160
+        ref = None
+        for method in methods:
+            entry = results[method]
+            if entry["error"]:
+                continue
+            try:
+                if not entry["rtf"]:
+                    # загрузка модели метода не должна попасть в замер
+                    pipeline.get_f0(f"tune-warm-{method}", warm.astype(np.float64), len(warm) // 160,
+                                    0, method, 3, crepe_hop_length)
+                with PeakSampler() as peak:
+                    t0 = time.perf_counter()
+                    # свой ключ на каждый вызов: harvest кэширует по пути
+                    _, pitchf = pipeline.get_f0(f"tune-{method}-{seconds}", audio, p_len,
+                                                0, method, 3, crepe_hop_length)
+                    elapsed = time.perf_counter() - t0
+            except Exception as e:
+                entry["error"] = str(e)
+                log(f"{method}: {e}")
+                continue
+            entry["rtf"][str(seconds)] = round(elapsed / seconds, 5)
+            entry["peak_mb"][str(seconds)] = round(peak.delta_mb, 1)
+            if method == "rmvpe":
+                ref = pitchf
+            if ref is not None and seconds == max(lengths):
+                entry["agreement"] = f0_agreement(pitchf, ref)
+            log(f"{method} {seconds}s: x{1 / max(elapsed / seconds, 1e-9):.1f} realtime, "
+                f"+{peak.delta_mb:.0f} MB")
+
+    section = {
+        "host": host_signature(conv.config),
+        "lengths": list(lengths),
+        "crepe_hop_length": crepe_hop_length,
+        "methods": results,
+        "created": time.time(),
+    }
+    save_section("f0", section)
+    return section
+
+
+def _rtf_at(rtf, duration):
+    if not rtf:
+        return None
+    points = sorted((float(k), v) for k, v in rtf.items())
+    return float(np.interp(duration, [p[0] for p in points], [p[1] for p in points]))
+
+
+def choose_f0_method(duration, budget_seconds, config=None, section=None):
+    """Самый точный метод F0, который укладывается в budget_seconds на duration секунд звука.
+
+    None - калибровки F0 для этой машины нет. Если не укладывается ни один - самый быстрый.
+    """
+    section = section or load_tuning().get("f0")
+    if not section or (config is not None and section.get("host") != host_signature(config)):
+        return None
+    costs = {}
+    for method, entry in section["methods"].items():
+        rtf = _rtf_at(entry.get("rtf"), duration)
+        if rtf is not None and not entry.get("error"):
+            costs[method] = rtf * duration
+    if not costs:
+        return None
+    fits = [m for m, cost in costs.items() if cost <= budget_seconds]
+    if not fits:
+        return min(costs, key=costs.get)
+
+    def rank(method):
+        agreement = section["methods"][method].get("agreement")
+        order = F0_ACCURACY_ORDER.index(method) if method in F0_ACCURACY_ORDER else len(F0_ACCURACY_ORDER)
+        return (-(agreement if agreement is not None else -1), order)
+
+    return min(fits, key=rank)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RVC Editor host calibration")
+    parser.add_argument("mode", nargs="?", choices=("chunking", "f0"), default="chunking",
+                        help="chunking: Pipeline chunk sizes (needs --model); f0: cost of every F0 method")
+    parser.add_argument("--model", default="", help=".pth file in assets/weights")
+    parser.add_argument("--index", default="", help=".index file")
+    parser.add_argument("--f0-method", default="rmvpe")
+    parser.add_argument("--seconds", type=float, default=90, help="synthetic input length")
+    parser.add_argument("--max-memory", type=float, default=None,
+                        help="memory ceiling per conversion, MB (default: half of available RAM)")
+    parser.add_argument("--lengths", type=float, nargs="+", default=list(F0_LENGTHS),
+                        help="input lengths for f0, seconds")
+    parser.add_argument("--crepe-hop-length", type=int, default=128)
+    args = parser.parse_args(argv)
+
+    from converter import VoiceConverter
+    conv = VoiceConverter(log_callback=lambda m: print(m, file=sys.stderr, flush=True))
+
+    if args.mode == "f0":
+        if not conv.initialize():
+            return 2
+        section = calibrate_f0(conv, args.lengths, crepe_hop_length=args.crepe_hop_length, log=conv.log)
+        print(json.dumps({m: {"rtf": e["rtf"], "agreement": e["agreement"]}
+                          for m, e in section["methods"].items()}))
+        print(f"Saved to {TUNING_FILE}", file=sys.stderr)
+        return 0
+
+    if not args.model:
+        parser.error("chunking needs --model")
+    if not conv.load_model(args.model, args.index):
+        return 2
+    section = calibrate_chunking(conv, args.seconds, args.max_memory, args.f0_method, log=conv.log)
+    if section is None:
+        print("No setting fits the memory ceiling", file=sys.stderr)
+        return 1
+    print(json.dumps({k: section[k] for k in CHUNK_KEYS + ("rtf", "peak_mb")}))
+    print(f"Saved to {TUNING_FILE}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    import main as _bootstrap  # окружение RVC и патч mangio-crepe
+    sys.exit(main())
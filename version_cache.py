@@ -0,0 +1,154 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Кэш декодированных версий частей: float32-буферы по пути файла, общий для всех
+# PartGroup, с вытеснением давно не использованных по лимиту байт.
+# Запись проверяется по отметке версии (место в хранилище или mtime и размер WAV),
+# так что перезаписанная под тем же именем версия не отдаётся из кэша.
+# Версии из хранилища - memmap-срезы, кэш лишь избавляет от повторного поиска и чтения.
+
+DEFAULT_BUDGET_MB = 512
+
+
+class VersionCache:
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB):
+        self.budget = int(budget_mb * 2 ** 20)
+        self._items = OrderedDict()  # путь -> (отметка файла, буфер)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._thread = None
+        self._queue = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetched = 0
+
+    def set_budget(self, budget_mb):
+        with self._lock:
+            self.budget = int(max(0, budget_mb) * 2 ** 20)
+            self._evict()
+
+    @staticmethod
+    def _stamp(path):
+        from store import version_stamp
+        return version_stamp(path)
+
+    @staticmethod
+    def _read(path):
+        from store import read_version
+        data = np.ascontiguousarray(read_version(path))
+        # буфер общий: изменять его нельзя, get_data копирует данные в свой массив
+        data.flags.writeable = False
+        return data
+
+    def get(self, path):
+        """float32-буфер файла версии (только для чтения) или None, если файла нет"""
+        stamp = self._stamp(path)
+        if stamp is None:
+            return None
+        with self._lock:
+            item = self._items.get(path)
+            if item is not None and item[0] == stamp:
+                self._items.move_to_end(path)
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+        data = self._read(path)
+        self._put(path, stamp, data)
+        return data
+
+    def _put(self, path, stamp, data):
+        with self._lock:
+            old = self._items.pop(path, None)
+            if old is not None:
+                self._bytes -= old[1].nbytes
+            if data.nbytes > self.budget:
+                return
+            self._items[path] = (stamp, data)
+            self._bytes += data.nbytes
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.budget and self._items:
+            _, (_, data) = self._items.popitem(last=False)
+            self._bytes -= data.nbytes
+            self.evictions += 1
+
+    def invalidate(self, path):
+        with self._lock:
+            item = self._items.pop(path, None)
+            if item is not None:
+                self._bytes -= item[1].nbytes
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+            self._pending.difference_update(self._queue)
+            self._queue.clear()
+
+    def prefetch(self, paths):
+        """Загружает файлы в фоновом потоке, если их ещё нет в кэше"""
+        with self._lock:
+            if self.budget <= 0:
+                return
+            for path in paths:
+                if path and path not in self._items and path not in self._pending:
+                    self._pending.add(path)
+                    self._queue.append(path)
+            if not self._queue:
+                return
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+                self._thread.start()
+
+    def _prefetch_loop(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    # поток живёт, пока есть работа; новый запрос поднимет новый
+                    self._thread = None
+                    return
+                path = self._queue.pop(0)
+            try:
+                stamp = self._stamp(path)
+                if stamp is not None:
+                    with self._lock:
+                        item = self._items.get(path)
+                        fresh = item is not None and item[0] == stamp
+                    if not fresh:
+                        self._put(path, stamp, self._read(path))
+                        with self._lock:
+                            self.prefetched += 1
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._pending.discard(path)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "prefetched": self.prefetched,
+                "evictions": self.evictions,
+                "items": len(self._items),
+                "mb": self._bytes / 2 ** 20,
+                "budget_mb": self.budget / 2 ** 20,
+            }
+
+    def describe(self):
+        s = self.stats()
+        return (f"{s['hit_rate'] * 100:.0f}% hits ({s['hits']}/{s['hits'] + s['misses']}), "
+                f"{s['items']} buffers, {s['mb']:.0f}/{s['budget_mb']:.0f} MB, "
+                f"{s['prefetched']} prefetched, {s['evictions']} evicted")
+
+
+VERSION_CACHE = VersionCache()
@@ -329,7 +329,7 @@ class WaveformCanvas(tk.Canvas):
 
         if self.is_result and ed.part_groups:
             ed._assign_levels()
-            for g in ed.part_groups:
+            for g in ed._parts_index().overlapping(ed._x2s(-2, w), ed._x2s(w + 2, w) + 1):
                 gx1, gx2 = ed._s2x(g.start, w), ed._s2x(g.end, w)
                 if gx2 < 0 or gx1 > w:
                     continue
@@ -459,7 +459,7 @@ class WaveformCanvas(tk.Canvas):
             return None
         w = self.winfo_width()
         sample = self.editor._x2s(x, w)
-        for g in self.editor.part_groups:
+        for g in self.editor._parts_index().at(sample):
             y1 = PART_TOP_MARGIN + g.level * PART_ROW_HEIGHT
             y2 = y1 + PART_ROW_HEIGHT
             if y1 <= y < y2 and g.start <= sample < g.end:
@@ -470,8 +470,13 @@ class WaveformCanvas(tk.Canvas):
         if not self.is_result or not self.editor.part_groups:
             return None
         w = self.winfo_width()
+        index = self.editor._parts_index()
+        # границы в пределах порога (с запасом на округление) - дальше та же проверка в пикселях
+        lo = self.editor._x2s(x - threshold - 2, w)
+        hi = self.editor._x2s(x + threshold + 2, w) + 1
+        near = {id(g): g for g in index.starting_between(lo, hi) + index.ending_between(lo, hi)}
         candidates = []
-        for g in self.editor.part_groups:
+        for g in sorted(near.values(), key=index.order):
             y1 = PART_TOP_MARGIN + g.level * PART_ROW_HEIGHT
             y2 = y1 + PART_ROW_HEIGHT
             if not (y1 <= y < y2):
@@ -0,0 +1,176 @@
+import os
+import sys
+import time
+
+# Процессы-воркеры для параллельной пакетной конвертации (без GUI).
+# Каждый процесс один раз получает модель в initializer и дальше только конвертирует.
+# Если в родителе модель уже загружена (source), веса hubert/net_g/RMVPE передаются
+# через общую память, а не грузятся в каждом процессе. Процессы только spawn: форк
+# родителя, где уже работали torch и его пулы потоков, может зависнуть.
+
+_converter = None
+
+
+def _log_stderr(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def _set_threads(budget):
+    if budget:
+        import thread_budget
+        thread_budget.apply(budget)
+
+
+def init_worker(model, index_path, verbose=False, budget=None, shared=None):
+    global _converter
+    _set_threads(budget)
+    from converter import VoiceConverter
+    _converter = VoiceConverter(log_callback=_log_stderr if verbose else (lambda m: None),
+                                threads=budget["torch"] if budget else "auto")
+    if shared is not None and _converter.attach_shared(model, index_path, shared):
+        return
+    if not _converter.load_model(model, index_path):
+        raise RuntimeError(f"Model load failed: {model}")
+
+
+def _warm_up():
+    time.sleep(0.2)
+    return os.getpid()
+
+
+def memory_info():
+    """(pid, {rss, pss, private, shared} в МБ) - разделяемые веса видны в shared, не в private"""
+    info = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    info[key] = int(value.split()[0]) / 1024
+        result = {
+            "rss": info.get("Rss", 0.0),
+            "pss": info.get("Pss", 0.0),
+            "private": info.get("Private_Clean", 0.0) + info.get("Private_Dirty", 0.0),
+            "shared": info.get("Shared_Clean", 0.0) + info.get("Shared_Dirty", 0.0),
+        }
+    except OSError:
+        import psutil
+        full = psutil.Process().memory_full_info()
+        result = {"rss": full.rss / 2 ** 20, "pss": getattr(full, "pss", full.uss) / 2 ** 20,
+                  "private": full.uss / 2 ** 20, "shared": (full.rss - full.uss) / 2 ** 20}
+    time.sleep(0.2)
+    return os.getpid(), result
+
+
+def make_pool(model, index_path, workers, verbose=False, threads="auto", source=None, with_rmvpe=False):
+    """ProcessPoolExecutor с тёплыми воркерами.
+
+    threads - потоков на воркер ("auto" - ядра поровну, см. thread_budget).
+    source - VoiceConverter с уже загруженной моделью: её веса уходят воркерам через
+    общую память; если передать не удалось, каждый воркер грузит свою копию.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    import thread_budget
+
+    budget = thread_budget.plan(threads, workers)
+    shared = source.shared_weights(with_rmvpe=with_rmvpe) if source is not None else None
+    ctx = multiprocessing.get_context("spawn")
+
+    def start(pool):
+        # поднимаем все процессы сразу, чтобы загрузка модели не попала в первый файл;
+        # BLAS читает лимит из окружения при загрузке, поэтому оно задаётся до запуска
+        with thread_budget.child_env(budget):
+            for future in [pool.submit(_warm_up) for _ in range(workers)]:
+                future.result()
+        return pool
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=init_worker,
+                               initargs=(model, index_path, verbose, budget, shared))
+    try:
+        return start(pool)
+    except Exception as e:
+        pool.shutdown(cancel_futures=True)
+        if shared is None:
+            raise
+        from lang import tr
+        source.log(f"{tr('Shared weights unavailable:')} {e}")
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=init_worker,
+                               initargs=(model, index_path, verbose, budget))
+    return start(pool)
+
+
+def convert_one(input_path, output_path, params):
+    t0 = time.perf_counter()
+    ok = _converter.convert(input_path, output_path, **params)
+    return {
+        "input": input_path,
+        "output": output_path,
+        "ok": bool(ok),
+        "status": "converted" if ok else "failed",
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+
+
+def run_parallel(jobs, model, index_path, workers, on_result=None, verbose=False, source=None,
+                 threads="auto", **params):
+    """Раздаёт (вход, выход) по процессам; возвращает [(вход, выход, ok)] как _run_batch"""
+    from concurrent.futures import as_completed
+
+    for key in ("prefetch", "writer_threads", "writer_queue", "audio", "chunk_workers"):
+        params.pop(key, None)
+
+    results = []
+    if not jobs:
+        return results
+
+    with make_pool(model, index_path, workers, verbose=verbose, threads=threads, source=source,
+                   with_rmvpe=params.get("f0_method") == "rmvpe") as pool:
+        futures = {pool.submit(convert_one, i, o, params): (i, o) for i, o in jobs}
+        for future in as_completed(futures):
+            input_path, output_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"input": input_path, "output": output_path, "ok": False,
+                          "status": "failed", "seconds": 0.0, "error": str(e)}
+            if on_result is not None:
+                on_result(result)
+            results.append((input_path, output_path, result["ok"]))
+    return results
+
+
+def run_chunk(piece, sid, file_index, index_rate, protect):
+    """Кусок длинного файла из Pipeline.plan() в тёплом воркере"""
+    import torch
+    vc = _converter.vc
+    if vc.hubert_model is None:
+        from infer.modules.vc.utils import load_hubert
+        vc.hubert_model = load_hubert(vc.config)
+    pipeline = vc.pipeline
+    index, big_npy = pipeline._get_index(file_index, index_rate)
+    sid = torch.tensor(sid, device=pipeline.device).unsqueeze(0).long()
+    return pipeline.run_chunk(vc.hubert_model, vc.net_g, sid, piece, [0, 0, 0],
+                              index, big_npy, index_rate, vc.version, protect)
+
+
+class ChunkPool:
+    """Пул тёплых процессов, между которыми делятся куски одного длинного файла.
+
+    Точки разреза и F0 считает вызывающий процесс (Pipeline.plan), воркеры
+    получают куски с контекстным паддингом, map_chunks отдаёт выходы по порядку.
+    """
+
+    def __init__(self, model, index_path, workers, verbose=False, threads="auto", source=None):
+        self.key = (os.path.basename(model), index_path, workers)
+        # F0 считает родитель, RMVPE воркерам не нужен
+        self.pool = make_pool(model, index_path, workers, verbose=verbose, threads=threads, source=source)
+
+    def map_chunks(self, pieces, sid, file_index, index_rate, protect):
+        futures = [self.pool.submit(run_chunk, piece, sid, file_index, index_rate, protect)
+                   for piece in pieces]
+        return (future.result() for future in futures)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)